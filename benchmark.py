@@ -0,0 +1,204 @@
+'''
+This is a script that measures how the pipeline scales with the number of
+songs. For each corpus size it generates a synthetic song lyrics file
+(see synthetic_corpus.py), runs each stage of song_info_build.py on it,
+and records the wall time and peak memory of every stage, along with the
+latency of search.py-style queries.
+
+Results are written as JSON to results_file, with the git commit they
+were measured on, so runs from different versions can be compared.
+
+Usage: python3.7 benchmark.py [number of songs ...]
+
+Peak memory is measured with tracemalloc, which covers Python objects and
+numpy arrays but slows down pure Python code. max_rss_mb is the process
+memory high-water mark after each stage (this includes memory outside
+of Python, like metapy's, but never goes down). Set trace_memory = False
+for timings without the tracing overhead.
+'''
+
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import explicit_model
+import instrumentation
+import search_index
+import song_database
+import song_records
+import synthetic_corpus
+import tokenized_corpus
+import topics_model
+import word_stats
+
+
+# Set options
+sizes = [5000, 50000, 500000]
+corpus_dir = 'data/benchmark'
+results_file = 'data/benchmark/results.json'
+trace_memory = True
+number_of_queries = 1000
+seed = 0
+
+
+def measure(stages, name, function, *args):
+    '''
+    Runs function(*args), and records its wall time and memory in
+    stages[name]. Returns what function returns.
+    '''
+    if trace_memory:
+        tracemalloc.start()
+    starttime = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - starttime
+    stages[name] = {'seconds': seconds, 'max_rss_mb': instrumentation.max_rss_mb()}
+    if trace_memory:
+        stages[name]['peak_memory_mb'] = tracemalloc.get_traced_memory()[1]/2**20
+        tracemalloc.stop()
+    print(f'  {name:24} {seconds:10.3f} s')
+    return result
+
+
+def em_iteration(topics):
+    '''
+    One iteration of topics_model.Model.plsa's EM loop.
+    '''
+    topics.expectation_step()
+    topics.maximization_step(topics.number_of_topics)
+    return topics.calculate_likelihood(topics.number_of_topics)
+
+
+def topics_setup(topics):
+    '''
+    The steps of topics_model.Model.plsa before the EM loop.
+    '''
+    topics.build_vocabulary()
+    topics.build_term_doc_matrix()
+    topics.initialize(topics.number_of_topics)
+
+
+def query_latencies(index, database, queries):
+    '''
+    Times search.py's lookup (index search, then formatting the best
+    match's dashboard) for each query. Returns latencies in milliseconds.
+    '''
+    latencies = []
+    for query in queries:
+        starttime = time.perf_counter()
+        scores = index.search(query, 1)
+        if scores:
+            song_database.format_dashboard(song_database.dashboard(database[scores[0][0]]))
+        latencies.append((time.perf_counter() - starttime)*1000)
+    return np.array(latencies)
+
+
+def benchmark(number_of_songs, work_dir):
+    '''
+    Runs every stage on a synthetic corpus of number_of_songs songs.
+    Returns the results for this size.
+    '''
+    stages = {}
+    songs_file = os.path.join(corpus_dir, f'songs_{number_of_songs}_{seed}.txt')
+    if not os.path.exists(songs_file):
+        print(f'  generating {songs_file}')
+        synthetic_corpus.generate(songs_file, number_of_songs, seed)
+    songs = measure(stages, 'read', lambda: list(song_records.read_songs(songs_file)))
+    titles = [song.title for song in songs]
+    artists = [song.artist for song in songs]
+    featurings = [song.featuring for song in songs]
+    lengths = [song.length for song in songs]
+    lyrics = [song.lyrics for song in songs]
+    del songs
+
+    # a fresh cache directory, so every song is analyzed
+    corpus = tokenized_corpus.Corpus(cache_dir=os.path.join(work_dir, 'token_cache'))
+    measure(stages, 'tokenize', corpus.tokenize_songs, lyrics)
+
+    stats = word_stats.Stats(songs=lyrics, lengths=lengths)
+    song_stats = measure(stages, 'word_stats', stats.evaluate_corpus)
+
+    exp = explicit_model.Model(lyrics, corpus=corpus)
+    measure(stages, 'explicit_build_model', exp.build_model)
+    explicit_scores = measure(stages, 'explicit_evaluate_songs', exp.evaluate_songs)
+
+    topics = topics_model.Model(lyrics, corpus=corpus)
+    np.random.seed(seed)
+    measure(stages, 'topics_setup', topics_setup, topics)
+    measure(stages, 'topics_em_iteration', em_iteration, topics)
+    best_topics = measure(stages, 'topics_labels', topics.songs_topics_strlist)
+    del topics
+
+    database_file = os.path.join(work_dir, 'songdash_database.bin')
+    rows = list(zip(titles, artists, lengths, featurings, song_stats['words_per_second'], song_stats['unique_ratio'], explicit_scores, best_topics))
+    measure(stages, 'write_database', song_database.write_columnar, rows, database_file)
+    index = search_index.Index()
+    measure(stages, 'search_index_build', index.build, titles, artists, featurings)
+
+    # queries are titles, artists, or a title with an artist, with some
+    # that match nothing
+    rng = random.Random(seed)
+    queries = []
+    for i in range(number_of_queries):
+        j = rng.randrange(number_of_songs)
+        queries.append(rng.choice([titles[j], artists[j], titles[j] + ' ' + artists[j], 'no such song']))
+    database = song_database.ColumnarDatabase(database_file)
+    latencies = query_latencies(index, database, queries)
+    print(f'  {"query (mean)":24} {latencies.mean():10.3f} ms')
+
+    return {
+        'songs': number_of_songs,
+        'vocabulary_size': len(corpus.terms),
+        'stages': stages,
+        'query_latency_ms': {
+            'queries': len(latencies),
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max()),
+        },
+    }
+
+
+def git_commit():
+    '''
+    The commit being measured, or None outside of a git checkout.
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sizes = [int(size) for size in sys.argv[1:]]
+    # print the models' progress (EM iterations and such), as the build does
+    instrumentation.default_recorder().verbose = True
+    os.makedirs(corpus_dir, exist_ok=True)
+    results = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processors': os.cpu_count(),
+        'trace_memory': trace_memory,
+        'seed': seed,
+        'runs': [],
+    }
+    for number_of_songs in sizes:
+        print(f'{number_of_songs} songs')
+        work_dir = tempfile.mkdtemp(prefix='benchmark_')
+        results['runs'].append(benchmark(number_of_songs, work_dir))
+        shutil.rmtree(work_dir)
+        # save after every size, so the smaller sizes are kept if a bigger one fails
+        f = open(results_file, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+    print(f'Results written to {results_file}')
@@ -0,0 +1,53 @@
+'''
+This file is used to remember what song_info_build.py computed for each
+song, so the next build only has to do work for songs that are new or
+have changed.
+
+Songs are identified by a hash of their whole record (title, artist,
+length, featuring and lyrics). For each song the state keeps the hash of
+its lyrics (to find its tokens in the tokenized corpus cache), its word
+stats (speed, unique word ratio, average word length and scrabble points
+per word) and its topic probabilities. It also keeps the explicit model's
+running word counts, which are updated rather than recounted.
+'''
+
+import hashlib
+import os
+import pickle
+
+
+def record_hash(title, artist, length, featuring, lyrics):
+    '''
+    Hashes all fields of a song record.
+    '''
+    record = '\n'.join([title, artist, repr(float(length)), featuring, lyrics])
+    return hashlib.sha1(record.encode('utf-8')).hexdigest()
+
+
+class BuildState:
+    '''
+    Per-song results and model totals from a previous build.
+    '''
+    def __init__(self):
+        self.songs = {}  # record hash -> dict of per-song results
+        self.explicit_counts = None  # (word_corpus_frequency, explicit_word_counts, number_of_songs)
+
+    def load(self, state_file):
+        '''
+        Load a previously saved state, if there is one. Returns whether a
+        state was loaded.
+        '''
+        if not os.path.exists(state_file):
+            return False
+        f = open(state_file, 'rb')
+        (self.songs, self.explicit_counts) = pickle.load(f)
+        f.close()
+        return True
+
+    def save(self, state_file):
+        '''
+        Save the state to a file.
+        '''
+        f = open(state_file, 'wb')
+        pickle.dump((self.songs, self.explicit_counts), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
@@ -12,64 +12,134 @@ the model class below. Generally, adding more words to the explicit list
 (as long as they are reasonable) doesn't vary model, and the same
 songs will have high explicit scores.
 
+Scores for the whole corpus are calculated together, as a sparse
+term-count matrix times the model's weight vector. The highest corpus
+score is kept (and saved with the model) to normalize scores to 0-1, so
+new songs can be scored on the same scale later.
+
 More complex and perhaps more accurate techniques are possible here.
 '''
 
-import metapy
 import math
+import numpy as np
+import instrumentation
+import parallel
+import song_records
+import tokenized_corpus
+import vocabulary
 
 class Model:
     '''
     Calculate the explicitness of songs.
     '''
-    def __init__ (self,songs=[]):
+    def __init__ (self,songs=[],corpus=None):
         '''
-        Initialize with an array of songs, and array of song lengths.
+        Initialize with an array of songs. Lyrics are tokenized through
+        corpus (a tokenized_corpus.Corpus), or the shared one if None.
         '''
         self.explicit_words = ['fuck','motherfuck','fuckin']
         self.songs = songs
+        self.corpus = corpus
         self.model = {}
+        self.normalization = None  # highest score in the corpus, see evaluate_songs
+        self.vocabulary_settings = None  # see vocabulary.py, read from the corpus' config if None
+        # running totals the model is built from, see count_songs
+        self.explicit_word_counts = {}
+        self.word_corpus_frequency = {}
+        self.number_of_songs = 0
 
     def set_songs_from_file(self, song_database_file):
         '''
         Use a file to load song lyrics.
         '''
-        f = open(song_database_file,'r')
-        lines = f.readlines()
-        f.close()
-        self.songs = [lines[x] for x in range(5, len(lines), 7)]
+        self.songs = [song.lyrics for song in song_records.read_songs(song_database_file)]
 
-    def build_model(self):
+    def build_model(self, pool=None, number_of_shards=1):
         '''
         Build a language model from songs that are known to be explicit.
         These are songs that contain at least one word from explicit_words.
+        If a multiprocessing pool is given, word counts are computed in
+        parallel (see count_songs_parallel).
         '''
-        ana = metapy.analyzers.load('config/config.toml')
-        doc = metapy.index.Document()
-        model = {}
-        word_corpus_frequency = {}
-        for song in self.songs:
-            doc.content(song)
-            words = ana.analyze(doc)
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        self.explicit_word_counts = {}
+        self.word_corpus_frequency = {}
+        self.number_of_songs = 0
+        if pool is None:
+            self.count_songs(corpus.tokenize_songs(self.songs))
+        else:
+            self.count_songs_parallel(corpus.tokenize_songs(self.songs), pool, number_of_shards)
+        self.build_model_from_counts()
+
+    def count_songs(self, tokens, sign=1):
+        '''
+        Adds songs to the running totals the model is built from: the number
+        of songs, each word's document frequency, and each word's count in
+        explicit songs. With sign=-1 the songs are removed instead, so the
+        model can be updated when songs are added, changed or removed
+        without recounting the whole corpus. tokens are (term ids, counts)
+        pairs from the model's corpus.
+        '''
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        for (ids, counts) in tokens:
+            words = [corpus.terms[term_id] for term_id in ids]
             exp_song = False
             for exp_word in self.explicit_words:
                 if exp_word in words:
                     exp_song = True
             if exp_song:
-                for word in words:
-                    if word in model:
-                        model[word] += words[word]
-                    else:
-                        model[word] = words[word]
+                for (word, count) in zip(words, counts):
+                    self.explicit_word_counts[word] = self.explicit_word_counts.get(word, 0) + sign*int(count)
+                    if self.explicit_word_counts[word] == 0:
+                        del self.explicit_word_counts[word]
             for word in words:
-                if word in word_corpus_frequency:
-                    word_corpus_frequency[word] += 1
-                else:
-                    word_corpus_frequency[word] = 1
-        
-        for word in model:
-            model[word] = math.log2((len(self.songs)+1)/word_corpus_frequency[word])*model[word]
-        modelsum = sum(model.values())
+                self.word_corpus_frequency[word] = self.word_corpus_frequency.get(word, 0) + sign
+                if self.word_corpus_frequency[word] == 0:
+                    del self.word_corpus_frequency[word]
+            self.number_of_songs += sign
+
+    def count_songs_parallel(self, tokens, pool, number_of_shards):
+        '''
+        Same as count_songs, for adding songs, but the per-word counts are
+        computed in shards by a multiprocessing pool and then summed. The
+        totals are kept in the same (first seen) order as count_songs, so
+        the resulting model is exactly the same.
+        '''
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        explicit_ids = np.array([corpus.term_ind[word] for word in self.explicit_words if word in corpus.term_ind], dtype=np.int64)
+        shards = parallel.make_shards(tokens, number_of_shards)
+        results = pool.map(count_shard, [(shard, explicit_ids, len(corpus.terms)) for shard in shards])
+        frequencies = sum([result[0] for result in results])
+        explicit_counts = sum([result[1] for result in results])
+        explicit_songs = parallel.concatenate([result[2] for result in results])
+
+        for term_id in first_seen([ids for (ids, counts) in tokens]):
+            word = corpus.terms[term_id]
+            self.word_corpus_frequency[word] = self.word_corpus_frequency.get(word, 0) + int(frequencies[term_id])
+        for term_id in first_seen([tokens[i][0] for i in range(len(tokens)) if explicit_songs[i]]):
+            word = corpus.terms[term_id]
+            self.explicit_word_counts[word] = self.explicit_word_counts.get(word, 0) + int(explicit_counts[term_id])
+        self.number_of_songs += len(tokens)
+
+    def build_model_from_counts(self):
+        '''
+        Builds the language model (the 200 highest weighted words) from the
+        running totals collected by count_songs. Only words that pass the
+        vocabulary cutoffs (see vocabulary.py) are used, and the explicit
+        words always are. The totals themselves keep every word, so they
+        stay exact as songs are added and removed.
+        '''
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        settings = self.vocabulary_settings or vocabulary.load_settings(corpus.config_file)
+        words = list(self.word_corpus_frequency)
+        keep = np.array([word in self.explicit_words for word in words], dtype=bool)
+        selected = vocabulary.select_terms(np.array([self.word_corpus_frequency[word] for word in words], dtype=np.int64),
+            self.number_of_songs, settings, keep)
+        selected = set([word for (word, kept) in zip(words, selected) if kept])
+        model = {}
+        for word in self.explicit_word_counts:
+            if word in selected:
+                model[word] = math.log2((self.number_of_songs+1)/self.word_corpus_frequency[word])*self.explicit_word_counts[word]
         model = sorted(list(zip(model.keys(), model.values())), key=lambda x: -x[1])[:200]
         modelsum = sum([x[1] for x in model])
         model = dict([(x[0],x[1]/modelsum) for x in model])
@@ -80,27 +150,71 @@ class Model:
         Calculates the explicit score for a song, given its lyrics. Uses the
         langauge model previously built.
         '''
-        ana = metapy.analyzers.load('config/config.toml')
-        doc = metapy.index.Document()
-        doc.content(song)
-        words = ana.analyze(doc)
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        (ids, counts) = corpus.tokenize(song)
         similarity_sum = 0
-        for word in words:
+        for (term_id, count) in zip(ids, counts):
+            word = corpus.terms[term_id]
             if word in self.model:
-                similarity_sum += words[word] * self.model[word]
+                similarity_sum += int(count) * self.model[word]
         return similarity_sum
 
+    def weight_vector(self, corpus):
+        '''
+        Returns the model as a vector of weights, indexed by the term ids of
+        corpus. Terms that are not in the model have weight 0.
+        '''
+        weights = np.zeros(len(corpus.terms))
+        for word in self.model:
+            if word in corpus.term_ind:
+                weights[corpus.term_ind[word]] = self.model[word]
+        return weights
+
+    def score_songs(self, songs):
+        '''
+        Calculates the (unnormalized) explicit scores for many songs at once,
+        as a sparse term-count matrix times the model's weight vector. Same
+        values as evaluate_song, returned as an array in the same order.
+        '''
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        term_doc_matrix = corpus.term_doc_matrix(songs)
+        return term_doc_matrix.dot(self.weight_vector(corpus))
+
     def evaluate_songs(self):
         '''
         Calculates the explicit scores for all songs available (the songs used
         in building the model). Returns the explicit scores for all songs as a
-        list, in same order.
+        list, in same order. The highest score is kept as the normalization
+        constant, so new songs can be scored on the same scale. If no song
+        scores above 0 (or there are no songs), every score is 0 and there
+        is no normalization constant.
+        '''
+        explicit_scores = self.score_songs(self.songs)
+        if len(explicit_scores) == 0 or explicit_scores.max() <= 0:
+            self.normalization = None
+            return [0.0]*len(explicit_scores)
+        self.normalization = explicit_scores.max()
+        return list(explicit_scores/self.normalization)
+
+    def evaluate_new_song(self, song):
+        '''
+        Calculates the explicit score for a song that was not used to build
+        the model, on the same 0-1 scale as evaluate_songs (it can be above 1
+        if the song is more explicit than any song in the corpus).
+        '''
+        return self.normalize(self.evaluate_song(song))
+
+    def normalize(self, score):
+        '''
+        Puts an explicit score on the 0-1 scale of evaluate_songs. Raises
+        ValueError if the model has no normalization constant (models saved
+        before it was kept with the model have to be rebuilt, and models
+        built from songs that are not explicit at all have none).
         '''
-        explicit_scores = []
-        for song in self.songs:
-            explicit_scores.append(self.evaluate_song(song))
-        explicit_scores = [x/max(explicit_scores) for x in explicit_scores]
-        return explicit_scores
+        if self.normalization is None:
+            raise ValueError('the explicit model has no normalization constant, rebuild it (and save it) '
+                'with song_info_build.py from songs that include explicit ones')
+        return score/self.normalization
     
     def save_model_to_file(self, output_file):
         '''
@@ -108,6 +222,8 @@ class Model:
         '''
         f = open(output_file, 'w')
         output = []
+        if self.normalization is not None:
+            output.append(f'#normalization,{self.normalization}')
         for word in self.model:
             output.append(f'{word},{self.model[word]}')
         f.write('\n'.join(output))
@@ -119,9 +235,43 @@ class Model:
         '''
         f = open(input_file, 'r')
         lines = f.readlines()
-        print(len(lines))
-        f.close
+        f.close()
         for line in lines:
             line_split = line.splitlines()[0].split(',')
+            if line_split[0] == '#normalization':
+                # 0 was saved by older builds where no song was explicit
+                self.normalization = float(line_split[1]) or None
+                continue
             self.model[line_split[0]] = float(line_split[1])
-        print(self.model)
+        instrumentation.event('explicit_model_loaded', file=input_file, words=len(self.model))
+
+
+def first_seen(songs_ids):
+    '''
+    Returns the distinct term ids of a list of songs' term id arrays, in the
+    order they are first seen.
+    '''
+    if not songs_ids:
+        return []
+    ids = np.concatenate(songs_ids)
+    (unique_ids, first_index) = np.unique(ids, return_index=True)
+    return ids[np.sort(first_index)]
+
+
+def count_shard(args):
+    '''
+    Counts a shard of songs (term ids, counts) in a worker process. Returns
+    arrays (indexed by term id) of document frequencies and of counts in
+    explicit songs, and whether each song is explicit.
+    '''
+    (tokens, explicit_ids, number_of_terms) = args
+    frequencies = np.zeros(number_of_terms, dtype=np.int64)
+    explicit_counts = np.zeros(number_of_terms, dtype=np.int64)
+    explicit_songs = []
+    for (ids, counts) in tokens:
+        frequencies[ids] += 1
+        exp_song = bool(np.isin(explicit_ids, ids).any())
+        if exp_song:
+            explicit_counts[ids] += counts
+        explicit_songs.append(exp_song)
+    return (frequencies, explicit_counts, explicit_songs)
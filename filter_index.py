@@ -0,0 +1,246 @@
+'''
+This file is used to filter the song dashboard database, e.g. to make
+radio-safe or mood playlists, with queries like
+
+    explicit < 0.2 AND topic = Love AND words_per_second > 2.5
+
+A filter is predicates joined by AND. Each predicate compares a numeric
+column of the database (length, words_per_second, unique_ratio, explicit)
+with <, <=, >, >=, = or !=, or a topic with = or != (a song has a topic if
+its topic label lists it, e.g. 'Love/Other' has both Love and Other;
+'topic = n/a' matches the songs without a topic).
+
+The index keeps every numeric column sorted (with the song ids in that
+order), so the songs matching a comparison are a range found by binary
+search, and a bitmap and a list of song ids for each topic. A query starts
+from the predicate with the fewest matches, and checks the others on those
+songs only, so its cost grows with the number of matches rather than the
+size of the database. Results are song ids (rows of the database), in
+order, and can be read a page at a time.
+'''
+
+import os
+import pickle
+import re
+import numpy as np
+import song_database
+
+
+TOPIC_NAMES = ['topic', 'topics']
+NO_TOPIC = 'n/a'  # label of songs without a topic, see topics_model.Model.topics_strlist
+OPERATORS = ['<=', '>=', '!=', '=', '<', '>']
+
+
+def parse_filter(text):
+    '''
+    Parses a filter string into a list of (column, operator, value)
+    predicates, where column is a numeric column or 'topic'. Raises
+    ValueError if the filter can't be parsed. An empty filter matches
+    every song.
+    '''
+    predicates = []
+    if text.strip() == '':
+        return predicates
+    for part in re.split(r'\s+and\s+', text.strip(), flags=re.IGNORECASE):
+        match = re.fullmatch(r'\s*([A-Za-z_]+)\s*(<=|>=|!=|=|<|>)\s*(.*?)\s*', part)
+        if match is None or match.group(3) == '':
+            raise ValueError(f'can\'t parse "{part}"')
+        (column, operator, value) = match.groups()
+        column = column.lower()
+        if column in TOPIC_NAMES:
+            if operator not in ['=', '!=']:
+                raise ValueError(f'topics can only be compared with = or != ("{part}")')
+            predicates.append(('topic', operator, value.strip('\'"')))
+        elif column in song_database.NUMERIC_COLUMNS:
+            try:
+                predicates.append((column, operator, float(value)))
+            except ValueError:
+                raise ValueError(f'{column} must be compared with a number ("{part}")')
+        else:
+            raise ValueError(f'unknown column "{column}" (columns are {", ".join(song_database.NUMERIC_COLUMNS)} and topic)')
+    return predicates
+
+
+def topic_list(label):
+    '''
+    The topics of a topic label, e.g. 'Love/Other' -> ['Love', 'Other'].
+    The label of songs without a topic, 'n/a', is a topic of its own.
+    '''
+    if label == NO_TOPIC:
+        return [NO_TOPIC]
+    return label.split('/')
+
+
+class FilterIndex:
+    '''
+    Sorted indexes of the numeric columns, and bitmap indexes of the topics.
+    '''
+    def __init__(self):
+        self.number_of_songs = 0
+        self.values = {}  # column -> value of each song
+        self.order = {}  # column -> song ids sorted by value
+        self.sorted_values = {}  # column -> values in that order
+        self.topic_songs = {}  # topic -> song ids with that topic
+        self.topic_bitmaps = {}  # topic -> bit i is set if song i has that topic
+
+    def build(self, numeric_columns, topics):
+        '''
+        Builds the index from a dictionary of numeric column values (lists
+        or arrays, one value per song) and a list of topic labels. Song ids
+        are positions in these lists (and rows of the song database).
+        '''
+        self.number_of_songs = len(topics)
+        for column in song_database.NUMERIC_COLUMNS:
+            values = np.asarray(numeric_columns[column], dtype=float)
+            order = np.argsort(values, kind='stable')
+            self.values[column] = values
+            self.order[column] = order
+            self.sorted_values[column] = values[order]
+        self.topic_songs = {}
+        for (i, label) in enumerate(topics):
+            for topic in topic_list(label):
+                self.topic_songs.setdefault(topic, []).append(i)
+        self.topic_bitmaps = {}
+        for (topic, songs) in self.topic_songs.items():
+            songs = np.array(songs, dtype=np.int64)
+            has_topic = np.zeros(self.number_of_songs, dtype=bool)
+            has_topic[songs] = True
+            self.topic_songs[topic] = songs
+            self.topic_bitmaps[topic] = np.packbits(has_topic, bitorder='little')
+
+    def has_topic(self, topic, songs):
+        '''
+        Boolean array: whether each of the songs (an array of ids) has topic.
+        '''
+        if topic not in self.topic_bitmaps:
+            return np.zeros(len(songs), dtype=bool)
+        return (self.topic_bitmaps[topic][songs >> 3] >> (songs & 7)) & 1 == 1
+
+    def ranges(self, column, operator, value):
+        '''
+        The (start, end) ranges of positions in a column's sorted order
+        whose values satisfy the comparison.
+        '''
+        left = int(np.searchsorted(self.sorted_values[column], value, 'left'))
+        right = int(np.searchsorted(self.sorted_values[column], value, 'right'))
+        end = self.number_of_songs
+        return {
+            '<': [(0, left)],
+            '<=': [(0, right)],
+            '>': [(right, end)],
+            '>=': [(left, end)],
+            '=': [(left, right)],
+            '!=': [(0, left), (right, end)],
+        }[operator]
+
+    def count(self, predicate):
+        '''
+        The number of songs matching one predicate (without listing them).
+        '''
+        (column, operator, value) = predicate
+        if column == 'topic':
+            count = len(self.topic_songs.get(value, []))
+            return count if operator == '=' else self.number_of_songs - count
+        return sum([end - start for (start, end) in self.ranges(column, operator, value)])
+
+    def songs(self, predicate):
+        '''
+        The ids of the songs matching one predicate, in no particular order.
+        '''
+        (column, operator, value) = predicate
+        if column == 'topic':
+            if operator == '=':
+                return self.topic_songs.get(value, np.zeros(0, dtype=np.int64))
+            return np.flatnonzero(~self.has_topic(value, np.arange(self.number_of_songs)))
+        return np.concatenate([self.order[column][start:end] for (start, end) in self.ranges(column, operator, value)])
+
+    def check(self, predicate, songs):
+        '''
+        Boolean array: whether each of the songs (an array of ids) matches
+        the predicate.
+        '''
+        (column, operator, value) = predicate
+        if column == 'topic':
+            has_topic = self.has_topic(value, songs)
+            return has_topic if operator == '=' else ~has_topic
+        values = self.values[column][songs]
+        return {
+            '<': values < value,
+            '<=': values <= value,
+            '>': values > value,
+            '>=': values >= value,
+            '=': values == value,
+            '!=': values != value,
+        }[operator]
+
+    def matches(self, predicates):
+        '''
+        The ids of all songs matching every predicate (see parse_filter), in
+        increasing order.
+        '''
+        if isinstance(predicates, str):
+            predicates = parse_filter(predicates)
+        if not predicates:
+            return np.arange(self.number_of_songs)
+        # start from the most selective predicate, check the rest on its songs
+        counts = [self.count(predicate) for predicate in predicates]
+        first = int(np.argmin(counts))
+        songs = self.songs(predicates[first])
+        for (j, predicate) in enumerate(predicates):
+            if j != first and len(songs):
+                songs = songs[self.check(predicate, songs)]
+        return np.sort(songs)
+
+    def query(self, predicates, offset=0, limit=None):
+        '''
+        One page of the ids of the songs matching a filter: up to limit ids
+        (all if None), starting at offset. Returns (total matches, ids).
+        '''
+        songs = self.matches(predicates)
+        end = len(songs) if limit is None else offset + limit
+        return (len(songs), songs[offset:end])
+
+    def iterate(self, predicates, batch_size=1000):
+        '''
+        Yields the ids of the songs matching a filter in batches (arrays of
+        up to batch_size ids), in order.
+        '''
+        songs = self.matches(predicates)
+        for start in range(0, len(songs), batch_size):
+            yield songs[start:start+batch_size]
+
+    def save(self, output_file):
+        '''
+        Save the index to a file.
+        '''
+        f = open(output_file, 'wb')
+        pickle.dump((self.number_of_songs, self.values, self.order, self.sorted_values, self.topic_songs, self.topic_bitmaps),
+            f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
+
+    def load(self, input_file):
+        '''
+        Load a previously saved index.
+        '''
+        f = open(input_file, 'rb')
+        (self.number_of_songs, self.values, self.order, self.sorted_values, self.topic_songs, self.topic_bitmaps) = pickle.load(f)
+        f.close()
+
+
+def load_filter_index(index_file, database):
+    '''
+    Loads the index from index_file. If it hasn't been built yet, it is
+    built from the rows in database (see song_database.open_database), and
+    saved to index_file.
+    '''
+    index = FilterIndex()
+    if os.path.exists(index_file):
+        index.load(index_file)
+    elif isinstance(database, song_database.ColumnarDatabase):
+        index.build({column: database.column(column) for column in song_database.NUMERIC_COLUMNS}, database.column('topics'))
+        index.save(index_file)
+    else:
+        columns = {column: [row[song_database.COLUMNS.index(column)] for row in database] for column in song_database.NUMERIC_COLUMNS}
+        index.build(columns, [row[song_database.COLUMNS.index('topics')] for row in database])
+        index.save(index_file)
+    return index
@@ -0,0 +1,45 @@
+'''
+This is a script that writes the songs matching a filter (see
+filter_index.py) as csv, in the same columns as the song database, e.g.
+to make a radio-safe playlist:
+
+    python3.7 filter_songs.py "explicit < 0.2 AND topic = Love" > playlist.csv
+
+Only the matching rows are read from the database, a batch at a time.
+'''
+
+import csv
+import sys
+import filter_index
+import song_database
+
+
+# Set options
+index_file = 'data/filter_index.pkl'
+database_file = 'data/songdash_database.bin'
+csv_database_file = 'data/songdash_database.csv'
+batch_size = 1000
+
+
+# Open the song dashboard database (memory-mapped if it is in binary form),
+# and the filter index (built from the database if it is missing).
+allsongs = song_database.open_database(database_file, csv_database_file)
+index = filter_index.load_filter_index(index_file, allsongs)
+
+
+# Read the filter from the command line, or ask for it
+if len(sys.argv) > 1:
+    query = ' '.join(sys.argv[1:])
+else:
+    query = input('Filter: ')
+try:
+    predicates = filter_index.parse_filter(query)
+except ValueError as error:
+    print(f'Bad filter: {error}', file=sys.stderr)
+    exit(1)
+
+
+# Write the matching rows
+csvw = csv.writer(sys.stdout)
+for songs in index.iterate(predicates, batch_size):
+    csvw.writerows([allsongs[i] for i in songs])
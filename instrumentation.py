@@ -0,0 +1,157 @@
+'''
+This file is used to see where build time goes. song_info_build.py and
+the models report through it: each stage of the build records its wall
+time and memory high-water mark, and the topic model records the
+log-likelihood and duration of every EM iteration.
+
+Everything that is reported is kept as a list of events (dictionaries
+with an 'event' kind, the time since the recorder started, and the
+stages it happened in), which can be saved as json lines. Events are
+also passed to listeners as they happen, and (with verbose on, as in
+song_info_build.py and benchmark.py) printed as a one-line summary, which
+is the build's progress output. The build can also be
+run under cProfile, and the profile saved for pstats or other viewers.
+'''
+
+import contextlib
+import cProfile
+import json
+import resource
+import sys
+import time
+
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    '''
+    The memory high-water mark (maximum resident set size) in MB, of this
+    process or (with resource.RUSAGE_CHILDREN) of its largest child.
+    '''
+    rss = resource.getrusage(who).ru_maxrss
+    return rss/2**20 if sys.platform == 'darwin' else rss/2**10
+
+
+def format_event(event):
+    '''
+    A one-line summary of an event.
+    '''
+    if event['event'] == 'stage':
+        return f"{event['name']} : {event['seconds']:.3f} s, max memory {event['max_rss_mb']:.0f} MB"
+    if event['event'] == 'em_iteration':
+        return f"Iteration #{event['iteration']} : log-likelihood {event['log_likelihood']:.6g} ({event['seconds']:.3f} s)"
+    fields = [f'{key} {value}' for (key, value) in event.items() if key not in ['event', 'time', 'within']]
+    return event['event'] + ' : ' + ', '.join(fields)
+
+
+class Recorder:
+    '''
+    Collects events, and times stages.
+    '''
+    def __init__(self, verbose=False):
+        '''
+        With verbose, every event is printed as it happens. Recorders are
+        quiet by default, so the models don't print when used as a library;
+        the build scripts turn verbose on.
+        '''
+        self.verbose = verbose
+        self.events = []
+        self.listeners = []  # functions called with each event
+        self.starttime = time.time()
+        self.stages = []  # names of the stages in progress, outermost first
+        self.profiler = None
+
+    def event(self, kind, **fields):
+        '''
+        Records an event of some kind, with the given fields. Returns the
+        event.
+        '''
+        event = {'event': kind, 'time': time.time() - self.starttime}
+        if self.stages:
+            event['within'] = '/'.join(self.stages)
+        event.update(fields)
+        self.events.append(event)
+        for listener in self.listeners:
+            listener(event)
+        if self.verbose:
+            print(format_event(event))
+        return event
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        Context manager that records a 'stage' event when the code in it
+        finishes, with its wall time, the memory high-water mark of this
+        process (and of worker processes, if there were any) and how much
+        the stage raised it. Stages can be nested.
+        '''
+        rss = max_rss_mb()
+        starttime = time.perf_counter()
+        self.stages.append(name)
+        try:
+            yield
+        finally:
+            self.stages.pop()
+            seconds = time.perf_counter() - starttime
+            fields = {'name': name, 'seconds': seconds, 'max_rss_mb': max_rss_mb(), 'rss_growth_mb': max_rss_mb() - rss}
+            if max_rss_mb(resource.RUSAGE_CHILDREN) > 0:
+                fields['children_max_rss_mb'] = max_rss_mb(resource.RUSAGE_CHILDREN)
+            self.event('stage', **fields)
+
+    def stage_times(self):
+        '''
+        Total seconds of each stage that has finished, by name.
+        '''
+        times = {}
+        for event in self.events:
+            if event['event'] == 'stage':
+                times[event['name']] = times.get(event['name'], 0) + event['seconds']
+        return times
+
+    def start_profile(self):
+        '''
+        Starts profiling this process with cProfile.
+        '''
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def save_profile(self, profile_file):
+        '''
+        Stops profiling, and saves the profile (it can be read with pstats).
+        '''
+        self.profiler.disable()
+        self.profiler.dump_stats(profile_file)
+        self.profiler = None
+
+    def save(self, events_file):
+        '''
+        Saves the events to a file, one json object per line.
+        '''
+        f = open(events_file, 'w')
+        for event in self.events:
+            f.write(json.dumps(event, default=lambda value: value.item() if hasattr(value, 'item') else str(value)) + '\n')
+        f.close()
+
+
+_default_recorder = None
+
+def default_recorder():
+    '''
+    The recorder that the models and the build report to.
+    '''
+    global _default_recorder
+    if _default_recorder is None:
+        _default_recorder = Recorder()
+    return _default_recorder
+
+
+def event(kind, **fields):
+    '''
+    Records an event with the default recorder.
+    '''
+    return default_recorder().event(kind, **fields)
+
+
+def stage(name):
+    '''
+    Times a stage with the default recorder (see Recorder.stage).
+    '''
+    return default_recorder().stage(name)
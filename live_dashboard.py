@@ -0,0 +1,47 @@
+'''
+This is a script that prints a song's dashboard as it plays, updated
+after every chunk of lyrics (see live_scorer.py). Chunks are read from
+standard input, one per line, e.g. piped from a live captioning tool.
+A line can start with the number of seconds into the song, followed by
+a tab; otherwise (or if what is before the tab is not a number) the time
+since the script started is used.
+
+    python3.7 live_dashboard.py "Title" "Artist" < captions.txt
+
+The explicit and topic models saved by song_info_build.py are used.
+'''
+
+import sys
+import time
+import explicit_model
+import live_scorer
+import song_database
+import topics_model
+
+
+# Set options
+explicit_model_file = 'models/explicit_model.txt'
+topic_model_file = 'models/topic_models.txt'
+
+
+# Load the saved models
+explicit = explicit_model.Model()
+explicit.load_model_from_file(explicit_model_file)
+topics = topics_model.Model()
+topics.load_model(topic_model_file)
+if explicit.normalization is None:
+    print(f'{explicit_model_file} has no normalization constant, rebuild it with song_info_build.py', file=sys.stderr)
+    exit(1)
+
+title = sys.argv[1] if len(sys.argv) > 1 else ''
+artist = sys.argv[2] if len(sys.argv) > 2 else ''
+scorer = live_scorer.LiveScorer(explicit, topics, title=title, artist=artist)
+
+
+# Update the dashboard with each chunk of lyrics as it arrives
+starttime = time.time()
+for line in sys.stdin:
+    (seconds, text) = live_scorer.parse_chunk(line)
+    if seconds is None:
+        seconds = time.time() - starttime
+    print(song_database.format_dashboard(scorer.add(text, seconds)) + '\n', flush=True)
@@ -0,0 +1,131 @@
+'''
+This file is used to score a song while it plays, from its lyrics as
+they arrive (e.g. from live captions), so a listener can decide early
+whether to skip it.
+
+Lyrics are added a chunk of words at a time. Only the new words are
+analyzed, and each of them updates running totals in constant time:
+
+- words/second: the number of words so far, over the seconds played.
+- unique words/total words: a set of the words seen so far.
+- explicit score: the sum of the explicit model's weights of the words
+  so far (as in explicit_model.Model.evaluate_song), normalized by the
+  model's highest corpus score, so once the whole song has been added it
+  equals evaluate_new_song.
+- topics: an online version of the topic model's fold-in. Each word's
+  P(z | d, w) is computed from the current P(z | d) and the model's fixed
+  P(w | z), and added to the song's topic counts, which give the new
+  P(z | d). Unlike Model.fold_in, earlier words are not revisited, so the
+  estimate can differ a little from folding in the whole song.
+
+After each chunk, a dashboard with the same fields as the song database
+is returned, with the seconds played so far as the length.
+'''
+
+import numpy as np
+import tokenized_corpus
+import vocabulary
+
+
+class LiveScorer:
+    '''
+    Running song metrics, updated as lyrics arrive.
+    '''
+    def __init__(self, explicit, topics, corpus=None, title='', artist='', featuring='', topic_prior=1.0):
+        '''
+        Initialize with a built or loaded explicit_model.Model and
+        topics_model.Model. Words are analyzed through corpus (a
+        tokenized_corpus.Corpus), or the shared one if None. topic_prior is
+        the number of (pseudo) words spread evenly over the topics before
+        any word arrives, so the first few words don't decide the topics on
+        their own.
+        '''
+        self.explicit = explicit
+        self.topics = topics
+        self.corpus = corpus
+        self.title = title
+        self.artist = artist
+        self.featuring = featuring
+        self.topic_prior = topic_prior
+        self.words = 0
+        self.seen_words = set()
+        self.explicit_sum = 0.0
+        self.topic_counts = np.zeros(topics.number_of_topics)
+        self.document_topic_prob = np.full(topics.number_of_topics, 1/topics.number_of_topics)
+        self.seconds = 0.0
+
+    def add_words(self, words, seconds):
+        '''
+        Adds a chunk of words (a list of strings, as in lyrics.split()),
+        heard by seconds into the song. Returns the updated dashboard.
+        '''
+        self.seconds = seconds
+        self.words += len(words)
+        for word in words:
+            self.seen_words.add(word)
+        if words:
+            corpus = self.corpus or tokenized_corpus.default_corpus()
+            terms = corpus.analyze(' '.join(words))
+            for term in terms:
+                self.add_term(term, int(terms[term]))
+        return self.dashboard()
+
+    def add(self, text, seconds):
+        '''
+        Adds a chunk of lyrics text, heard by seconds into the song.
+        Returns the updated dashboard.
+        '''
+        return self.add_words(text.split(), seconds)
+
+    def add_term(self, term, count):
+        '''
+        Updates the explicit score and topics with an analyzed term that
+        occurred count times.
+        '''
+        self.explicit_sum += count*self.explicit.model.get(term, 0)
+
+        topics = self.topics
+        if term not in topics.vocabulary_ind and topics.hash_buckets:
+            term = '#' + str(vocabulary.hash_bucket(term, topics.hash_buckets))
+        if term not in topics.vocabulary_ind:
+            return
+        # E-step for this word with the current P(z | d), then the M-step
+        topic_prob = self.document_topic_prob*topics.topic_word_prob[:, topics.vocabulary_ind[term]]
+        if topic_prob.sum() == 0:
+            return
+        self.topic_counts += count*topic_prob/topic_prob.sum()
+        prior = self.topic_prior/topics.number_of_topics
+        self.document_topic_prob = (self.topic_counts + prior)/(self.topic_counts.sum() + self.topic_prior)
+
+    def dashboard(self):
+        '''
+        The dashboard of the song so far (see song_database.dashboard).
+        Raises ValueError if the explicit model has no normalization
+        constant (see explicit_model.Model.normalize).
+        '''
+        return {
+            'title': self.title,
+            'artist': self.artist,
+            'length': self.seconds,
+            'featuring': self.featuring,
+            'words_per_second': self.words/self.seconds if self.seconds > 0 else 0.0,
+            'unique_ratio': len(self.seen_words)/self.words if self.words > 0 else 0.0,
+            'explicit': float(self.explicit.normalize(self.explicit_sum)),
+            'topics': self.topics.topics_strlist([self.document_topic_prob])[0],
+        }
+
+
+def parse_chunk(line):
+    '''
+    Splits a line of lyrics that can start with the number of seconds into
+    the song, followed by a tab. Returns (seconds, text), where seconds is
+    None if the line doesn't start with a number and a tab (the whole line
+    is then text).
+    '''
+    if '\t' in line:
+        (prefix, text) = line.split('\t', 1)
+        try:
+            return (float(prefix), text)
+        except ValueError:
+            pass  # a tab in the lyrics, not a time
+    return (None, line)
@@ -0,0 +1,308 @@
+'''
+This file is a pure Python version of the metapy analyzer that
+tokenized_corpus.py runs songs through. It reads the same config file
+(config/config.toml) and supports the filters used there:
+
+    icu-tokenizer (with suppress-tags), lowercase, list (a stopwords
+    file), alpha, length, porter2-filter
+
+The tokenizer splits text into words like ICU's word break rules: runs of
+letters, digits and underscores (with any combining marks), joined by an
+apostrophe, period or colon between letters (e.g. "don't", "u.s.a"), or
+by a comma, period or apostrophe between digits. The filters are then the
+same as metapy's: tokens are lowercased, dropped if they are in the
+stopwords list, stripped of characters that are not letters or
+apostrophes, dropped unless their length is in range, and stemmed
+(porter2.py).
+
+ICU splits Chinese, Japanese and Thai text into words with a dictionary,
+which this tokenizer does not have, so runs of those characters are kept
+as one word. metapy's ICU is also older than Python's unicode data, so
+it drops letters added in recent versions of Unicode. Apart from that,
+the term counts are the same as metapy's.
+
+Text is split into words with one regular expression, and the filters
+only run once for each distinct token of a text. Lyrics repeat the same
+words over and over, so the result of the filters for each token is also
+kept in a bounded cache shared by all songs.
+
+compare_with_metapy runs both analyzers over a song file and reports any
+song whose term counts differ. write_golden saves metapy's term counts
+for a list of texts (tests/data/metapy_terms.jsonl), which the tests
+compare this analyzer with.
+'''
+
+import collections
+import functools
+import json
+import re
+import sys
+import unicodedata
+import porter2
+import song_records
+import toml_config
+
+
+# Some punctuation joins two letters (ICU's MidLetter and MidNumLet), or
+# two digits (MidNum and MidNumLet).
+LETTER_JOINERS = "'.:\u00b7\u0387\u055f\u05f4\u2018\u2019\u2024\u2027\ufe13\ufe52\ufe55\uff07\uff0e\uff1a"
+NUMBER_JOINERS = "',.;\u037e\u0589\u060c\u060d\u066c\u07f8\u2018\u2019\u2024\u2044\ufe10\ufe14\ufe50\ufe52\ufe54\uff07\uff0c\uff0e\uff1b"
+ASTRAL = re.compile('[^\u0000-\uffff]')
+
+
+@functools.lru_cache(maxsize=1)
+def word_patterns():
+    '''
+    The regular expressions of a word, for text in the basic multilingual
+    plane and for any text. Words are runs of letters, digits and
+    connectors like '_', with any combining marks and invisible format
+    characters (except zero-width spaces) inside them, and joined by
+    LETTER_JOINERS or NUMBER_JOINERS.
+
+    The re module only matches character classes quickly when they are
+    all in the basic multilingual plane, so text with other characters
+    (e.g. emoji) is split with the second, slower pattern.
+    '''
+    letters = []
+    others = []
+    for code in range(sys.maxunicode+1):
+        category = unicodedata.category(chr(code))
+        if category[0] == 'L' or category == 'Nl':
+            letters.append(code)
+        elif category in ['Nd', 'Pc', 'Mn', 'Mc', 'Me'] or (category == 'Cf' and code != 0x200b):
+            others.append(code)
+    patterns = []
+    for last in [0xffff, sys.maxunicode]:
+        letter = '[' + character_class([code for code in letters if code <= last]) + ']'
+        word_character = '[' + character_class(sorted([code for code in letters + others if code <= last])) + ']'
+        patterns.append(re.compile(
+            word_character + '+(?:(?:(?<=' + letter + ')[' + re.escape(LETTER_JOINERS) + '](?=' + letter + ')'
+            '|(?<=\\d)[' + re.escape(NUMBER_JOINERS) + '](?=\\d))' + word_character + '+)*'))
+    return tuple(patterns)
+
+
+def character_class(codes):
+    '''
+    A regular expression character class (without the brackets) of a
+    sorted list of code points.
+    '''
+    ranges = []
+    for code in codes:
+        if ranges and ranges[-1][1] == code-1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return ''.join([re.escape(chr(start)) + ('-' + re.escape(chr(end)) if end > start else '') for (start, end) in ranges])
+
+
+FILTERS = ['icu-tokenizer', 'lowercase', 'list', 'alpha', 'length', 'porter2-filter']
+STEM_CACHE_SIZE = 2**18
+
+
+def load_config(config_file):
+    '''
+    Reads the filters of the first analyzer of a config file, as a list of
+    dictionaries of their settings (with 'type'). Raises ValueError if the
+    analyzer is not a unigram word analyzer, or uses a filter this analyzer
+    does not support.
+    '''
+    analyzers = toml_config.load(config_file).get('analyzers', [])
+    analyzer = analyzers[0] if analyzers else None  # only the first analyzer is used
+    filters = [dict(settings) for settings in analyzer.get('filter', [])] if analyzer else []
+    if analyzer is None or analyzer.get('method') != 'ngram-word' or analyzer.get('ngram') != 1:
+        raise ValueError(f'{config_file}: only a unigram ngram-word analyzer is supported')
+    for settings in filters:
+        if settings.get('type') not in FILTERS:
+            raise ValueError(f'{config_file}: unsupported filter "{settings.get("type")}"')
+        if settings['type'] == 'list' and settings.get('method', 'reject') != 'reject':
+            raise ValueError(f'{config_file}: only "reject" list filters are supported')
+    if not filters or filters[0]['type'] != 'icu-tokenizer' or not filters[0].get('suppress-tags', False):
+        raise ValueError(f'{config_file}: the first filter must be an icu-tokenizer with suppress-tags = true')
+    return filters
+
+
+class Analyzer:
+    '''
+    Turns text into term counts, like a metapy analyzer loaded from the
+    same config file.
+    '''
+    def __init__(self, config_file='config/config.toml', stem_cache_size=STEM_CACHE_SIZE):
+        '''
+        Initialize with the analyzer config. stem_cache_size is the most
+        tokens whose filtered term is remembered.
+        '''
+        self.filters = load_config(config_file)[1:]
+        for settings in self.filters:
+            if settings['type'] == 'list':
+                f = open(settings['file'], 'r', encoding='utf-8')
+                settings['words'] = set([line.strip() for line in f])
+                f.close()
+        self.term = functools.lru_cache(maxsize=stem_cache_size)(self.filter_token)
+        (self.word, self.astral_word) = word_patterns()
+
+    def filter_token(self, token):
+        '''
+        Runs a token through the filters. Returns its term, or None if it is
+        filtered out.
+        '''
+        for settings in self.filters:
+            kind = settings['type']
+            if kind == 'lowercase':
+                token = lowercase(token)
+            elif kind == 'list':
+                if token in settings['words']:
+                    return None
+            elif kind == 'alpha':
+                token = ''.join([c for c in token if c.isalpha() or c == "'"])
+                if token == '':
+                    return None
+            elif kind == 'length':
+                if not settings.get('min', 0) <= len(token) <= settings.get('max', len(token)):
+                    return None
+            elif kind == 'porter2-filter':
+                token = stem_like_metapy(token)
+        return token
+
+    def analyze(self, text):
+        '''
+        Returns a dictionary of term counts for text.
+        '''
+        counts = {}
+        pattern = self.astral_word if ASTRAL.search(text) else self.word
+        for (token, count) in collections.Counter(pattern.findall(text)).items():
+            term = self.term(token)
+            if term is not None:
+                counts[term] = counts.get(term, 0) + count
+        return counts
+
+
+def lowercase(token):
+    '''
+    Lowercases a token like metapy, which case folds it one character at a
+    time: e.g. 'ς' becomes 'σ', and characters that only fold to several
+    characters, like 'İ', keep their one character lowercase or are left
+    alone.
+    '''
+    if token.isascii():
+        return token.lower()
+    return ''.join([fold_character(c) for c in token])
+
+
+def fold_character(c):
+    '''
+    The simple case folding of a character.
+    '''
+    folded = c.casefold()
+    if len(folded) == 1:
+        return folded
+    lower = c.lower()
+    return lower if len(lower) == 1 else c
+
+
+def stem_like_metapy(token):
+    '''
+    Stems a token like metapy's porter2-filter, which works on the utf-8
+    bytes of the token: the token is cut to 35 bytes, and every byte of a
+    non-ASCII character counts as a consonant.
+    '''
+    stemmed = porter2.stem(token.encode('utf-8')[:35].decode('latin-1'))
+    return stemmed.encode('latin-1').decode('utf-8', 'ignore')
+
+
+class MetapyAnalyzer:
+    '''
+    The metapy analyzer loaded from a config file, with the same interface
+    as Analyzer.
+    '''
+    def __init__(self, config_file='config/config.toml'):
+        import metapy
+        self.analyzer = metapy.analyzers.load(config_file)
+        self.document = metapy.index.Document()
+
+    def analyze(self, text):
+        '''
+        Returns a dictionary of term counts for text.
+        '''
+        self.document.content(text)
+        counts = self.analyzer.analyze(self.document)
+        return dict((term, counts[term]) for term in counts)
+
+
+def load_analyzer(config_file='config/config.toml', backend='python'):
+    '''
+    Loads the analyzer of a config file, either this file's ('python') or
+    metapy's ('metapy').
+    '''
+    if backend == 'python':
+        return Analyzer(config_file)
+    if backend == 'metapy':
+        return MetapyAnalyzer(config_file)
+    raise ValueError(f'unknown analyzer backend "{backend}"')
+
+
+def compare_with_metapy(songs_file, config_file='config/config.toml', fields=['lyrics']):
+    '''
+    Analyzes the given fields of every song of a song lyrics file with both
+    this analyzer and metapy's. Returns the number of texts compared, and
+    a list of (song number, field, terms that differ) for those whose term
+    counts differ, where terms that differ maps each term to its (python,
+    metapy) counts.
+    '''
+    python_analyzer = Analyzer(config_file)
+    metapy_analyzer = MetapyAnalyzer(config_file)
+    compared = 0
+    differences = []
+    for (i, song) in enumerate(song_records.read_songs(songs_file)):
+        for field in fields:
+            text = str(getattr(song, field))
+            python_counts = python_analyzer.analyze(text)
+            metapy_counts = metapy_analyzer.analyze(text)
+            compared += 1
+            if python_counts != metapy_counts:
+                terms = set(python_counts) | set(metapy_counts)
+                differing = dict((term, (python_counts.get(term, 0), metapy_counts.get(term, 0))) for term in terms
+                    if python_counts.get(term, 0) != metapy_counts.get(term, 0))
+                differences.append((i, field, differing))
+    return (compared, differences)
+
+
+def load_golden(golden_file):
+    '''
+    Reads a golden file of metapy's term counts (see write_golden), as a
+    list of (text, term counts).
+    '''
+    f = open(golden_file, 'r', encoding='utf-8')
+    golden = [tuple(json.loads(line)) for line in f if line.strip()]
+    f.close()
+    return golden
+
+
+def write_golden(golden_file, texts=None, config_file='config/config.toml'):
+    '''
+    Analyzes texts with metapy, and writes each text with its term counts
+    to golden_file, as one json list per line. With texts None, the texts
+    already in golden_file are analyzed again. The tests compare this
+    analyzer with the golden file, so they don't need metapy.
+    '''
+    if texts is None:
+        texts = [text for (text, counts) in load_golden(golden_file)]
+    analyzer = MetapyAnalyzer(config_file)
+    f = open(golden_file, 'w', encoding='utf-8')
+    for text in texts:
+        counts = analyzer.analyze(text)
+        f.write(json.dumps([text, dict(sorted(counts.items()))]) + '\n')
+    f.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--golden':
+        write_golden(sys.argv[2])
+    elif len(sys.argv) == 2:
+        (compared, differences) = compare_with_metapy(sys.argv[1], fields=['title', 'artist', 'featuring', 'lyrics'])
+        for (i, field, differing) in differences[:20]:
+            print(f'song #{i} {field}: {differing}')
+        print(f'{compared} texts compared, {len(differences)} differ')
+    else:
+        print('usage: python3.7 lyric_analyzer.py SONG_LYRICS_FILE    (compare with metapy)')
+        print('       python3.7 lyric_analyzer.py --golden GOLDEN_FILE    (rewrite a golden file with metapy)')
+        sys.exit(2)
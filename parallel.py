@@ -0,0 +1,24 @@
+'''
+This file has helpers for splitting work on songs across a pool of
+worker processes (see song_info_build.py).
+
+Songs are split into contiguous shards, so results that are computed per
+shard can be put back together in the original song order.
+'''
+
+
+def make_shards(items, number_of_shards):
+    '''
+    Splits a list into (at most) number_of_shards contiguous, nearly equal
+    parts, in order. Empty parts are left out.
+    '''
+    n = len(items)
+    shards = [items[i*n//number_of_shards:(i+1)*n//number_of_shards] for i in range(number_of_shards)]
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def concatenate(shard_results):
+    '''
+    Joins per-shard lists of results back into one list.
+    '''
+    return [result for shard in shard_results for result in shard]
@@ -0,0 +1,183 @@
+'''
+This file is a pure Python version of the Porter2 (Snowball English)
+stemmer, the last step of the analyzer in config/config.toml. It gives the
+same stems as the porter2-filter of metapy.
+
+See https://snowballstem.org/algorithms/english/stemmer.html for the
+algorithm. Words are expected to be lowercase. 'Y' marks a y that is used
+as a consonant while stemming.
+
+metapy's stemmer differs from the published algorithm in a few places,
+and this file follows metapy: 'cosmos' is not an exception, a y is only
+marked as a consonant after a, e, i, o or u (not after another y), and in
+step 1c a y before the final y counts as a non-vowel.
+'''
+
+
+VOWELS = 'aeiouy'
+DOUBLES = ['bb', 'dd', 'ff', 'gg', 'mm', 'nn', 'pp', 'rr', 'tt']
+LI_ENDINGS = 'cdeghkmnrt'
+
+# Words that are stemmed to a fixed form, or left alone.
+EXCEPTIONS = {
+    'skis': 'ski', 'skies': 'sky', 'dying': 'die', 'lying': 'lie', 'tying': 'tie',
+    'idly': 'idl', 'gently': 'gentl', 'ugly': 'ugli', 'early': 'earli',
+    'only': 'onli', 'singly': 'singl',
+    'sky': 'sky', 'news': 'news', 'howe': 'howe', 'atlas': 'atlas',
+    'bias': 'bias', 'andes': 'andes',
+}
+# Words left alone after step 1a.
+STEP_1A_EXCEPTIONS = ['inning', 'outing', 'canning', 'herring', 'earring', 'proceed', 'exceed', 'succeed']
+
+STEP_2_SUFFIXES = [
+    ('ization', 'ize'), ('ational', 'ate'), ('fulness', 'ful'), ('ousness', 'ous'),
+    ('iveness', 'ive'), ('tional', 'tion'), ('biliti', 'ble'), ('lessli', 'less'),
+    ('entli', 'ent'), ('ation', 'ate'), ('alism', 'al'), ('aliti', 'al'), ('ousli', 'ous'),
+    ('iviti', 'ive'), ('fulli', 'ful'), ('enci', 'ence'), ('anci', 'ance'), ('abli', 'able'),
+    ('izer', 'ize'), ('ator', 'ate'), ('alli', 'al'), ('bli', 'ble'), ('ogi', 'og'), ('li', ''),
+]
+STEP_3_SUFFIXES = [
+    ('ational', 'ate'), ('tional', 'tion'), ('alize', 'al'), ('icate', 'ic'), ('iciti', 'ic'),
+    ('ative', ''), ('ical', 'ic'), ('ness', ''), ('ful', ''),
+]
+STEP_4_SUFFIXES = [
+    'ement', 'ance', 'ence', 'able', 'ible', 'ment', 'ant', 'ent', 'ism', 'ate', 'iti', 'ous',
+    'ive', 'ize', 'ion', 'al', 'er', 'ic',
+]
+
+
+def region_start(word, start):
+    '''
+    The start of the region after the first non-vowel following a vowel,
+    looking from start (R1 from 0, R2 from R1). len(word) if there is none.
+    '''
+    for i in range(max(start, 1), len(word)):
+        if word[i] not in VOWELS and word[i-1] in VOWELS:
+            return i+1
+    return len(word)
+
+
+def ends_in_short_syllable(word):
+    '''
+    Whether a word ends in a short syllable: a vowel followed by a
+    non-vowel other than w, x or Y and preceded by a non-vowel, or a vowel
+    at the start of the word followed by a non-vowel.
+    '''
+    if len(word) == 2:
+        return word[0] in VOWELS and word[1] not in VOWELS
+    return (len(word) > 2 and word[-3] not in VOWELS and word[-2] in VOWELS
+        and word[-1] not in VOWELS and word[-1] not in 'wxY')
+
+
+def longest_suffix(word, suffixes):
+    '''
+    The longest of suffixes (sorted longest first) that word ends with, or
+    None.
+    '''
+    for suffix in suffixes:
+        if word.endswith(suffix):
+            return suffix
+    return None
+
+
+def stem(word):
+    '''
+    The Porter2 stem of a lowercase word.
+    '''
+    if len(word) <= 2:
+        return word
+    if word[0] == "'":
+        word = word[1:]
+    if word in EXCEPTIONS:
+        return EXCEPTIONS[word]
+
+    # mark the y's that are consonants
+    if word[0] == 'y':
+        word = 'Y' + word[1:]
+    characters = list(word)
+    for i in range(1, len(characters)):
+        if characters[i] == 'y' and characters[i-1] in 'aeiou':
+            characters[i] = 'Y'
+    word = ''.join(characters)
+
+    if word.startswith('gener') or word.startswith('arsen'):
+        r1 = 5
+    elif word.startswith('commun'):
+        r1 = 6
+    else:
+        r1 = region_start(word, 1)
+    r2 = region_start(word, r1+1) if r1 < len(word) else r1
+
+    # step 0
+    suffix = longest_suffix(word, ["'s'", "'s", "'"])
+    if suffix is not None:
+        word = word[:-len(suffix)]
+
+    # step 1a
+    suffix = longest_suffix(word, ['sses', 'ied', 'ies', 'us', 'ss', 's'])
+    if suffix == 'sses':
+        word = word[:-2]
+    elif suffix in ['ied', 'ies']:
+        word = word[:-3] + ('i' if len(word) > 4 else 'ie')
+    elif suffix == 's':
+        if any([c in VOWELS for c in word[:-2]]):
+            word = word[:-1]
+    if word in STEP_1A_EXCEPTIONS:
+        return word
+
+    # step 1b
+    suffix = longest_suffix(word, ['eedly', 'ingly', 'edly', 'eed', 'ing', 'ed'])
+    if suffix in ['eedly', 'eed']:
+        if len(word) - len(suffix) >= r1:
+            word = word[:-len(suffix)] + 'ee'
+    elif suffix is not None:
+        stemmed = word[:-len(suffix)]
+        if any([c in VOWELS for c in stemmed]):
+            word = stemmed
+            if word.endswith('at') or word.endswith('bl') or word.endswith('iz'):
+                word += 'e'
+            elif word[-2:] in DOUBLES:
+                word = word[:-1]
+            elif r1 >= len(word) and ends_in_short_syllable(word):
+                word += 'e'
+
+    # step 1c
+    if len(word) > 2 and word[-1] in 'yY' and word[-2] not in 'aeiou':
+        word = word[:-1] + 'i'
+
+    # step 2
+    suffix = longest_suffix(word, [suffix for (suffix, replacement) in STEP_2_SUFFIXES])
+    if suffix is not None and len(word) - len(suffix) >= r1:
+        replacement = dict(STEP_2_SUFFIXES)[suffix]
+        if suffix == 'ogi':
+            if word[-4] == 'l':
+                word = word[:-3] + replacement
+        elif suffix == 'li':
+            if word[-3] in LI_ENDINGS:
+                word = word[:-2]
+        else:
+            word = word[:-len(suffix)] + replacement
+
+    # step 3
+    suffix = longest_suffix(word, [suffix for (suffix, replacement) in STEP_3_SUFFIXES])
+    if suffix is not None and len(word) - len(suffix) >= r1:
+        if suffix == 'ative':
+            if len(word) - len(suffix) >= r2:
+                word = word[:-5]
+        else:
+            word = word[:-len(suffix)] + dict(STEP_3_SUFFIXES)[suffix]
+
+    # step 4
+    suffix = longest_suffix(word, STEP_4_SUFFIXES)
+    if suffix is not None and len(word) - len(suffix) >= r2:
+        if suffix != 'ion' or word[-4:-3] in ['s', 't']:
+            word = word[:-len(suffix)]
+
+    # step 5
+    if word.endswith('e'):
+        if len(word) - 1 >= r2 or (len(word) - 1 >= r1 and not ends_in_short_syllable(word[:-1])):
+            word = word[:-1]
+    elif word.endswith('ll') and len(word) - 1 >= r2:
+        word = word[:-1]
+
+    return word.replace('Y', 'y')
@@ -0,0 +1,281 @@
+'''
+This script scrapes song lyrics (and other data) from Genius, like
+genius_scraper.py, but fetches pages over plain HTTP with many songs in
+flight at once instead of driving a browser one song at a time.
+
+A bounded number of worker tasks take songs from a queue. All requests
+go through a token-bucket rate limiter, and failed requests (connection
+errors, timeouts, 429 and 5xx responses) are retried with exponential
+backoff. Parsing is done by the pure functions in genius_parsing.py.
+
+Fetched pages can be kept in a PageCache, and song urls and scraped
+songs in a Journal (see page_cache.py). A scrape that is stopped then
+resumes where it left off, and reparse_songs_from_cache re-applies the
+parser to the cached pages without using the network. Searches with no
+hits are not cached, so songs that were not found are searched again
+when a scrape is resumed, and a cached song page that can't be parsed is
+fetched again.
+
+The base url can be changed, so the scraper can be run against a local
+server that serves saved pages.
+
+Usage: python3.7 async_genius_scraper.py songs_list.txt [output_file]
+       python3.7 async_genius_scraper.py --reparse songs_list.txt [output_file]
+'''
+
+import asyncio
+import random
+import sys
+import time
+import aiohttp
+import genius_parsing
+import page_cache
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    '''
+    Rate limiter: allows rate requests per second on average, with bursts
+    of up to capacity requests.
+    '''
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        '''
+        Waits until a request is allowed.
+        '''
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now-self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1-self.tokens)/self.rate)
+
+
+class GeniusScraper:
+    '''
+    Scrapes songs from Genius (or a server at base_url with the same pages).
+    Pages are read from and added to cache, and urls and songs to journal,
+    when they are given.
+    '''
+    def __init__(self, base_url='https://genius.com', concurrency=8, rate=5.0, burst=10, retries=5, backoff=1.0, timeout=15, cache=None, journal=None):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.journal = journal
+
+    def page_url(self, song_url):
+        '''
+        The url to fetch a song page from (song urls point to genius.com).
+        '''
+        if song_url.startswith('https://genius.com'):
+            return self.base_url + song_url[len('https://genius.com'):]
+        return song_url
+
+    async def fetch(self, session, limiter, url, keep=None, refresh=False):
+        '''
+        Fetches a page, retrying with exponential backoff (and jitter) on
+        errors that may be temporary. Returns the page text, or None.
+        Pages are read from and added to the cache, except that with
+        refresh the cached page is not used, and pages for which keep(page)
+        is false (e.g. searches with no hits) are not cached, so they are
+        fetched again on the next run.
+        '''
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(url)
+            if cached is not None and (keep is None or keep(cached[0])):
+                return cached[0]
+        for attempt in range(self.retries):
+            await limiter.acquire()
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        text = await response.text()
+                        if self.cache is not None and (keep is None or keep(text)):
+                            self.cache.put(url, text)
+                        return text
+                    if response.status not in RETRY_STATUSES:
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            if attempt < self.retries-1:
+                await asyncio.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.0))
+        return None
+
+    async def scrape_song(self, session, limiter, title, artist):
+        '''
+        Finds and scrapes a song. Returns [title, artist, length, featuring,
+        lyrics], or a string saying why the song could not be scraped.
+        '''
+        journal = self.journal
+        if journal is not None and (title, artist) in journal.songs:
+            return journal.songs[(title, artist)]
+        if journal is not None and (title, artist) in journal.urls:
+            song_url = journal.urls[(title, artist)]
+        else:
+            text = await self.fetch(session, limiter, genius_parsing.search_api_url(title, artist, self.base_url),
+                keep=lambda text: genius_parsing.parse_search_api(text) is not None)
+            song_url = genius_parsing.parse_search_api(text) if text is not None else None
+            if not song_url:
+                return 'SONG NOT FOUND'
+            if journal is not None:
+                journal.add_url(title, artist, song_url)
+
+        html = await self.fetch(session, limiter, self.page_url(song_url))
+        song = genius_parsing.parse_song_page(html) if html is not None else None
+        if not song and self.cache is not None:
+            # the cached page may be a bad one, fetch it again
+            html = await self.fetch(session, limiter, self.page_url(song_url), refresh=True)
+            song = genius_parsing.parse_song_page(html) if html is not None else None
+        if not song:
+            return 'SONG PAGE CANNOT BE PARSED'
+        [song_title, song_artist, featuring, lyrics, apple_music_id] = song
+        html = await self.fetch(session, limiter, genius_parsing.apple_music_player_url(apple_music_id, self.base_url))
+        length = genius_parsing.parse_apple_music_player(html) if html is not None else None
+        if length is None:
+            return 'SONG LENGTH NOT FOUND'
+        song = [song_title, song_artist, length, featuring, lyrics]
+        if journal is not None:
+            journal.add_song(title, artist, song)
+        return song
+
+    async def scrape_songs_async(self, songs):
+        '''
+        Scrapes a list of (title, artist) pairs with a pool of worker tasks.
+        Returns the results in the same order (see scrape_song).
+        '''
+        results = [None]*len(songs)
+        queue = asyncio.Queue()
+        for (i, song) in enumerate(songs):
+            queue.put_nowait((i, song))
+        limiter = TokenBucket(self.rate, self.burst)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+
+            async def worker():
+                while not queue.empty():
+                    (i, (title, artist)) = queue.get_nowait()
+                    results[i] = await self.scrape_song(session, limiter, title, artist)
+                    if isinstance(results[i], str):
+                        print(f'{results[i]} :   {title}   {artist}')
+                    else:
+                        print(f'finished song {i+1} : {results[i][0]} by {results[i][1]}')
+
+            await asyncio.gather(*[worker() for i in range(self.concurrency)])
+        return results
+
+    def scrape_songs(self, songs):
+        '''
+        Scrapes a list of (title, artist) pairs, see scrape_songs_async.
+        '''
+        return asyncio.run(self.scrape_songs_async(songs))
+
+
+def read_song_list(input_file):
+    '''
+    Reads a song list written by billboard_scraper.py ('title || artist'
+    per line).
+    '''
+    songs = []
+    songs_file = open(input_file, 'r')
+    for line in songs_file.readlines():
+        [title, artist] = line.strip().split(' || ')
+        songs.append((title, artist))
+    songs_file.close()
+    return songs
+
+
+def write_songs(results, output_file):
+    '''
+    Writes the songs that were found to a song lyrics file. Songs that
+    resolve to the same title and artist are only written once. Returns
+    the number of songs written.
+    '''
+    songs_added = set()
+    outputsongs = []
+    for song in results:
+        if isinstance(song, str):
+            continue
+        if f'{song[0]} by {song[1]}' in songs_added:
+            print(f'SONG ALREADY ADDED : {song[0]}  {song[1]}')
+            continue
+        songs_added.add(f'{song[0]} by {song[1]}')
+        outputsongs.append(genius_parsing.format_song_record(*song))
+    f = open(output_file, 'w')
+    f.write('\n'.join(outputsongs))
+    f.close()
+    return len(outputsongs)
+
+
+def scrape_songs_from_list(input_file, output_file='songs_lyrics.txt', scraper=None, cache_dir='page_cache', journal_file='scrape_journal.jsonl'):
+    '''
+    Scrapes all songs of a song list, and writes those that were found to
+    a song lyrics file. Pages are cached in cache_dir, and progress is
+    journaled to journal_file, so running it again resumes the scrape.
+    '''
+    journal = page_cache.Journal(journal_file)
+    scraper = scraper or GeniusScraper()
+    scraper.cache = page_cache.PageCache(cache_dir)
+    scraper.journal = journal
+    starttime = time.time()
+    results = scraper.scrape_songs(read_song_list(input_file))
+    journal.close()
+    number_written = write_songs(results, output_file)
+    print(f'{number_written} songs written. Time : {(time.time()-starttime)/60} minutes')
+
+
+def reparse_songs_from_cache(input_file, output_file='songs_lyrics.txt', cache_dir='page_cache', journal_file='scrape_journal.jsonl', base_url='https://genius.com'):
+    '''
+    Parses the songs of a song list again from the cached pages of a
+    previous scrape, without fetching anything, and writes them to a song
+    lyrics file. The journal is updated with the newly parsed songs.
+    '''
+    cache = page_cache.PageCache(cache_dir)
+    journal = page_cache.Journal(journal_file)
+    scraper = GeniusScraper(base_url)
+    results = []
+    for (title, artist) in read_song_list(input_file):
+        song = None
+        if (title, artist) in journal.urls:
+            cached = cache.get(scraper.page_url(journal.urls[(title, artist)]))
+            song = genius_parsing.parse_song_page(cached[0]) if cached is not None else None
+        if song:
+            cached = cache.get(genius_parsing.apple_music_player_url(song[4], base_url))
+            length = genius_parsing.parse_apple_music_player(cached[0]) if cached is not None else None
+            song = [song[0], song[1], length, song[2], song[3]] if length is not None else None
+        if not song:
+            print(f'SONG NOT IN CACHE :   {title}   {artist}')
+            results.append('SONG NOT IN CACHE')
+            continue
+        journal.add_song(title, artist, song)
+        results.append(song)
+    journal.close()
+    print(f'{write_songs(results, output_file)} songs written.')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or (sys.argv[1] == '--reparse' and len(sys.argv) < 3):
+        print('Usage: python3.7 async_genius_scraper.py songs_list.txt [output_file]')
+        print('       python3.7 async_genius_scraper.py --reparse songs_list.txt [output_file]')
+        sys.exit(2)
+    if sys.argv[1] == '--reparse':
+        reparse_songs_from_cache(*sys.argv[2:4])
+    elif len(sys.argv) > 2:
+        scrape_songs_from_list(sys.argv[1], sys.argv[2])
+    else:
+        scrape_songs_from_list(sys.argv[1])
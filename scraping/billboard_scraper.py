@@ -1,48 +1,138 @@
 import sys
-import numpy as np
-import re
+import queue
+import concurrent.futures
 from bs4 import BeautifulSoup
-from selenium import webdriver 
-from selenium.webdriver.chrome.options import Options
 
 # This script can be used to get song titles/artists from Billboards top-100 records.
 # Give the number of songs (X) desired as input. This will return the X most recent songs.
+# The number of browsers used to fetch charts at the same time can be given as a second input.
+#
+# Monthly charts are fetched several at a time, newest first, by a pool of browsers that are
+# reused from chart to chart. Charts are still processed in date order, and each new
+# (title, artist) pair is written to the output file as soon as it is found. Fetching stops
+# once X songs have been written.
 
 NUMBER_OF_SONGS = 50
+NUMBER_OF_BROWSERS = 1
+START_YEAR, START_MONTH = 2019, 11
+END_YEAR, END_MONTH = 1958, 8  # first Hot 100 chart
+OUTPUT_FILE = 'out.txt'
 
-try:
-    NUMBER_OF_SONGS = int(sys.argv[1])
-except:
-    pass
 
+def chart_dates(start_year, start_month, end_year, end_month):
+    '''
+    Yields (year, month) of each monthly chart from the start date back to the end date.
+    '''
+    (year, month) = (start_year, start_month)
+    while (year, month) >= (end_year, end_month):
+        yield (year, month)
+        year = year - (month==1)
+        month = (month-2)%12+1
 
-songs = set()
 
-month = 11
-year = 2019
+def chart_url(year, month):
+    return f'https://www.billboard.com/charts/hot-100/{year}-{month:02d}-01'
 
-while (len(songs) < NUMBER_OF_SONGS):
-    url = f'https://www.billboard.com/charts/hot-100/{year}-{month:02d}-01'
-    print(f'{len(songs):5} parsing  :  {url}')
-    options = Options()
-    options.headless = True
-    browser = webdriver.Chrome('./chromedriver',options=options)
-    browser.get(url)
-    html = browser.execute_script('return document.body.innerHTML')
+
+def parse_chart(html):
+    '''
+    Returns the (title, artist) pairs of a chart page, in chart order.
+    '''
     soup = BeautifulSoup(html,'html.parser')
-    htmlstr = str(soup)
-    browser.quit()
-    rows = soup.find_all('li', {'class' : 'chart-list__element display--flex'})
-    for row in rows:
+    songs = []
+    for row in soup.find_all('li', {'class' : 'chart-list__element display--flex'}):
         title = row.find('span', {'class' : 'chart-element__information__song'}).text
         artist = row.find('span', {'class' : 'chart-element__information__artist'}).text
-        songs.add((title, artist))
-    year = year - (month==1)
-    month = (month-2)%12+1
+        songs.append((title, artist))
+    return songs
+
+
+class BrowserPool:
+    '''
+    Headless browsers that are started once and reused for every page. fetch can be
+    called from several threads; each call uses a browser no other thread is using.
+    '''
+    def __init__(self):
+        self.browsers = []
+        self.idle = queue.Queue()
+
+    def fetch(self, url):
+        try:
+            browser = self.idle.get_nowait()
+        except queue.Empty:
+            browser = self.start_browser()
+        try:
+            browser.get(url)
+            return browser.execute_script('return document.body.innerHTML')
+        finally:
+            self.idle.put(browser)
+
+    def start_browser(self):
+        # imported here, so the parsing and ingestion functions can be used without selenium
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        options = Options()
+        options.headless = True
+        browser = webdriver.Chrome('./chromedriver',options=options)
+        self.browsers.append(browser)
+        return browser
+
+    def close(self):
+        for browser in self.browsers:
+            browser.quit()
+        self.browsers = []
+
+
+def ingest_charts(number_of_songs, output_file, fetch, workers, dates):
+    '''
+    Fetches the charts of dates with fetch (a function from url to html), using up to
+    workers threads, and writes new (title, artist) pairs to output_file in chart order
+    until number_of_songs have been written. Returns the number of songs written.
+    '''
+    songs = set()
+    outfile = open(output_file,'w')
+    dates = iter(dates)
+    pending = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while len(songs) < number_of_songs:
+            # keep a few charts ahead of the one being processed
+            for (year, month) in dates:
+                pending.append((chart_url(year, month), executor.submit(fetch, chart_url(year, month))))
+                if len(pending) >= 2*workers:
+                    break
+            if not pending:
+                break
+            (url, future) = pending.pop(0)
+            print(f'{len(songs):5} parsing  :  {url}')
+            try:
+                chart = parse_chart(future.result())
+            except Exception as e:
+                print(f'CHART CANNOT BE FETCHED : {url} ({e})')
+                continue
+            for song in chart:
+                if song in songs:
+                    continue
+                songs.add(song)
+                outfile.write(song[0] + ' || ' + song[1] + '\n')
+                if len(songs) == number_of_songs:
+                    break
+            outfile.flush()
+        for (url, future) in pending:
+            future.cancel()
+    outfile.close()
+    return len(songs)
+
 
-print(len(songs))
+if __name__ == '__main__':
+    try:
+        NUMBER_OF_SONGS = int(sys.argv[1])
+        NUMBER_OF_BROWSERS = int(sys.argv[2])
+    except:
+        pass
 
-outfile = open('out.txt','w')
-for song in songs:
-    outfile.write(song[0] + ' || ' + song[1] + '\n')
-outfile.close()
+    browsers = BrowserPool()
+    try:
+        dates = chart_dates(START_YEAR, START_MONTH, END_YEAR, END_MONTH)
+        print(ingest_charts(NUMBER_OF_SONGS, OUTPUT_FILE, browsers.fetch, NUMBER_OF_BROWSERS, dates))
+    finally:
+        browsers.close()
@@ -0,0 +1,113 @@
+'''
+This file has the parsing logic for Genius pages, shared by the
+scrapers. The functions are pure: they take page contents (html or
+json text) and return the parsed values, without fetching anything, so
+they can be used on live pages, cached pages or saved fixtures alike.
+'''
+
+import json
+import re
+import urllib.parse
+from bs4 import BeautifulSoup
+
+
+def clean_search_terms(title, artist):
+    '''
+    Simplifies a Billboard title/artist for searching Genius: only the
+    main artist is kept, and parenthesized parts of the title are removed.
+    '''
+    artist = artist.split(' Featuring ')[0].split(' With ')[0].replace(' & ', ' ').replace(', ', ' ').replace(' x ', ' ').replace(' + ', ' ')
+    title = title.split(' (')[0]
+    return (title, artist)
+
+
+def search_page_url(title, artist, base_url='https://genius.com'):
+    '''
+    The url of the (javascript rendered) search page for a song.
+    '''
+    (title, artist) = clean_search_terms(title, artist)
+    return base_url + '/search?q=' + title + ' ' + artist
+
+
+def search_api_url(title, artist, base_url='https://genius.com'):
+    '''
+    The url of the json song search for a song.
+    '''
+    (title, artist) = clean_search_terms(title, artist)
+    return base_url + '/api/search/song?q=' + urllib.parse.quote(title + ' ' + artist)
+
+
+def parse_search_page(html):
+    '''
+    Finds the song url in a rendered search page, or returns None.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    cards = soup.find_all('a', {'class': 'mini_card'})
+    if len(cards) < 2:
+        return None
+    return cards[1]['href']
+
+
+def parse_search_api(text):
+    '''
+    Finds the url of the first song hit in a json song search, or
+    returns None.
+    '''
+    try:
+        for section in json.loads(text)['response']['sections']:
+            for hit in section['hits']:
+                return hit['result']['url']
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def parse_song_page(html):
+    '''
+    Parses a song page. Returns [title, artist, featuring, lyrics,
+    apple music player id], or None if the page can't be parsed.
+    '''
+    try:
+        soup = BeautifulSoup(html, 'html.parser')
+        lyric_div = soup.find('div', {'class': 'lyrics'})
+        if lyric_div is None:
+            return None
+        lyrics = BeautifulSoup(re.sub('<br/>', ' ', str(lyric_div)), 'html.parser').text
+        lyrics = ' '.join(lyrics.split())
+        lyrics = re.sub(r'\[[^]]*\]', '', lyrics)
+        title = ' '.join(soup.find('h1').text.split())
+        artist = ' '.join(soup.find('h2').text.split())
+        featuring_list = soup.find('expandable-list', {'label': 'Featuring'})
+        featuring = ' '.join(featuring_list.text.split()) if featuring_list is not None else ''
+        apple_links_id = re.findall('/songs/([0-9]+)/apple_music_player', str(soup))
+        if not apple_links_id:
+            return None
+        return [title, artist, featuring, lyrics, apple_links_id[0]]
+    except AttributeError:
+        return None
+
+
+def apple_music_player_url(apple_music_id, base_url='https://genius.com'):
+    '''
+    The url of the apple music player page, which has the song's length.
+    '''
+    return f'{base_url}/songs/{apple_music_id}/apple_music_player'
+
+
+def parse_apple_music_player(html):
+    '''
+    Finds the song length (in seconds) in an apple music player page, or
+    returns None.
+    '''
+    durations = re.findall(r'"duration":([0-9]+\.?[0-9]*),"country_codes"', html)
+    if not durations:
+        return None
+    return float(durations[0])
+
+
+def format_song_record(title, artist, length, featuring, lyrics):
+    '''
+    Formats a song as a record of the song lyrics file (see song_records.py
+    in the main directory). Records are joined with newlines.
+    '''
+    return f'#\n{title}\n{artist}\n{length}\n{featuring}\n{lyrics}\n'
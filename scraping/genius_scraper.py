@@ -1,13 +1,12 @@
 import sys
 import numpy as np
-import re
-from bs4 import BeautifulSoup
 from selenium import webdriver 
 from selenium.webdriver.chrome.options import Options
-import re 
 import urllib
 import atexit
 import time
+import genius_parsing
+import page_cache
 
 options = Options()
 options.headless = True
@@ -18,43 +17,40 @@ def close_browser():
     browser.quit()
 atexit.register(close_browser)
 
-def get_soup(url):
+# Rendered pages are cached, and song urls and scraped songs are journaled,
+# so that running the script again resumes the scrape (see page_cache.py).
+cache = page_cache.PageCache('page_cache')
+journal = page_cache.Journal('scrape_journal.jsonl')
+
+def get_html(url, refresh=False):
+    if not refresh:
+        cached = cache.get(url)
+        if cached is not None:
+            return cached[0]
     browser.get(url)
     html = browser.execute_script('return document.body.innerHTML')
-    soup = BeautifulSoup(html,'html.parser')
-    return soup
+    cache.put(url, html)
+    return html
 
-def scrape_song_page(url):
+def scrape_song_page(url, refresh=False):
     try:
-        soup = get_soup(url)
-        lyric_div = str(soup.find('div', {'class' : 'lyrics'}))
-        lyrics = BeautifulSoup(re.sub('<br/>', ' ', lyric_div), 'html.parser').text
-        lyrics = ' '.join(lyrics.split())
-        lyrics = re.sub(r'\[[^]]*\]', '', lyrics)
-        title = ' '.join(soup.find('h1').text.split())
-        artist = ' '.join(soup.find('h2').text.split())
-        featuring = ' '.join(soup.find('expandable-list', {'label' : 'Featuring'}).text.split())
-        
-        apple_links_id = re.findall('https://genius.com/songs/([0-9]*)/apple_music_player', str(soup))
-        soup = get_soup(f'https://genius.com/songs/{apple_links_id[0]}/apple_music_player')
-        length = float(re.findall('"duration":([0-9]+\.?[0-9]*),"country_codes"', str(soup))[0])
-
+        song = genius_parsing.parse_song_page(get_html(url, refresh))
+        if not song:
+            return False
+        [title, artist, featuring, lyrics, apple_music_id] = song
+        length = genius_parsing.parse_apple_music_player(get_html(genius_parsing.apple_music_player_url(apple_music_id), refresh))
+        if length is None:
+            return False
         return [title, artist, length, featuring, lyrics]
     except KeyboardInterrupt:
         quit()
     except :
         return False
 
-def find_song_page(title, artist):
-    search_url_prefix = 'https://genius.com/search?q='
+def find_song_page(title, artist, refresh=False):
     try:
-        artist = artist.split(' Featuring ')[0].split(' With ')[0].replace(' & ', ' ').replace(', ', ' ').replace(' x ', ' ').replace(' + ', ' ')
-        title = title.split(' (')[0]
-        query_url = search_url_prefix+title+' '+artist
-        soup = get_soup(query_url)
-        href = soup.find_all('a', {'class', 'mini_card'})[1]['href']
-        return href
-    
+        href = genius_parsing.parse_search_page(get_html(genius_parsing.search_page_url(title, artist), refresh))
+        return href or False
     except KeyboardInterrupt:
         quit()
     except :
@@ -75,33 +71,36 @@ def scrape_songs_from_list(input_file):
     starttime = time.time()
     for title, artist in songs:
         x += 1
-        song_url,i = False,0
-        while not song_url and i < 5:
-            song_url = find_song_page(title, artist)
+        song = journal.songs.get((title, artist), False)
+        song_url,i = journal.urls.get((title, artist), False),0
+        while not song and not song_url and i < 5:
+            song_url = find_song_page(title, artist, refresh=i>0)
             i += 1
-        if not song_url:
+        if not song and not song_url:
             print(f'SONG NOT FOUND :   {title}   {artist}')
             continue
-        
-        song,i = False,0
+        if not song and (title, artist) not in journal.urls:
+            journal.add_url(title, artist, song_url)
+
+        i = 0
         while  not song and i < 5:
-            song = scrape_song_page(song_url)
+            song = scrape_song_page(song_url, refresh=i>0)
             i += 1
         if not song:
             print(f'SONG PAGE CANNOT BE PARSED :   {title}   {artist}')
             continue
+        if (title, artist) not in journal.songs:
+            journal.add_song(title, artist, song)
         if f'{song[0]} by {song[1]}' in songs_added:
             print(f'SONG ALREADY ADDED : {song[0]}  {song[1]}')
             continue
         songs_added.add(f'{song[0]} by {song[1]}')
-        outputsong = f'#\n{song[0]}\n{song[1]}\n{song[2]}\n{song[3]}\n{song[4]}\n'
+        outputsong = genius_parsing.format_song_record(*song)
         outputsongs.append(outputsong)
         print(f'finished song {x} : {song[0]} by {song[1]}')
         if x%200==0:
-            print(f'Rewriting to file. Time : {(time.time()-starttime)/60} minutes')
-            f = open('songs_lyrics.txt','w')
-            f.write('\n'.join(outputsongs))
-            f.close()
+            print(f'Time : {(time.time()-starttime)/60} minutes')
+    journal.close()
     f = open('songs_lyrics.txt','w')
     f.write('\n'.join(outputsongs))
     f.close()
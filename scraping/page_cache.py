@@ -0,0 +1,128 @@
+'''
+This file has the on-disk storage used by the scrapers, so that a scrape
+can be stopped and resumed, and re-parsed without the network.
+
+PageCache keeps every fetched page, compressed, in a file named after a
+hash of its url, along with the time it was fetched.
+
+Journal is an append-only file with one json line per event: the song
+url found for a (title, artist) of the song list, or the record scraped
+for it. Lines are written (and flushed) as soon as they are known, so a
+crash loses at most the song in progress. Loading a journal replays it;
+a partly written last line is ignored.
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import time
+
+
+class PageCache:
+    '''
+    Fetched pages, keyed by url.
+    '''
+    def __init__(self, cache_dir='page_cache'):
+        self.cache_dir = cache_dir
+
+    def path(self, url):
+        '''
+        The cache file of a url.
+        '''
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.gz')
+
+    def get(self, url, max_age=None):
+        '''
+        Returns (page, time fetched) for a cached url, or None if it is not
+        cached (or was fetched more than max_age seconds ago).
+        '''
+        path = self.path(url)
+        if not os.path.exists(path):
+            return None
+        f = gzip.open(path, 'rt', encoding='utf-8')
+        header = json.loads(f.readline())
+        page = f.read()
+        f.close()
+        if header['url'] != url:
+            return None
+        if max_age is not None and time.time() - header['fetched'] > max_age:
+            return None
+        return (page, header['fetched'])
+
+    def put(self, url, page):
+        '''
+        Stores a fetched page. The file is written under a temporary name
+        first, so an interrupted write never leaves a broken cache entry.
+        '''
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = gzip.open(path + '.tmp', 'wt', encoding='utf-8')
+        f.write(json.dumps({'url': url, 'fetched': time.time()}) + '\n')
+        f.write(page)
+        f.close()
+        os.replace(path + '.tmp', path)
+
+
+class Journal:
+    '''
+    Song urls and scraped songs, keyed by (title, artist) of the song list.
+    '''
+    def __init__(self, journal_file='scrape_journal.jsonl'):
+        '''
+        Opens a journal, replaying the events of a previous run if the file
+        exists.
+        '''
+        self.journal_file = journal_file
+        self.urls = {}   # (title, artist) -> song url
+        self.songs = {}  # (title, artist) -> [title, artist, length, featuring, lyrics]
+        if os.path.exists(journal_file):
+            f = open(journal_file, 'rb')
+            for line in f:
+                try:
+                    event = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                self.apply(event)
+            f.close()
+        self.file = None
+
+    def apply(self, event):
+        '''
+        Applies one journal event.
+        '''
+        key = (event['title'], event['artist'])
+        if event['type'] == 'url':
+            self.urls[key] = event['url']
+        elif event['type'] == 'song':
+            self.songs[key] = event['song']
+
+    def append(self, event):
+        '''
+        Applies an event, and writes it to the end of the journal file.
+        '''
+        self.apply(event)
+        if self.file is None:
+            partial_line = False
+            if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > 0:
+                f = open(self.journal_file, 'rb')
+                f.seek(-1, os.SEEK_END)
+                partial_line = f.read(1) != b'\n'
+                f.close()
+            self.file = open(self.journal_file, 'a', encoding='utf-8')
+            if partial_line:
+                self.file.write('\n')
+        self.file.write(json.dumps(event) + '\n')
+        self.file.flush()
+
+    def add_url(self, title, artist, url):
+        self.append({'type': 'url', 'title': title, 'artist': artist, 'url': url})
+
+    def add_song(self, title, artist, song):
+        self.append({'type': 'song', 'title': title, 'artist': artist, 'song': song})
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
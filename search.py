@@ -3,76 +3,54 @@ This is a script that allows a user to search for a song of interest.
 If matching title(s) is found, the information for that song will be
 printed.
 
-This script does not use sophisticated search techniques. The use case
-in mind will lead a user to search for a specific title, which is not
-really the same problem of returning most relevant documents. If you want
-to use a larger song database, using an inverted index would be faster.
+Matching uses the inverted index over titles, artists and featurings
+(search_index.py), which song_info_build.py saves alongside the song
+database. So a query only looks at songs that share a term with it.
+
+If no song shares a term with the query, it is matched approximately
+instead (search_index.FuzzyIndex), which finds titles and artists with
+typos or different accents.
 '''
 
-import math
-import csv
+import search_index
+import song_database
 
 
 # Set options
-data_file = 'data/songs_lyrics.txt'
+index_file = 'data/search_index.pkl'
+fuzzy_index_file = 'data/fuzzy_index.pkl'
+database_file = 'data/songdash_database.bin'
+csv_database_file = 'data/songdash_database.csv'
 number_of_results = 1
+fuzzy = True  # fall back to approximate matching when nothing matches exactly
+
+
+# Open the song dashboard database (memory-mapped if it is in binary form).
+allsongs = song_database.open_database(database_file, csv_database_file)
 
 
-# Load song info used in query-matching
-f = open(data_file,'r')
-lines = f.readlines()
-f.close()
-titles = [lines[x].splitlines()[0].lower() for x in range(1, len(lines), 7)]
-artists = [lines[x].splitlines()[0].lower() for x in range(2, len(lines), 7)]
-featurings = [lines[x].splitlines()[0].lower() for x in range(4, len(lines), 7)]
+# Load the index used in query-matching. If it hasn't been built yet, it is
+# built from the song dashboard database.
+index = search_index.load_index(index_file, allsongs)
 
 
 # Ask user for query
-query = input('Search by Title/Artist: ').lower().split()
+query = input('Search by Title/Artist: ')
 
 
 # Determine the songs most likely related to the query
-scores = []
-for i in range(len(titles)):
-    score = 0
-    title_terms = titles[i].split()
-    artist_terms = artists[i].split()
-    featuring_terms = featurings[i].split()
-    for q in query:
-        if q in title_terms:
-            score += 3.0
-        if q in artist_terms:
-            score += 2.0
-        if q in featuring_terms:
-            score +=0.5
-    score = score/(math.log2(len(title_terms)+len(artist_terms)))
-    scores.append((i,score))
-scores = sorted(scores,key=lambda x: -x[1])
+scores = index.search(query, number_of_results)
+if len(scores) == 0 and fuzzy:
+    scores = search_index.load_fuzzy_index(fuzzy_index_file, allsongs).search(query, number_of_results)
 
 
 # If no songs-query matches are found, exit
-if scores[0][1] == 0:
+if len(scores) == 0:
     print('No songs found.')
     exit()
 
 
-# Load the song dashboard database
-f = open('data/songdash_database.csv','r')
-csvr = csv.reader(f)
-allsongs = list(csvr)
-f.close()
-
-
 # Print the song dashboard for the songs best matching the query
-for i in range((number_of_results-1),-1,-1):
-    if scores[i][1] == 0:
-        continue
+for i in range((len(scores)-1),-1,-1):
     print(f'\nResult #{i+1}')
-    print(f'Title               {allsongs[scores[i][0]][0]}')
-    print(f'Artist              {allsongs[scores[i][0]][1]}')
-    print(f'Featuring           {allsongs[scores[i][0]][3]}')
-    print(f'Length(secs)        {allsongs[scores[i][0]][2]}')
-    print(f'Words/Second        {allsongs[scores[i][0]][4]}')
-    print(f'Unique/Total Words  {allsongs[scores[i][0]][5]}')
-    print(f'Explicit Rating     {allsongs[scores[i][0]][6]}')
-    print(f'Topics              {allsongs[scores[i][0]][7]}')
+    print(song_database.format_dashboard(song_database.dashboard(allsongs[scores[i][0]])))
@@ -0,0 +1,283 @@
+'''
+This file is used to build an inverted index over song titles, artists
+and featured artists, which search.py uses to answer queries.
+
+Scoring is the same as the original linear scan in search.py: each query
+term that appears in a song's title adds 3.0, in the artist adds 2.0, and
+in the featuring adds 0.5. The total is divided by log2 of the number of
+title and artist terms, but by at least 1: a song with a single title or
+artist term (where the scan divided by 0) still gets its weights. Since
+that normalization only depends on the song, the weight of every (term,
+song) pair is precomputed and stored in the postings, so a query only
+touches the postings of its own terms.
+
+Exact terms miss songs whose title or artist is spelled differently in
+the query (typos, 'Beyonce' for 'Beyoncé', invisible zero-width
+characters), so there is also an approximate-match index (FuzzyIndex).
+Titles, artists and 'title artist' (for queries like "hallelujah kd
+lang") are normalized (accents, zero-width characters and case removed)
+and indexed by their character trigrams. A query only looks at the keys
+that share enough trigrams with it to possibly be similar (found from its
+rarest trigrams), keeps the ones with the most shared trigrams, and ranks
+those by edit distance.
+'''
+
+import math
+import os
+import pickle
+import unicodedata
+import numpy as np
+
+
+TITLE_WEIGHT = 3.0
+ARTIST_WEIGHT = 2.0
+FEATURING_WEIGHT = 0.5
+
+# fields of the approximate-match keys, and their weights
+TITLE, ARTIST, TITLE_ARTIST = range(3)
+FIELD_WEIGHTS = [TITLE_WEIGHT, ARTIST_WEIGHT, TITLE_WEIGHT+ARTIST_WEIGHT]
+
+MIN_TRIGRAM_SIMILARITY = 0.5  # Dice coefficient of the trigram sets
+MAX_CANDIDATES = 50  # keys reranked by edit distance per query
+MIN_SIMILARITY = 0.6  # 1 - edit distance/length of the longer string
+
+
+class Index:
+    '''
+    Inverted index from lowercased terms to (song id, weight) postings.
+    '''
+    def __init__(self):
+        self.postings = {}
+        self.number_of_songs = 0
+
+    def build(self, titles, artists, featurings):
+        '''
+        Builds the index from lists of titles, artists and featurings. Song
+        ids are positions in these lists (and rows of the song database).
+        '''
+        self.postings = {}
+        self.number_of_songs = len(titles)
+        for i in range(self.number_of_songs):
+            title_terms = titles[i].lower().split()
+            artist_terms = artists[i].lower().split()
+            featuring_terms = featurings[i].lower().split()
+            length = len(title_terms)+len(artist_terms)
+            norm = max(math.log2(length), 1) if length > 0 else 1
+            for term in set(title_terms+artist_terms+featuring_terms):
+                weight = 0
+                if term in title_terms:
+                    weight += TITLE_WEIGHT
+                if term in artist_terms:
+                    weight += ARTIST_WEIGHT
+                if term in featuring_terms:
+                    weight += FEATURING_WEIGHT
+                self.postings.setdefault(term, []).append((i, weight/norm))
+
+    def search(self, query, number_of_results=1):
+        '''
+        Returns up to number_of_results (song id, score) pairs for a query
+        string, best first. Only songs with a positive score are returned.
+        '''
+        scores = {}
+        for term in query.lower().split():
+            for (i, weight) in self.postings.get(term, []):
+                scores[i] = scores.get(i, 0) + weight
+        results = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        return results[:number_of_results]
+
+    def save(self, output_file):
+        '''
+        Save the index to a file.
+        '''
+        f = open(output_file, 'wb')
+        pickle.dump((self.number_of_songs, self.postings), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
+
+    def load(self, input_file):
+        '''
+        Load a previously saved index.
+        '''
+        f = open(input_file, 'rb')
+        (self.number_of_songs, self.postings) = pickle.load(f)
+        f.close()
+
+
+def normalize(text):
+    '''
+    Lowercases text, removes accents and invisible (format) characters like
+    zero-width spaces, and collapses whitespace. E.g. 'Beyoncé' -> 'beyonce'.
+    '''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join([c for c in text if not unicodedata.combining(c) and unicodedata.category(c) != 'Cf'])
+    return ' '.join(text.casefold().split())
+
+
+def trigrams(text):
+    '''
+    The set of character trigrams of normalized text. Each word is padded
+    with two spaces before and one after, so word starts count more.
+    '''
+    grams = set()
+    for word in text.split():
+        word = '  ' + word + ' '
+        for i in range(len(word)-2):
+            grams.add(word[i:i+3])
+    return grams
+
+
+def edit_distance(a, b):
+    '''
+    Levenshtein distance between two strings.
+    '''
+    if len(a) < len(b):
+        (a, b) = (b, a)
+    previous = list(range(len(b)+1))
+    for (i, x) in enumerate(a):
+        current = [i+1]
+        for (j, y) in enumerate(b):
+            current.append(min(previous[j+1]+1, current[j]+1, previous[j]+(x != y)))
+        previous = current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    '''
+    Character trigram index over normalized titles, artists and 'title
+    artist', for approximate matching.
+    '''
+    def __init__(self):
+        self.keys = []  # distinct normalized titles, artists and 'title artist'
+        self.key_songs = []  # for each key, a list of (song id, field)
+        self.key_sizes = None  # number of trigrams of each key
+        self.postings = {}  # trigram -> sorted array of key ids
+        self.number_of_songs = 0
+
+    def build(self, titles, artists):
+        '''
+        Builds the index from lists of titles and artists. Song ids are
+        positions in these lists (and rows of the song database).
+        '''
+        self.number_of_songs = len(titles)
+        key_ids = {}
+        self.keys = []
+        self.key_songs = []
+        postings = {}
+        title_artists = [title + ' ' + artist for (title, artist) in zip(titles, artists)]
+        for (field, texts) in [(TITLE, titles), (ARTIST, artists), (TITLE_ARTIST, title_artists)]:
+            for (i, text) in enumerate(texts):
+                key = normalize(text)
+                if key == '':
+                    continue
+                if key not in key_ids:
+                    key_ids[key] = len(self.keys)
+                    self.keys.append(key)
+                    self.key_songs.append([])
+                    for gram in trigrams(key):
+                        postings.setdefault(gram, []).append(key_ids[key])
+                self.key_songs[key_ids[key]].append((i, field))
+        self.key_sizes = np.array([len(trigrams(key)) for key in self.keys], dtype=np.int32)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for (gram, ids) in postings.items()}
+
+    def candidates(self, query):
+        '''
+        The keys that may be similar to a normalized query, and the number
+        of trigrams each shares with it. A key with trigram similarity
+        MIN_TRIGRAM_SIMILARITY has a similar number of trigrams, and shares
+        at least a third of the query's trigrams, so it must have one of the
+        others. Candidates come from the postings of the query's rarest
+        trigrams only, and are counted against the rest by binary search.
+        '''
+        grams = [gram for gram in trigrams(query) if gram in self.postings]
+        size = len(trigrams(query))
+        similarity = MIN_TRIGRAM_SIMILARITY
+        needed = math.ceil(similarity*size/(2-similarity))
+        if size == 0 or len(grams) < needed:
+            return (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        grams = sorted(grams, key=lambda gram: len(self.postings[gram]))
+        candidates = np.unique(np.concatenate([self.postings[gram] for gram in grams[:len(grams)-needed+1]]))
+        sizes = self.key_sizes[candidates]
+        candidates = candidates[(sizes >= similarity*size/(2-similarity)) & (sizes <= (2-similarity)*size/similarity)]
+        shared = np.zeros(len(candidates), dtype=np.int32)
+        for gram in grams:
+            postings = self.postings[gram]
+            positions = np.minimum(np.searchsorted(postings, candidates), len(postings)-1)
+            shared += postings[positions] == candidates
+        return (candidates, shared)
+
+    def search(self, query, number_of_results=1):
+        '''
+        Returns up to number_of_results (song id, score) pairs for a query
+        string, best first. A song scores the title/artist weight times the
+        similarity of its title or artist (the sum, if both match), or the
+        sum of both weights times the similarity of 'title artist', whichever
+        is higher.
+        '''
+        query = normalize(query)
+        (candidates, shared) = self.candidates(query)
+        # prune to the keys sharing the most trigrams with the query
+        dice = 2*shared/(len(trigrams(query)) + self.key_sizes[candidates])
+        keep = dice >= MIN_TRIGRAM_SIMILARITY
+        (candidates, dice) = (candidates[keep], dice[keep])
+        best = np.lexsort((candidates, -dice))[:MAX_CANDIDATES]
+        # rerank by edit distance
+        similarities = {}  # song id -> similarity of each field
+        for k in candidates[best]:
+            key = self.keys[k]
+            similarity = 1 - edit_distance(query, key)/max(len(query), len(key))
+            if similarity < MIN_SIMILARITY:
+                continue
+            for (i, field) in self.key_songs[k]:
+                similarities.setdefault(i, [0.0, 0.0, 0.0])[field] = similarity
+        scores = {}
+        for (i, field_similarities) in similarities.items():
+            separate = sum([FIELD_WEIGHTS[field]*field_similarities[field] for field in [TITLE, ARTIST]])
+            scores[i] = max(separate, FIELD_WEIGHTS[TITLE_ARTIST]*field_similarities[TITLE_ARTIST])
+        results = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        return results[:number_of_results]
+
+    def save(self, output_file):
+        '''
+        Save the index to a file.
+        '''
+        f = open(output_file, 'wb')
+        pickle.dump((self.number_of_songs, self.keys, self.key_songs, self.key_sizes, self.postings), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
+
+    def load(self, input_file):
+        '''
+        Load a previously saved index.
+        '''
+        f = open(input_file, 'rb')
+        (self.number_of_songs, self.keys, self.key_songs, self.key_sizes, self.postings) = pickle.load(f)
+        f.close()
+
+
+def load_index(index_file, database):
+    '''
+    Loads the index from index_file. If it hasn't been built yet, it is
+    built from the titles, artists and featurings of the rows in database
+    (see song_database.open_database), and saved to index_file.
+    '''
+    index = Index()
+    if os.path.exists(index_file):
+        index.load(index_file)
+    else:
+        rows = list(database)
+        index.build([row[0] for row in rows], [row[1] for row in rows], [row[3] for row in rows])
+        index.save(index_file)
+    return index
+
+
+def load_fuzzy_index(index_file, database):
+    '''
+    Loads the approximate-match index from index_file, building it from the
+    rows in database (and saving it) if it hasn't been built yet.
+    '''
+    index = FuzzyIndex()
+    if os.path.exists(index_file):
+        index.load(index_file)
+    else:
+        rows = list(database)
+        index.build([row[0] for row in rows], [row[1] for row in rows])
+        index.save(index_file)
+    return index
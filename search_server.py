@@ -0,0 +1,188 @@
+'''
+This is a script that runs a long-lived song dashboard server, for
+uses like a radio overlay that looks songs up continuously.
+
+The search index and all song dashboards are loaded once at startup and
+kept in memory, so a query only costs an index lookup. Queries are
+answered over local HTTP with JSON dashboards (the same fields search.py
+prints). Each client connection is handled in its own thread.
+
+    GET  /search?q=XYZ&n=1
+        {"query": "XYZ", "results": [{"score": ..., "title": ..., ...}]}
+
+    GET  /search?q=XYZ&n=1&fuzzy=1
+        (approximate matching, tolerant of typos and accents)
+
+    POST /search   with body {"queries": ["XYZ", "ABC"], "n": 1, "fuzzy": false}
+        {"results": [[...], [...]]}   (one result list per query)
+
+    GET  /filter?where=explicit<0.2 AND topic=Love&offset=0&limit=100
+        {"where": ..., "total": ..., "offset": 0, "results": [{"id": ..., "title": ..., ...}]}
+        (one page of the songs matching a filter, see filter_index.py)
+
+Run with: python3.7 search_server.py [port]
+'''
+
+import json
+import sys
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import filter_index
+import search_index
+import song_database
+
+
+# Set options
+index_file = 'data/search_index.pkl'
+fuzzy_index_file = 'data/fuzzy_index.pkl'
+filter_index_file = 'data/filter_index.pkl'
+database_file = 'data/songdash_database.bin'
+csv_database_file = 'data/songdash_database.csv'
+host = '127.0.0.1'
+port = 8008
+default_number_of_results = 1
+default_page_size = 100
+
+
+class SongSearcher:
+    '''
+    Answers queries from an index and dashboards held in memory.
+    '''
+    def __init__(self, index, dashboards, filters=None, fuzzy_index=None):
+        self.index = index
+        self.dashboards = dashboards
+        self.filters = filters
+        self.fuzzy_index = fuzzy_index
+
+    def search(self, query, number_of_results=1, fuzzy=False):
+        '''
+        Returns the dashboards of the songs best matching the query, best
+        first, each with its match score. With fuzzy, the query is matched
+        approximately.
+        '''
+        index = self.fuzzy_index if fuzzy else self.index
+        results = []
+        for (i, score) in index.search(query, number_of_results):
+            result = {'score': score}
+            result.update(self.dashboards[i])
+            results.append(result)
+        return results
+
+    def filter(self, where, offset=0, limit=100):
+        '''
+        Returns the total number of songs matching a filter, and the
+        dashboards of one page of them, each with its song id.
+        '''
+        (total, songs) = self.filters.query(where, offset, limit)
+        results = []
+        for i in songs:
+            result = {'id': int(i)}
+            result.update(self.dashboards[i])
+            results.append(result)
+        return (total, results)
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    '''
+    Handles GET (one query) and POST (batched queries) requests on /search,
+    and GET requests on /filter.
+    '''
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # keep-alive responses go out immediately
+    searcher = None
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        if url.path == '/filter':
+            self.filter(params)
+            return
+        if url.path != '/search':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            query = params.get('q', [''])[0]
+            n = int(params.get('n', [default_number_of_results])[0])
+            if n < 0:
+                raise ValueError('n is negative')
+        except ValueError:
+            self.send_json(400, {'error': 'n must be an integer of at least 0'})
+            return
+        fuzzy = params.get('fuzzy', ['0'])[0] not in ['0', 'false', '']
+        self.send_json(200, {'query': query, 'results': self.searcher.search(query, n, fuzzy)})
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path != '/search':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length))
+            queries = [str(query) for query in body['queries']]
+            n = int(body.get('n', default_number_of_results))
+            if n < 0:
+                raise ValueError('n is negative')
+            fuzzy = body.get('fuzzy', False)
+            if not isinstance(fuzzy, bool):
+                raise TypeError('fuzzy must be true or false')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send_json(400, {'error': 'expected {"queries": [...], "n": 1, "fuzzy": false}'})
+            return
+        self.send_json(200, {'results': [self.searcher.search(query, n, fuzzy) for query in queries]})
+
+    def filter(self, params):
+        try:
+            where = params.get('where', [''])[0]
+            offset = int(params.get('offset', [0])[0])
+            limit = int(params.get('limit', [default_page_size])[0])
+        except ValueError:
+            self.send_json(400, {'error': 'offset and limit must be integers'})
+            return
+        try:
+            (total, results) = self.searcher.filter(where, max(offset, 0), max(limit, 0))
+        except ValueError as error:
+            self.send_json(400, {'error': str(error)})
+            return
+        self.send_json(200, {'where': where, 'total': total, 'offset': offset, 'results': results})
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # logging every request to stderr would dominate the response time
+        pass
+
+
+def make_server(searcher, host, port):
+    '''
+    Creates a threaded HTTP server answering queries with searcher.
+    '''
+    handler = type('Handler', (SearchHandler,), {'searcher': searcher})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+
+    # Load everything once, queries are then answered from memory.
+    database = song_database.open_database(database_file, csv_database_file)
+    index = search_index.load_index(index_file, database)
+    filters = filter_index.load_filter_index(filter_index_file, database)
+    fuzzy_index = search_index.load_fuzzy_index(fuzzy_index_file, database)
+    dashboards = [song_database.dashboard(row) for row in database]
+    searcher = SongSearcher(index, dashboards, filters, fuzzy_index)
+
+    server = make_server(searcher, host, port)
+    print(f'Serving {len(dashboards)} songs on http://{host}:{port}/search')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
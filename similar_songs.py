@@ -0,0 +1,196 @@
+'''
+This file is used to find songs that are similar to a song, e.g. for
+generating playlists.
+
+Each song is described by a feature vector: its topic probabilities
+(P(z | d) from topics_model.py), its explicit score, and its speed and
+repetitiveness (words/second and unique words/total words, from
+word_stats.py). Speed and repetitiveness are standardized first, so that
+no feature dominates just because of its units, and each group of
+features is scaled by a weight. Songs are similar if their feature
+vectors are close (Euclidean distance).
+
+The index keeps the vectors in a k-d tree, and also precomputes the
+number_of_neighbors nearest songs of every song, so "songs like this
+one" is a lookup. Queries can be restricted to songs about a topic
+(topic probability above 0.2, as in the topic labels) or to songs that
+are at most some explicitness. Precomputed neighbors are used when
+enough of them pass the filter, otherwise the tree is searched further.
+'''
+
+import numpy as np
+from scipy import spatial
+
+
+TOPIC_WEIGHT = 1.0
+EXPLICIT_WEIGHT = 1.0
+SPEED_WEIGHT = 0.25
+REPETITIVENESS_WEIGHT = 0.25
+
+TOPIC_THRESHOLD = 0.2  # same as topics_model.Model.topics_strlist
+
+
+class SimilarSongs:
+    '''
+    Nearest-neighbor index over song feature vectors.
+    '''
+    def __init__(self):
+        self.topic_names = []
+        self.topic_prob = None  # songs x topics
+        self.explicit = None
+        self.features = None  # songs x features
+        self.neighbors = None  # songs x number_of_neighbors song ids, nearest first
+        self.distances = None
+        self.tree = None
+
+    def build(self, topic_prob, explicit, words_per_second, unique_ratio, topic_names, number_of_neighbors=20):
+        '''
+        Builds the index from per-song arrays (in song database order), and
+        precomputes every song's number_of_neighbors nearest songs (none if
+        there are fewer than 2 songs).
+        '''
+        self.topic_names = list(topic_names)
+        self.topic_prob = np.asarray(topic_prob, dtype=float)
+        if len(self.topic_prob) == 0:
+            self.topic_prob = self.topic_prob.reshape(0, len(self.topic_names))
+        self.explicit = np.asarray(explicit, dtype=float)
+        speed = np.asarray(words_per_second, dtype=float)
+        repetitiveness = np.asarray(unique_ratio, dtype=float)
+        self.features = np.hstack([
+            self.topic_prob*TOPIC_WEIGHT,
+            self.explicit[:, np.newaxis]*EXPLICIT_WEIGHT,
+            standardize(speed)[:, np.newaxis]*SPEED_WEIGHT,
+            standardize(repetitiveness)[:, np.newaxis]*REPETITIVENESS_WEIGHT])
+        self.tree = spatial.cKDTree(self.features)
+        number_of_neighbors = min(number_of_neighbors, len(self.features)-1)
+        if number_of_neighbors < 1:
+            self.neighbors = np.zeros((len(self.features), 0), dtype=np.int64)
+            self.distances = np.zeros((len(self.features), 0))
+            return
+        (self.neighbors, self.distances) = self.query(self.features, number_of_neighbors, exclude=np.arange(len(self.features)))
+
+    def query(self, vectors, k, exclude=None):
+        '''
+        The k nearest songs to each feature vector (a 2d array), as arrays
+        of song ids and distances (nearest first, -1 and inf where there
+        are fewer than k songs). exclude is a song id to leave out for each
+        vector (e.g. the song itself).
+        '''
+        extra = 0 if exclude is None else 1
+        (distances, ids) = self.tree.query(vectors, k+extra, workers=-1)
+        distances = distances.reshape(len(vectors), k+extra)
+        ids = ids.reshape(len(vectors), k+extra)
+        ids[ids == len(self.features)] = -1
+        if exclude is not None:
+            # drop the excluded song, or the last one if it wasn't found
+            keep = ids != np.asarray(exclude)[:, np.newaxis]
+            keep[keep.sum(axis=1) > k, -1] = False
+            ids = ids[keep].reshape(len(vectors), k)
+            distances = distances[keep].reshape(len(vectors), k)
+        return (ids, distances)
+
+    def allowed(self, topic=None, max_explicit=None):
+        '''
+        Boolean mask of the songs that pass a filter, or None if there is
+        no filter.
+        '''
+        if topic is None and max_explicit is None:
+            return None
+        mask = np.ones(len(self.features), dtype=bool)
+        if topic is not None:
+            mask &= self.topic_prob[:, self.topic_names.index(topic)] > TOPIC_THRESHOLD
+        if max_explicit is not None:
+            mask &= self.explicit <= max_explicit
+        return mask
+
+    def similar_batch(self, songs, number_of_results=10, topic=None, max_explicit=None):
+        '''
+        The most similar songs to each of a list of song ids, optionally
+        only those about topic and/or at most max_explicit. Returns arrays
+        (songs x number_of_results) of song ids and distances, nearest
+        first (-1 and inf where fewer songs pass the filter).
+        '''
+        songs = np.asarray(songs, dtype=np.int64)
+        mask = self.allowed(topic, max_explicit)
+        # precomputed neighbors that pass the filter
+        (ids, distances) = first_allowed(self.neighbors[songs], self.distances[songs], mask, number_of_results)
+
+        # search the tree further for songs without enough precomputed neighbors
+        missing = np.flatnonzero((ids < 0).any(axis=1))
+        if len(missing) and self.neighbors.shape[1] < len(self.features)-1:
+            (ids[missing], distances[missing]) = self.search(songs[missing], number_of_results, mask)
+        return (ids, distances)
+
+    def search(self, songs, number_of_results, mask):
+        '''
+        Searches the tree for the nearest songs that pass mask, asking for
+        more neighbors each round until enough pass (or all songs are seen).
+        '''
+        k = max(number_of_results*4, self.neighbors.shape[1]*2)
+        while True:
+            k = min(k, len(self.features)-1)
+            (candidates, candidate_distances) = self.query(self.features[songs], k, exclude=songs)
+            (ids, distances) = first_allowed(candidates, candidate_distances, mask, number_of_results)
+            if k == len(self.features)-1 or (ids >= 0).all():
+                return (ids, distances)
+            k *= 4
+
+    def similar(self, song, number_of_results=10, topic=None, max_explicit=None):
+        '''
+        Returns up to number_of_results (song id, distance) pairs of the
+        songs most similar to a song, nearest first.
+        '''
+        (ids, distances) = self.similar_batch([song], number_of_results, topic, max_explicit)
+        return [(int(i), float(d)) for (i, d) in zip(ids[0], distances[0]) if i >= 0]
+
+    def save(self, output_file):
+        '''
+        Save the index to a file (numpy .npz). The tree is rebuilt on load.
+        '''
+        f = open(output_file, 'wb')
+        np.savez(f, topic_names=np.array(self.topic_names), topic_prob=self.topic_prob, explicit=self.explicit,
+            features=self.features, neighbors=self.neighbors, distances=self.distances)
+        f.close()
+
+    def load(self, input_file):
+        '''
+        Load a previously saved index.
+        '''
+        data = np.load(input_file)
+        self.topic_names = list(data['topic_names'])
+        self.topic_prob = data['topic_prob']
+        self.explicit = data['explicit']
+        self.features = data['features']
+        self.neighbors = data['neighbors']
+        self.distances = data['distances']
+        data.close()
+        self.tree = spatial.cKDTree(self.features)
+
+
+def first_allowed(candidates, candidate_distances, mask, number_of_results):
+    '''
+    Keeps the first number_of_results candidates of each row (song ids,
+    nearest first) that pass mask (None for no filter). Rows are padded
+    with -1 and inf.
+    '''
+    valid = candidates >= 0
+    if mask is not None:
+        valid &= mask[np.maximum(candidates, 0)]
+    rank = np.cumsum(valid, axis=1) - 1
+    (rows, columns) = np.nonzero(valid & (rank < number_of_results))
+    ids = np.full((len(candidates), number_of_results), -1, dtype=np.int64)
+    distances = np.full((len(candidates), number_of_results), np.inf)
+    ids[rows, rank[rows, columns]] = candidates[rows, columns]
+    distances[rows, rank[rows, columns]] = candidate_distances[rows, columns]
+    return (ids, distances)
+
+
+def standardize(values):
+    '''
+    Scales values to mean 0 and standard deviation 1 (just centers them
+    if they are all the same).
+    '''
+    if len(values) == 0:
+        return values
+    deviation = values.std()
+    return (values - values.mean())/(deviation if deviation > 0 else 1)
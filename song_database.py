@@ -0,0 +1,186 @@
+'''
+This file is used to read and write the song dashboard database built by
+song_info_build.py, and to turn its rows into song dashboards.
+
+Each row of the database holds the columns listed in COLUMNS, in that
+order. Row numbers are the song ids used by the search index.
+
+The database can be stored as csv, or in a binary columnar format. In
+the binary format each numeric column is an array of float64 values,
+and each string column is a string table: an array of n+1 uint64 byte
+offsets followed by the utf-8 encoded strings. The file is laid out as
+
+    magic (8 bytes) | header length (uint64) | json header | columns
+
+where the json header gives the number of rows and the byte offset of
+every column. The file is memory-mapped when opened, so looking up one
+song only reads the bytes of that row.
+'''
+
+import csv
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+
+COLUMNS = ['title', 'artist', 'length', 'featuring', 'words_per_second', 'unique_ratio', 'explicit', 'topics']
+NUMERIC_COLUMNS = ['length', 'words_per_second', 'unique_ratio', 'explicit']
+
+# Fields of a dashboard, in the order they are printed, with their labels.
+DASHBOARD_LABELS = [
+    ('title', 'Title'),
+    ('artist', 'Artist'),
+    ('featuring', 'Featuring'),
+    ('length', 'Length(secs)'),
+    ('words_per_second', 'Words/Second'),
+    ('unique_ratio', 'Unique/Total Words'),
+    ('explicit', 'Explicit Rating'),
+    ('topics', 'Topics'),
+]
+
+
+def load_csv(database_file):
+    '''
+    Loads all rows of a csv song database.
+    '''
+    f = open(database_file, 'r')
+    rows = list(csv.reader(f))
+    f.close()
+    return rows
+
+
+def dashboard(row):
+    '''
+    Turns a database row into a dashboard dictionary, with numeric
+    columns as floats.
+    '''
+    song = dict(zip(COLUMNS, row))
+    for column in NUMERIC_COLUMNS:
+        song[column] = float(song[column])
+    return song
+
+
+def format_dashboard(song):
+    '''
+    Formats a dashboard dictionary for printing, one field per line.
+    '''
+    return '\n'.join([f'{label:20}{song[field]}' for (field, label) in DASHBOARD_LABELS])
+
+
+def write_csv(rows, database_file):
+    '''
+    Writes rows to a csv song database.
+    '''
+    f = open(database_file, 'w')
+    csvw = csv.writer(f)
+    for row in rows:
+        csvw.writerow(row)
+    f.close()
+
+
+MAGIC = b'SONGDB1\n'
+
+
+def write_columnar(rows, database_file):
+    '''
+    Writes rows to a binary columnar song database.
+    '''
+    rows = list(rows)
+    blocks = []
+    header = {'rows': len(rows), 'columns': {}}
+    offset = 0
+    for (c, column) in enumerate(COLUMNS):
+        if column in NUMERIC_COLUMNS:
+            values = np.array([float(row[c]) for row in rows], dtype='<f8')
+            header['columns'][column] = {'type': 'float64', 'offset': offset}
+            blocks.append(values.tobytes())
+        else:
+            strings = [str(row[c]).encode('utf-8') for row in rows]
+            offsets = np.zeros(len(rows)+1, dtype='<u8')
+            offsets[1:] = np.cumsum([len(x) for x in strings])
+            header['columns'][column] = {'type': 'string', 'offset': offset}
+            blocks.append(offsets.tobytes() + b''.join(strings))
+        offset += len(blocks[-1])
+        # keep every column 8-byte aligned
+        padding = -offset % 8
+        blocks.append(b'\0'*padding)
+        offset += padding
+    header = json.dumps(header).encode('utf-8')
+    header += b' '*(-len(header) % 8)
+
+    f = open(database_file, 'wb')
+    f.write(MAGIC)
+    f.write(struct.pack('<Q', len(header)))
+    f.write(header)
+    for block in blocks:
+        f.write(block)
+    f.close()
+
+
+class ColumnarDatabase:
+    '''
+    Memory-mapped binary columnar song database. Rows can be looked up by
+    song id, like the list of rows of a csv database.
+    '''
+    def __init__(self, database_file):
+        f = open(database_file, 'rb')
+        self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.close()
+        assert (self.mm[:len(MAGIC)] == MAGIC) # not a columnar song database
+        (header_length,) = struct.unpack_from('<Q', self.mm, len(MAGIC))
+        start = len(MAGIC)+8
+        header = json.loads(self.mm[start:start+header_length].decode('utf-8'))
+        self.number_of_rows = header['rows']
+        data_start = start+header_length
+        self.offsets = [data_start+header['columns'][column]['offset'] for column in COLUMNS]
+
+    def __len__(self):
+        return self.number_of_rows
+
+    def __getitem__(self, i):
+        '''
+        Returns row i, with the columns in COLUMNS order.
+        '''
+        if i < 0:
+            i += self.number_of_rows
+        if not 0 <= i < self.number_of_rows:
+            raise IndexError('song id out of range')
+        return [self.value(c, i) for c in range(len(COLUMNS))]
+
+    def value(self, c, i):
+        '''
+        Returns the value of column number c for row i.
+        '''
+        if COLUMNS[c] in NUMERIC_COLUMNS:
+            return struct.unpack_from('<d', self.mm, self.offsets[c]+8*i)[0]
+        (start, end) = struct.unpack_from('<QQ', self.mm, self.offsets[c]+8*i)
+        strings = self.offsets[c]+8*(self.number_of_rows+1)
+        return self.mm[strings+start:strings+end].decode('utf-8')
+
+    def column(self, column):
+        '''
+        Returns a whole column: a float64 array (a view on the mapped file)
+        for numeric columns, or a list of strings.
+        '''
+        c = COLUMNS.index(column)
+        if column in NUMERIC_COLUMNS:
+            return np.frombuffer(self.mm, dtype='<f8', count=self.number_of_rows, offset=self.offsets[c])
+        return [self.value(c, i) for i in range(self.number_of_rows)]
+
+    def export_csv(self, database_file):
+        '''
+        Writes the database out as csv.
+        '''
+        write_csv(iter(self), database_file)
+
+
+def open_database(database_file, csv_database_file):
+    '''
+    Opens the binary database if it exists, otherwise loads the csv one.
+    Either way the result can be indexed by song id to get a row.
+    '''
+    if os.path.exists(database_file):
+        return ColumnarDatabase(database_file)
+    return load_csv(csv_database_file)
@@ -8,51 +8,253 @@ If you use new/different data input, make sure your data file is in
 the same format as in data/song_lyrics.txt.
 '''
 
+import os
+import collections
+import multiprocessing
+import numpy as np
 import explicit_model
 import word_stats
 import topics_model
-import csv
+import tokenized_corpus
+import search_index
+import filter_index
+import similar_songs
+import song_database
+import song_records
+import build_state
+import parallel
+import instrumentation
 
 data_file = 'data/songs_lyrics.txt'
+state_file = 'models/build_state.pkl'
 
+# With incremental = True, only songs that are new or changed since the last
+# build have their stats calculated and their topics inferred (folded into the
+# saved topic model), and the explicit model's word counts are updated rather
+# than recounted. The first build (or one without a saved state) is always full.
+incremental = False
 
-# Load data from file.
-f = open(data_file,'r')
-lines = f.readlines()
-f.close()
-titles = [lines[x].splitlines()[0] for x in range(1, len(lines), 7)]
-artists = [lines[x].splitlines()[0] for x in range(2, len(lines), 7)]
-lengths = [float(lines[x].splitlines()[0]) for x in range(3, len(lines), 7)]
-featurings = [lines[x].splitlines()[0] for x in range(4, len(lines), 7)]
-lyrics = [lines[x].splitlines()[0] for x in range(5, len(lines), 7)]
+# With processes > 1, tokenization, word stats, the explicit model's word
+# counts and the topic model's EM iterations are split into shards and
+# computed by worker processes.
+# Word stats run in the background while the models are built. The output is
+# the same as with a single process.
+processes = 1
 
+# Lyrics are analyzed by the pure Python analyzer in lyric_analyzer.py
+# ('python'), or by metapy ('metapy'). They give the same term counts, except
+# for Chinese, Japanese and Thai text and letters added in recent versions of
+# Unicode, so each backend has its own token cache.
+analyzer_backend = 'python'
 
-# Use word_stats.py to calculate song speed and (unqiue words)/(total words)
-# for each song.
-stats = word_stats.Stats(songs=lyrics,lengths=lengths)
-(song_speeds, song_unique_word_percents) = stats.evaluate_stored_songs()
+# The topic model starts EM from a random point, so different builds can end
+# up with different topics. With topic_restarts > 1, EM is run from that many
+# starting points at once (each in its own process) and the best model is
+# kept. Its seed is saved with the model (and in events_file); set topic_seed
+# to it to build the same topics again.
+topic_restarts = 1
+topic_seed = None
 
+# The topic model runs up to topic_max_iter EM iterations. It stops earlier
+# once an iteration improves the log-likelihood by less than topic_epsilon,
+# or once topic_time_cutoff seconds have passed.
+topic_max_iter = 100
+topic_epsilon = 0.001
+topic_time_cutoff = 60*60*5
 
-# Use explicit_model.py to create an explicit model, and calculate which songs
-# are most explicit. Save the model for reuse later.
-exp = explicit_model.Model(lyrics)
-exp.build_model()
-exp.save_model_to_file('models/explicit_model.txt')
-explicit_scores = exp.evaluate_songs()
+# Each stage's wall time and memory high-water mark, and the topic model's
+# log-likelihood after every EM iteration, are printed as the build runs and
+# saved to events_file (one json object per line). With profile_file set, the
+# build also runs under cProfile, and the profile is saved there.
+events_file = 'models/build_events.jsonl'
+profile_file = None
 
+recorder = instrumentation.default_recorder()
+recorder.verbose = True
+if profile_file is not None:
+    recorder.start_profile()
 
-# Use topics_model to model topics, and calculate which songs cover which topics.
-# Save the model for reuse later.
-topics = topics_model.Model(lyrics)
-topics.plsa(max_iter=0,epsilon=0.001,time_cutoff=60*60*5)
-best_topics = topics.songs_topics_strlist()
-topics.save_model('models/topic_models.txt')
 
+# Load data from file, one song record at a time.
+with instrumentation.stage('read_songs'):
+    titles, artists, lengths, featurings, lyrics = [], [], [], [], []
+    for song in song_records.read_songs(data_file):
+        titles.append(song.title)
+        artists.append(song.artist)
+        lengths.append(song.length)
+        featurings.append(song.featuring)
+        lyrics.append(song.lyrics)
 
-# Use the collected values, and output to a csv file.
-rows = list(zip(titles,artists,lengths,featurings,song_speeds,song_unique_word_percents,explicit_scores,best_topics))
-f = open('data/songdash_database.csv','w')
-csvw = csv.writer(f)
-for row in rows:
-    csvw.writerow(row)
-f.close()
+
+# With processes > 1, the stages below share a pool of worker processes until
+# the word stats are collected. If the build fails, the workers are stopped.
+pool = None
+number_of_shards = processes*4
+if processes > 1:
+    # fork, so the workers don't re-run this script when they start
+    pool = multiprocessing.get_context('fork').Pool(processes)
+try:
+    # Tokenize every song once. The models below all read from this corpus, and
+    # it is cached on disk so unchanged songs are not re-analyzed on later runs.
+    with instrumentation.stage('tokenize'):
+        corpus = tokenized_corpus.Corpus(backend=analyzer_backend)
+        if pool is None:
+            corpus.tokenize_songs(lyrics)
+        else:
+            corpus.tokenize_songs_parallel(lyrics, pool, number_of_shards)
+        corpus.save()
+
+
+    # Find the songs that are new or changed since the last build, and those
+    # that were removed (a song that changed counts as removed and added). The
+    # removed songs' tokens must still be in the corpus cache, so they can be
+    # subtracted from the explicit model's counts.
+    with instrumentation.stage('find_changes'):
+        record_hashes = [build_state.record_hash(*song) for song in zip(titles, artists, lengths, featurings, lyrics)]
+        record_copies = collections.Counter(record_hashes)
+        state = build_state.BuildState()
+        if not (incremental and os.path.exists('models/topic_models.txt') and state.load(state_file)):
+            incremental = False
+            state = build_state.BuildState()
+        removed_songs = []
+        for (h, song) in state.songs.items():
+            removed_songs += [song]*max(0, song['copies']-record_copies[h])
+        if not all([song['lyrics_hash'] in corpus.songs for song in removed_songs]):
+            incremental = False
+            state = build_state.BuildState()
+            removed_songs = []
+        first_index = {}
+        for (i, h) in enumerate(record_hashes):
+            first_index.setdefault(h, i)
+        new_songs = [i for (h, i) in first_index.items() if h not in state.songs]
+        added_songs = []
+        for (h, i) in first_index.items():
+            old_copies = state.songs[h]['copies'] if h in state.songs else 0
+            added_songs += [i]*max(0, record_copies[h]-old_copies)
+        instrumentation.event('songs_changed', added=len(added_songs), removed=len(removed_songs))
+
+
+    # Use word_stats.py to calculate song speed, (unqiue words)/(total words),
+    # average word length and scrabble points per word for each new song (all
+    # kept in the build state). With a pool, this runs in the background while
+    # the models below are built.
+    with instrumentation.stage('word_stats'):
+        if pool is None:
+            stats = word_stats.Stats(songs=[lyrics[i] for i in new_songs],lengths=[lengths[i] for i in new_songs])
+            new_stats = stats.evaluate_corpus()
+        else:
+            stats_shards = [([lyrics[i] for i in shard], [lengths[i] for i in shard]) for shard in parallel.make_shards(new_songs, number_of_shards)]
+            stats_results = pool.map_async(word_stats.evaluate_shard, stats_shards)
+
+
+    # Use explicit_model.py to create an explicit model, and calculate which songs
+    # are most explicit. Save the model for reuse later. In an incremental build
+    # the word counts from the last build are updated with the removed and new
+    # songs. The model's weights change, so all songs are rescored (this is a
+    # single sparse matrix-vector product over the cached tokens).
+    with instrumentation.stage('explicit_model'):
+        exp = explicit_model.Model(lyrics, corpus=corpus)
+        if incremental:
+            (exp.word_corpus_frequency, exp.explicit_word_counts, exp.number_of_songs) = state.explicit_counts
+            exp.count_songs([corpus.songs[song['lyrics_hash']] for song in removed_songs], sign=-1)
+            exp.count_songs(corpus.tokenize_songs([lyrics[i] for i in added_songs]))
+            exp.build_model_from_counts()
+        else:
+            exp.build_model(pool, number_of_shards)
+        explicit_scores = exp.evaluate_songs()
+        exp.save_model_to_file('models/explicit_model.txt')
+
+
+    # Use topics_model to model topics, and calculate which songs cover which topics.
+    # Save the model for reuse later. In an incremental build the saved model is
+    # loaded, and the new songs are folded into it.
+    with instrumentation.stage('topics_model'):
+        topics = topics_model.Model(lyrics, corpus=corpus)
+        if incremental:
+            topics.load_model('models/topic_models.txt')
+            new_topic_probs = topics.fold_in([lyrics[i] for i in new_songs])
+        else:
+            topics.plsa(max_iter=topic_max_iter,epsilon=topic_epsilon,time_cutoff=topic_time_cutoff,processes=processes,restarts=topic_restarts,seed=topic_seed)
+            new_topic_probs = topics.document_topic_prob[new_songs]
+            topics.save_model('models/topic_models.txt')
+
+
+    with instrumentation.stage('word_stats_results'):
+        if pool is not None:
+            stats_results = stats_results.get()
+            new_stats = {}
+            for name in ['words_per_second', 'unique_ratio', 'average_word_length', 'scrabble_per_word']:
+                new_stats[name] = parallel.concatenate([result[name] for result in stats_results])
+            pool.close()
+            pool.join()
+finally:
+    if pool is not None:
+        # the workers are done already, unless the build failed
+        pool.terminate()
+        pool.join()
+
+
+# Remember the results for each song, for the next incremental build.
+with instrumentation.stage('save_state'):
+    for (j, i) in enumerate(new_songs):
+        state.songs[record_hashes[i]] = {
+            'lyrics_hash': tokenized_corpus.lyric_hash(lyrics[i]),
+            'speed': float(new_stats['words_per_second'][j]),
+            'unique_word_percent': float(new_stats['unique_ratio'][j]),
+            'average_word_length': float(new_stats['average_word_length'][j]),
+            'scrabble_per_word': float(new_stats['scrabble_per_word'][j]),
+            'topic_prob': new_topic_probs[j],
+        }
+    for h in list(state.songs):
+        if h in record_copies:
+            state.songs[h]['copies'] = record_copies[h]
+        else:
+            del state.songs[h]
+    state.explicit_counts = (exp.word_corpus_frequency, exp.explicit_word_counts, exp.number_of_songs)
+    state.save(state_file)
+
+    song_speeds = [state.songs[h]['speed'] for h in record_hashes]
+    song_unique_word_percents = [state.songs[h]['unique_word_percent'] for h in record_hashes]
+    song_topic_probs = np.array([state.songs[h]['topic_prob'] for h in record_hashes])
+    best_topics = topics.topics_strlist(song_topic_probs)
+
+
+# Use the collected values, and output to the binary database (which search.py
+# memory-maps) and to a csv file.
+with instrumentation.stage('write_database'):
+    rows = list(zip(titles,artists,lengths,featurings,song_speeds,song_unique_word_percents,explicit_scores,best_topics))
+    song_database.write_columnar(rows, 'data/songdash_database.bin')
+    song_database.write_csv(rows, 'data/songdash_database.csv')
+
+
+# Build the inverted index that search.py uses to match queries to songs, and
+# the trigram index for approximate matches.
+with instrumentation.stage('search_index'):
+    index = search_index.Index()
+    index.build(titles, artists, featurings)
+    index.save('data/search_index.pkl')
+    fuzzy_index = search_index.FuzzyIndex()
+    fuzzy_index.build(titles, artists)
+    fuzzy_index.save('data/fuzzy_index.pkl')
+
+
+# Build the sorted column and topic bitmap indexes that filter queries use
+# (filter_index.py).
+with instrumentation.stage('filter_index'):
+    filters = filter_index.FilterIndex()
+    numeric_columns = {'length': lengths, 'words_per_second': song_speeds, 'unique_ratio': song_unique_word_percents, 'explicit': explicit_scores}
+    filters.build(numeric_columns, best_topics)
+    filters.save('data/filter_index.pkl')
+
+
+# Build the nearest-neighbor index of similar songs (for playlists), with
+# every song's closest songs precomputed.
+with instrumentation.stage('similar_songs'):
+    similar = similar_songs.SimilarSongs()
+    similar.build(song_topic_probs, explicit_scores, song_speeds, song_unique_word_percents, topics.topic_names)
+    similar.save('data/similar_songs.npz')
+
+
+recorder.save(events_file)
+if profile_file is not None:
+    recorder.save_profile(profile_file)
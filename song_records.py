@@ -0,0 +1,76 @@
+'''
+This file is used to read and write song lyric files (like
+data/songs_lyrics.txt, as written by scraping/genius_scraper.py).
+
+Each song in the file is a record of 7 lines:
+
+    #
+    title
+    artist
+    length (seconds)
+    featuring
+    lyrics
+    (blank line, may be missing after the last song)
+
+Songs are read lazily, one record at a time, so memory use does not
+depend on the size of the file.
+'''
+
+from collections import namedtuple
+
+
+Song = namedtuple('Song', ['title', 'artist', 'length', 'featuring', 'lyrics'])
+
+
+def read_songs(songs_file):
+    '''
+    Yields the songs of a song lyrics file one at a time, as Song tuples.
+    Raises ValueError if a record is not in the expected format.
+    '''
+    f = open(songs_file, 'r')
+    number = 0
+    try:
+        while True:
+            line = f.readline()
+            number += 1
+            if line == '':
+                return
+            if line.rstrip('\r\n') != '#':
+                raise ValueError(f'{songs_file}, line {number}: expected "#" at the start of a song record')
+            fields = []
+            for i in range(5):
+                line = f.readline()
+                number += 1
+                if line == '':
+                    raise ValueError(f'{songs_file}, line {number}: song record ends early')
+                fields.append(line.rstrip('\r\n'))
+            try:
+                length = float(fields[2])
+            except ValueError:
+                raise ValueError(f'{songs_file}, line {number-2}: song length is not a number')
+            yield Song(fields[0], fields[1], length, fields[3], fields[4])
+            line = f.readline()
+            number += 1
+            if line == '':
+                return
+            if line.strip() != '':
+                raise ValueError(f'{songs_file}, line {number}: expected a blank line after a song record')
+    finally:
+        f.close()
+
+
+def write_songs(songs_file, songs):
+    '''
+    Writes songs (Song tuples, or any (title, artist, length, featuring,
+    lyrics) sequences) to a song lyrics file, one record at a time.
+    Returns the number of songs written.
+    '''
+    f = open(songs_file, 'w')
+    number = 0
+    for (title, artist, length, featuring, lyrics) in songs:
+        if number > 0:
+            f.write('\n')
+        f.write(f'#\n{title}\n{artist}\n{length}\n{featuring}\n{lyrics}\n')
+        number += 1
+    f.close()
+    return number
@@ -0,0 +1,134 @@
+'''
+This file is used to generate synthetic song lyric files, in the same
+format as data/songs_lyrics.txt, for measuring how the pipeline scales
+(see benchmark.py).
+
+The lyrics are random, but have the properties of real lyrics that the
+models are sensitive to:
+
+- Word frequencies follow Zipf's law, with stopwords as the most common
+  words, and the vocabulary grows with the square root of the number of
+  songs (Heaps' law), so bigger corpora have longer tails of rare words.
+- Songs have a verse/chorus structure, so words are repeated within a
+  song, and song lengths vary.
+- Each song leans towards one theme (one of the topic model's topics),
+  and a small share of songs use explicit words.
+
+Generation is seeded, so the same settings always give the same file.
+'''
+
+import numpy as np
+import song_records
+
+
+# Unstemmed words for each of the topics in topics_model.py (the analyzer
+# stems them to the topic prior words).
+THEME_WORDS = [
+    ['love', 'heart', 'hate', 'loving', 'hearts'],
+    ['sex', 'ass', 'pussy', 'dick', 'sexy'],
+    ['fun', 'dance', 'smile', 'dancing', 'party'],
+    ['drug', 'drink', 'smoke', 'beer', 'drunk', 'high'],
+    ['christmas', 'santa', 'tree', 'winter', 'snow'],
+    ['sport', 'basketball', 'baseball', 'hoop', 'nba'],
+    ['god', 'bible', 'heaven', 'pray', 'lord'],
+    ['money', 'rich', 'cash', 'diamonds', 'paid'],
+]
+EXPLICIT_WORDS = ['fuck', 'motherfucker', 'fucking']
+
+CONSONANTS = ['b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'y', 'z', 'ch', 'sh', 'th', 'br', 'st', 'tr']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'ay', 'ee', 'oo', 'ou']
+
+
+def make_words(number_of_words, rng):
+    '''
+    Makes a list of distinct pronounceable made-up words.
+    '''
+    words = []
+    seen = set()
+    while len(words) < number_of_words:
+        syllables = rng.integers(1, 4)
+        word = ''.join([CONSONANTS[rng.integers(len(CONSONANTS))] + VOWELS[rng.integers(len(VOWELS))] for i in range(syllables)])
+        if rng.random() < 0.5:
+            word += CONSONANTS[rng.integers(len(CONSONANTS))]
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_probabilities(number_of_words, exponent=1.07):
+    '''
+    Word probabilities by frequency rank, following Zipf's law.
+    '''
+    probabilities = 1.0/np.arange(1, number_of_words+1)**exponent
+    return probabilities/probabilities.sum()
+
+
+def vocabulary_size(number_of_songs):
+    '''
+    Heaps' law: the number of distinct words grows like the square root
+    of the size of the corpus.
+    '''
+    return max(2000, int(200*np.sqrt(number_of_songs)))
+
+
+def generate_songs(number_of_songs, seed=0, stopwords_file='config/stopwords.txt'):
+    '''
+    Yields number_of_songs synthetic songs, as song_records.Song tuples.
+    '''
+    rng = np.random.default_rng(seed)
+    f = open(stopwords_file, 'r')
+    stopwords = [line.strip() for line in f if line.strip().isalpha()]
+    f.close()
+
+    # stopwords are the most frequent words, theme words are spread out over
+    # the common ranks, and made-up words fill the rest of the vocabulary
+    made_up = make_words(vocabulary_size(number_of_songs), rng)
+    vocabulary = stopwords + made_up[:200]
+    for words in THEME_WORDS:
+        vocabulary += words
+    vocabulary += made_up[200:]
+    vocabulary = np.array(vocabulary)
+    probabilities = zipf_probabilities(len(vocabulary))
+    title_words = made_up[:2000]
+    artist_names = [' '.join([word.capitalize() for word in rng.choice(made_up[:5000], rng.integers(1, 3))]) for i in range(max(10, number_of_songs//8))]
+    artist_probabilities = zipf_probabilities(len(artist_names), 0.8)
+
+    batch_size = 1000
+    for start in range(0, number_of_songs, batch_size):
+        batch = min(batch_size, number_of_songs-start)
+        song_words = np.maximum(40, rng.lognormal(np.log(300), 0.45, batch)).astype(int)
+        chorus_shares = rng.uniform(0.2, 0.6, batch)
+        # draw the distinct (verse and chorus) words of the whole batch at once
+        distinct_words = np.maximum(20, (song_words*(1-chorus_shares*2/3))).astype(int)
+        words = vocabulary[rng.choice(len(vocabulary), distinct_words.sum(), p=probabilities)]
+        offsets = np.concatenate([[0], np.cumsum(distinct_words)])
+        themes = rng.integers(len(THEME_WORDS), size=batch)
+        explicit = rng.random(batch) < 0.15
+        artists = rng.choice(len(artist_names), batch, p=artist_probabilities)
+        for i in range(batch):
+            song = list(words[offsets[i]:offsets[i+1]])
+            # about 5% of the words come from the song's theme
+            for j in rng.choice(len(song), len(song)//20, replace=False):
+                song[j] = THEME_WORDS[themes[i]][rng.integers(len(THEME_WORDS[themes[i]]))]
+            if explicit[i]:
+                for j in rng.choice(len(song), max(1, len(song)//50), replace=False):
+                    song[j] = EXPLICIT_WORDS[rng.integers(len(EXPLICIT_WORDS))]
+            # verse 1, chorus, verse 2, chorus, chorus
+            chorus_length = max(5, int(song_words[i]*chorus_shares[i]/3))
+            chorus = song[:chorus_length]
+            verses = song[chorus_length:]
+            half = len(verses)//2
+            lyrics = ' '.join(verses[:half] + chorus + verses[half:] + chorus + chorus)
+            title = ' '.join(rng.choice(title_words, rng.integers(1, 4))).title()
+            artist = artist_names[artists[i]]
+            featuring = artist_names[rng.integers(len(artist_names))] if rng.random() < 0.2 else ''
+            length = round(float(np.clip(rng.normal(215, 35), 60, 600)), 3)
+            yield song_records.Song(title, artist, length, featuring, lyrics)
+
+
+def generate(songs_file, number_of_songs, seed=0):
+    '''
+    Writes a synthetic song lyrics file with number_of_songs songs.
+    '''
+    return song_records.write_songs(songs_file, generate_songs(number_of_songs, seed))
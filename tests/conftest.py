@@ -0,0 +1,43 @@
+'''
+The tests import the project's top-level modules, and read files (like
+config/config.toml) relative to the project directory, as the scripts do.
+'''
+
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def in_project(monkeypatch):
+    '''
+    Runs a test from the project directory.
+    '''
+    monkeypatch.chdir(ROOT)
+    return ROOT
+
+
+# A few short songs, some of them explicit (see explicit_model.py)
+LYRICS = [
+    'love you baby love you all night long, my heart is yours baby',
+    'fuck the money fuck the fame, we running through the city streets again',
+    'dancing in the moonlight, dancing with my baby all night',
+    'broken heart and tears, lonely nights and empty years',
+    'fuckin money on my mind, shit the block is cold tonight',
+    'summer sun and ocean waves, we dance the night away',
+    'praise the lord and sing his name, glory in the morning rain',
+    'money money money, stacks and the cars and the gold chains',
+]
+
+
+@pytest.fixture
+def corpus(in_project, tmp_path):
+    '''
+    An empty tokenized corpus (with the project's analyzer config), cached
+    in a temporary directory.
+    '''
+    import tokenized_corpus
+    return tokenized_corpus.Corpus(cache_dir=str(tmp_path / 'token_cache'))
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from aiohttp import web
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'scraping'))
+import async_genius_scraper
+import page_cache
+import song_records
+
+
+FIXTURES = os.path.join(ROOT, 'tests', 'data', 'genius')
+SONG_PATH = '/The-fixtures-midnight-train-lyrics'
+
+
+def fixture(name):
+    f = open(os.path.join(FIXTURES, name), 'r', encoding='utf-8')
+    text = f.read()
+    f.close()
+    return text
+
+
+class StubGenius(threading.Thread):
+    '''
+    A local server with Genius' search, song and apple music player pages,
+    served from the saved fixtures. It runs its own event loop in a
+    thread, since the scraper runs (and closes) its own. found are the
+    search queries that have a hit, and failures the number of 503
+    responses a path gets before it is served.
+    '''
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.found = {'Midnight Train The Fixtures'}
+        self.failures = {}
+        self.requests = []
+        self.started = threading.Event()
+
+    async def search(self, request):
+        self.requests.append(request.path_qs)
+        name = 'search.json' if request.query.get('q') in self.found else 'search_empty.json'
+        return web.Response(text=fixture(name), content_type='application/json')
+
+    async def page(self, request):
+        self.requests.append(request.path_qs)
+        if self.failures.get(request.path, 0) > 0:
+            self.failures[request.path] -= 1
+            return web.Response(status=503)
+        if request.path == SONG_PATH:
+            return web.Response(text=fixture('song.html'), content_type='text/html')
+        if request.path == '/songs/378195/apple_music_player':
+            return web.Response(text=fixture('apple_music_player.html'), content_type='text/html')
+        return web.Response(status=404)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.add_routes([web.get('/api/search/song', self.search), web.get('/{path:.*}', self.page)])
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        (host, port) = self.runner.addresses[0][:2]
+        self.base_url = f'http://{host}:{port}'
+        self.started.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    def stop(self):
+        if self.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.join()
+
+
+@pytest.fixture
+def server():
+    server = StubGenius()
+    server.start()
+    server.started.wait(10)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def song_list(tmp_path):
+    song_list = tmp_path / 'songs_list.txt'
+    song_list.write_text('Midnight Train || The Fixtures\nUnknown Song || Nobody\n')
+    return str(song_list)
+
+
+def scrape(server, song_list, tmp_path):
+    scraper = async_genius_scraper.GeniusScraper(server.base_url, concurrency=2, rate=100.0, burst=10, backoff=0.01)
+    output_file = str(tmp_path / 'songs_lyrics.txt')
+    async_genius_scraper.scrape_songs_from_list(song_list, output_file, scraper,
+        cache_dir=str(tmp_path / 'page_cache'), journal_file=str(tmp_path / 'scrape_journal.jsonl'))
+    return list(song_records.read_songs(output_file))
+
+
+def test_scrape_songs_from_list(server, song_list, tmp_path):
+    server.failures['/songs/378195/apple_music_player'] = 2  # retried with backoff
+    songs = scrape(server, song_list, tmp_path)
+    assert len(songs) == 1
+    song = songs[0]
+    assert (song.title, song.artist, song.length, song.featuring) == ('Midnight Train', 'The Fixtures', 215.5, 'Stub Server')
+    assert 'Riding on the midnight train' in song.lyrics and '[Chorus' not in song.lyrics
+    assert server.requests.count('/songs/378195/apple_music_player') == 3
+
+
+def test_resume(server, song_list, tmp_path):
+    scrape(server, song_list, tmp_path)
+    server.requests = []
+    assert len(scrape(server, song_list, tmp_path)) == 1
+    # the scraped song is in the journal, only the missing one is searched
+    # again (searches with no hits are not cached)
+    assert server.requests == ['/api/search/song?q=Unknown%20Song%20Nobody']
+
+    # once the search has a hit, the song is found (the song page comes
+    # from the cache)
+    server.found.add('Unknown Song Nobody')
+    server.requests = []
+    scrape(server, song_list, tmp_path)
+    assert server.requests == ['/api/search/song?q=Unknown%20Song%20Nobody']
+    journal = page_cache.Journal(str(tmp_path / 'scrape_journal.jsonl'))
+    assert journal.songs[('Unknown Song', 'Nobody')][0] == 'Midnight Train'
+
+
+def test_bad_cached_page_fetched_again(server, song_list, tmp_path):
+    cache = page_cache.PageCache(str(tmp_path / 'page_cache'))
+    cache.put(server.base_url + SONG_PATH, '<html><body>Please enable JavaScript</body></html>')
+    assert len(scrape(server, song_list, tmp_path)) == 1
+    assert SONG_PATH in server.requests
+
+
+def test_reparse(server, song_list, tmp_path):
+    scrape(server, song_list, tmp_path)
+    server.stop()  # no network
+    output_file = str(tmp_path / 'reparsed.txt')
+    async_genius_scraper.reparse_songs_from_cache(song_list, output_file, str(tmp_path / 'page_cache'),
+        str(tmp_path / 'scrape_journal.jsonl'), server.base_url)
+    assert [song.title for song in song_records.read_songs(output_file)] == ['Midnight Train']
+
+
+def test_usage():
+    script = os.path.join(ROOT, 'scraping', 'async_genius_scraper.py')
+    for args in [[], ['--reparse']]:
+        result = subprocess.run([sys.executable, script] + args, cwd=os.path.join(ROOT, 'scraping'), capture_output=True, text=True)
+        assert result.returncode == 2
+        assert result.stdout.startswith('Usage:')
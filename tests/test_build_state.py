@@ -0,0 +1,40 @@
+'''
+Tests of the saved build state.
+'''
+
+import numpy as np
+
+import build_state
+
+
+def test_save_and_load(tmp_path):
+    state_file = str(tmp_path / 'build_state.pkl')
+    state = build_state.BuildState()
+    assert not state.load(state_file)
+
+    h = build_state.record_hash('Halo', 'Beyoncé', 261.0, '', 'remember those walls i built')
+    state.songs[h] = {'lyrics_hash': 'abc', 'speed': 1.5, 'unique_word_percent': 0.5, 'average_word_length': 4.2,
+        'scrabble_per_word': 6.0, 'topic_prob': np.array([0.25, 0.75]), 'copies': 2}
+    state.explicit_counts = ({'wall': 1}, {'wall': 0}, 1)
+    state.save(state_file)
+
+    loaded = build_state.BuildState()
+    assert loaded.load(state_file)
+    assert list(loaded.songs) == [h]
+    song = loaded.songs[h]
+    assert np.array_equal(song.pop('topic_prob'), [0.25, 0.75])
+    assert song == {'lyrics_hash': 'abc', 'speed': 1.5, 'unique_word_percent': 0.5, 'average_word_length': 4.2,
+        'scrabble_per_word': 6.0, 'copies': 2}
+    assert loaded.explicit_counts == state.explicit_counts
+
+
+def test_record_hash():
+    record = ['Halo', 'Beyoncé', 261.0, '', 'remember those walls i built']
+    h = build_state.record_hash(*record)
+    # the length is hashed as a float, so 261 and 261.0 are the same record
+    assert build_state.record_hash('Halo', 'Beyoncé', 261, '', 'remember those walls i built') == h
+    for i in [0, 1, 3, 4]:
+        changed = list(record)
+        changed[i] += ' '
+        assert build_state.record_hash(*changed) != h
+    assert build_state.record_hash('Halo', 'Beyoncé', 262.0, '', 'remember those walls i built') != h
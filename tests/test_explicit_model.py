@@ -0,0 +1,76 @@
+import pytest
+import explicit_model
+from conftest import LYRICS
+
+
+def build_model(corpus):
+    model = explicit_model.Model(LYRICS, corpus=corpus)
+    model.vocabulary_settings = {'min-df': 1, 'max-df': 1.0, 'max-terms': 0, 'hash-buckets': 0}
+    model.build_model()
+    return model
+
+
+def test_scores(corpus):
+    model = build_model(corpus)
+    scores = model.evaluate_songs()
+    assert max(scores) == pytest.approx(1.0)
+    assert scores[0] == 0 and scores[1] > 0
+    assert [model.evaluate_new_song(lyric) for lyric in LYRICS] == pytest.approx(scores)
+
+
+def test_save_and_load(corpus, tmp_path):
+    model = build_model(corpus)
+    model.evaluate_songs()
+    model_file = str(tmp_path / 'explicit_model.txt')
+    model.save_model_to_file(model_file)
+    assert open(model_file).readline().startswith('#normalization,')
+
+    loaded = explicit_model.Model(corpus=corpus)
+    loaded.load_model_from_file(model_file)
+    assert loaded.model == pytest.approx(model.model)
+    assert loaded.normalization == pytest.approx(model.normalization)
+    assert loaded.evaluate_new_song(LYRICS[4]) == pytest.approx(model.evaluate_new_song(LYRICS[4]))
+
+
+def test_model_without_normalization(corpus, tmp_path):
+    # models saved before the normalization constant was kept
+    model_file = tmp_path / 'explicit_model.txt'
+    model_file.write_text('fuck,0.6\nmoney,0.4')
+    model = explicit_model.Model(corpus=corpus)
+    model.load_model_from_file(str(model_file))
+    assert model.model == {'fuck': 0.6, 'money': 0.4}
+    with pytest.raises(ValueError, match='rebuild'):
+        model.evaluate_new_song(LYRICS[1])
+
+
+@pytest.mark.parametrize('songs', [[LYRICS[0], LYRICS[2], LYRICS[3]], []])
+def test_corpus_without_explicit_songs(corpus, tmp_path, songs):
+    model = explicit_model.Model(songs, corpus=corpus)
+    model.vocabulary_settings = {'min-df': 1, 'max-df': 1.0, 'max-terms': 0, 'hash-buckets': 0}
+    model.build_model()
+    assert model.evaluate_songs() == [0.0]*len(songs)
+    assert model.normalization is None
+    with pytest.raises(ValueError, match='no normalization'):
+        model.evaluate_new_song(LYRICS[1])
+    model_file = str(tmp_path / 'explicit_model.txt')
+    model.save_model_to_file(model_file)
+    assert '#normalization' not in open(model_file).read()
+
+
+def test_model_with_zero_normalization(corpus, tmp_path):
+    # saved by builds where no song was explicit
+    model_file = tmp_path / 'explicit_model.txt'
+    model_file.write_text('#normalization,0.0\nfuck,0.6')
+    model = explicit_model.Model(corpus=corpus)
+    model.load_model_from_file(str(model_file))
+    assert model.normalization is None
+    with pytest.raises(ValueError, match='no normalization'):
+        model.evaluate_new_song(LYRICS[1])
+
+
+def test_load_is_quiet(corpus, tmp_path, capsys):
+    # events are only printed when a script turns the recorder's verbose on
+    model_file = tmp_path / 'explicit_model.txt'
+    model_file.write_text('#normalization,1.0\nfuck,0.6')
+    explicit_model.Model(corpus=corpus).load_model_from_file(str(model_file))
+    assert capsys.readouterr().out == ''
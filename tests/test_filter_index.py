@@ -0,0 +1,25 @@
+'''
+Tests of the filter index.
+'''
+
+import filter_index
+
+
+TOPICS = ['Love/Other', 'n/a', 'Wealth', 'n/a', 'Love']
+
+
+def build():
+    index = filter_index.FilterIndex()
+    numeric_columns = {'length': [200, 180, 240, 90, 300], 'words_per_second': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'unique_ratio': [0.5]*5, 'explicit': [0.0, 0.1, 0.9, 0.3, 0.05]}
+    index.build(numeric_columns, TOPICS)
+    return index
+
+
+def test_songs_without_a_topic():
+    index = build()
+    assert sorted(index.topic_songs) == ['Love', 'Other', 'Wealth', 'n/a']
+    assert list(index.query(filter_index.parse_filter('topic = n/a'))[1]) == [1, 3]
+    assert list(index.query(filter_index.parse_filter('topic != n/a AND explicit < 0.5'))[1]) == [0, 4]
+    assert list(index.query(filter_index.parse_filter('topic = Love'))[1]) == [0, 4]
+    assert index.query(filter_index.parse_filter('topic = a'))[0] == 0
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import explicit_model
+import live_scorer
+import topics_model
+import word_stats
+from conftest import LYRICS
+
+
+LENGTHS = [30.0 + 5*i for i in range(len(LYRICS))]
+SETTINGS = {'min-df': 1, 'max-df': 1.0, 'max-terms': 0, 'hash-buckets': 0}
+
+
+@pytest.fixture
+def models(corpus):
+    explicit = explicit_model.Model(LYRICS, corpus=corpus)
+    explicit.vocabulary_settings = SETTINGS
+    explicit.build_model()
+    explicit_scores = explicit.evaluate_songs()
+    topics = topics_model.Model(LYRICS, corpus=corpus)
+    topics.vocabulary_settings = SETTINGS
+    topics.plsa(max_iter=20, epsilon=0.0, time_cutoff=60, seed=1)
+    return (explicit, explicit_scores, topics)
+
+
+def stream(scorer, lyric, length, chunk_size=3):
+    words = lyric.split()
+    chunks = [words[i:i+chunk_size] for i in range(0, len(words), chunk_size)]
+    for (i, chunk) in enumerate(chunks):
+        dashboard = scorer.add(' '.join(chunk), length*(i+1)/len(chunks))
+    return dashboard
+
+
+def test_streamed_scores_match_batch(corpus, models):
+    (explicit, explicit_scores, topics) = models
+    stats = word_stats.Stats(songs=LYRICS, lengths=LENGTHS).evaluate_corpus()
+    folded_in = topics.fold_in(LYRICS)
+    for (i, lyric) in enumerate(LYRICS):
+        scorer = live_scorer.LiveScorer(explicit, topics, corpus, title=f'song {i}')
+        dashboard = stream(scorer, lyric, LENGTHS[i])
+        assert dashboard['title'] == f'song {i}'
+        assert dashboard['length'] == LENGTHS[i]
+        assert dashboard['words_per_second'] == pytest.approx(stats['words_per_second'][i])
+        assert dashboard['unique_ratio'] == pytest.approx(stats['unique_ratio'][i])
+        assert dashboard['explicit'] == pytest.approx(explicit_scores[i])
+        assert dashboard['explicit'] == pytest.approx(explicit.evaluate_new_song(lyric))
+
+
+def test_streamed_topics_match_fold_in(corpus, models):
+    # the online fold-in doesn't revisit earlier words, so it is close to
+    # (not the same as) folding in the whole song, once a song is long
+    # enough for the early words to matter less
+    (explicit, explicit_scores, topics) = models
+    songs = [' '.join([lyric]*4) for lyric in LYRICS]
+    folded_in = topics.fold_in(songs)
+    for (i, song) in enumerate(songs):
+        scorer = live_scorer.LiveScorer(explicit, topics, corpus, topic_prior=0.01)
+        stream(scorer, song, 4*LENGTHS[i])
+        assert scorer.document_topic_prob.sum() == pytest.approx(1)
+        assert np.abs(scorer.document_topic_prob - folded_in[i]).max() < 0.3
+
+
+def test_model_without_normalization(corpus, models):
+    (explicit, explicit_scores, topics) = models
+    explicit.normalization = None
+    scorer = live_scorer.LiveScorer(explicit, topics, corpus)
+    with pytest.raises(ValueError, match='rebuild'):
+        scorer.add(LYRICS[1], 10.0)
+
+
+@pytest.mark.parametrize('line, seconds, text', [
+    ('12.5\tlove you baby', 12.5, 'love you baby'),
+    ('love you baby', None, 'love you baby'),
+    ('love\tyou baby', None, 'love\tyou baby'),
+    ('\tlove', None, '\tlove'),
+])
+def test_parse_chunk(line, seconds, text):
+    assert live_scorer.parse_chunk(line) == (seconds, text)
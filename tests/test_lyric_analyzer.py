@@ -0,0 +1,75 @@
+import os
+import pytest
+import lyric_analyzer
+import porter2
+import tokenized_corpus
+from conftest import ROOT
+
+
+GOLDEN_FILE = os.path.join(ROOT, 'tests', 'data', 'metapy_terms.jsonl')
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    cwd = os.getcwd()
+    os.chdir(ROOT)  # the config refers to the stopwords file by a relative path
+    try:
+        return lyric_analyzer.Analyzer('config/config.toml')
+    finally:
+        os.chdir(cwd)
+
+
+def test_matches_metapy(analyzer):
+    # tests/data/metapy_terms.jsonl was written by metapy 0.2.13 (see
+    # lyric_analyzer.write_golden): dictionary words, song titles and
+    # artists, and unicode edge cases
+    golden = lyric_analyzer.load_golden(GOLDEN_FILE)
+    assert len(golden) > 3000
+    differences = [(text, counts, analyzer.analyze(text)) for (text, counts) in golden if analyzer.analyze(text) != counts]
+    assert differences == []
+
+
+@pytest.mark.parametrize('text, counts', [
+    ('cosmos', {'cosmo': 1}),  # not an exception in metapy
+    ('skis skies', {'ski': 1, 'sky': 1}),
+    ('ayyyes yyyy', {'ayyy': 1, 'yyyi': 1}),  # y is a consonant only after aeiou
+    ('a' + 'é'*18, {'a' + 'é'*17: 1}),  # stemmed as utf-8 bytes, cut to 35
+    ('co­operation naïve', {'cooper': 1, 'naiv': 1}),  # format characters and marks are part of words
+    ('σοφός İstanbul', {'σοφόσ': 1, 'İstanbul': 1}),
+    ("don't stop, u.s.a 3.14 rock’n’roll", {"don't": 1, 'stop': 1, 'usa': 1, 'rocknrol': 1}),
+])
+def test_metapy_quirks(analyzer, text, counts):
+    golden = dict(lyric_analyzer.load_golden(GOLDEN_FILE))
+    if text in golden:
+        assert golden[text] == counts
+    assert analyzer.analyze(text) == counts
+
+
+def test_porter2():
+    assert [porter2.stem(word) for word in ['generously', 'communities', 'dying', 'herrings', 'ugly', 'at']] == \
+        ['generous', 'communiti', 'die', 'herring', 'ugli', 'at']
+
+
+def test_term_cache(analyzer):
+    analyzer.term.cache_clear()
+    assert analyzer.analyze('singing singing songs') == {'sing': 2, 'song': 1}
+    analyzer.analyze('singing')
+    info = analyzer.term.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+
+
+def test_unsupported_config(tmp_path):
+    config_file = tmp_path / 'config.toml'
+    config_file.write_text('[[analyzers]]\nmethod = "ngram-word"\nngram = 1\n'
+        '[[analyzers.filter]]\ntype = "icu-tokenizer"\nsuppress-tags = true\n'
+        '[[analyzers.filter]]\ntype = "ptb-normalizer"\n')
+    with pytest.raises(ValueError):
+        lyric_analyzer.Analyzer(str(config_file))
+    with pytest.raises(ValueError):
+        lyric_analyzer.load_analyzer(str(config_file), 'spacy')
+
+
+def test_cache_per_backend(in_project, tmp_path):
+    python_corpus = tokenized_corpus.Corpus(cache_dir=str(tmp_path), backend='python')
+    metapy_corpus = tokenized_corpus.Corpus(cache_dir=str(tmp_path), backend='metapy')
+    assert python_corpus.cache_file != metapy_corpus.cache_file
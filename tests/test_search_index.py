@@ -0,0 +1,46 @@
+import search_index
+
+
+TITLES = ['Hallelujah', 'Hallelujah', 'Halo', 'Crazy in Love', 'Love Story', 'Blinding Lights']
+ARTISTS = ['k.d. lang', 'Leonard Cohen', 'Beyoncé', 'Beyoncé', 'Taylor Swift', 'The Weeknd']
+
+
+def fuzzy_index():
+    index = search_index.FuzzyIndex()
+    index.build(TITLES, ARTISTS)
+    return index
+
+
+def test_fuzzy_title_or_artist():
+    index = fuzzy_index()
+    assert index.search('blindng lihgts')[0][0] == 5
+    assert set([i for (i, score) in index.search('beyonce', 2)]) == {2, 3}
+    assert index.search('nothing like this at all') == []
+
+
+def test_fuzzy_title_and_artist():
+    # the whole query is compared with 'title artist'
+    index = fuzzy_index()
+    results = index.search('halelujah kd lang', 2)
+    assert results[0][0] == 0
+    assert results[0][1] > 3
+    assert index.search('hallelujah leonard cohen')[0][0] == 1
+    assert index.search('love story taylr swift')[0][0] == 4
+
+
+def test_fuzzy_save_and_load(tmp_path):
+    index = fuzzy_index()
+    index_file = str(tmp_path / 'fuzzy_index.pkl')
+    index.save(index_file)
+    loaded = search_index.FuzzyIndex()
+    loaded.load(index_file)
+    for query in ['halelujah kd lang', 'beyonce', 'blindng lihgts']:
+        assert loaded.search(query, 3) == index.search(query, 3)
+
+
+def test_songs_with_one_term_are_indexed():
+    index = search_index.Index()
+    index.build(['Halo', 'Hello', 'Halo', ''], ['Beyoncé', '', '', ''], ['', '', 'Halo', ''])
+    assert index.search('hello') == [(1, 3.0)]
+    assert index.search('halo', 3) == [(2, 3.5), (0, 3.0)]
+    assert index.search('beyoncé') == [(0, 2.0)]
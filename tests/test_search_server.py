@@ -0,0 +1,61 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import search_index
+import search_server
+from test_search_index import TITLES, ARTISTS
+
+
+@pytest.fixture
+def server_url():
+    index = search_index.Index()
+    index.build(TITLES, ARTISTS, ['']*len(TITLES))
+    fuzzy_index = search_index.FuzzyIndex()
+    fuzzy_index.build(TITLES, ARTISTS)
+    dashboards = [{'title': title, 'artist': artist} for (title, artist) in zip(TITLES, ARTISTS)]
+    server = search_server.make_server(search_server.SongSearcher(index, dashboards, fuzzy_index=fuzzy_index), '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    return json.loads(urllib.request.urlopen(url).read())
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'), headers={'Content-Type': 'application/json'})
+    return json.loads(urllib.request.urlopen(request).read())
+
+
+def test_get(server_url):
+    assert get(server_url + '/search?q=blinding+lights')['results'][0]['title'] == 'Blinding Lights'
+    assert get(server_url + '/search?q=blindng+lihgts')['results'] == []
+    assert get(server_url + '/search?q=blindng+lihgts&fuzzy=1')['results'][0]['title'] == 'Blinding Lights'
+
+
+def test_post(server_url):
+    queries = ['love story', 'halelujah kd lang']
+    exact = post(server_url + '/search', {'queries': queries})['results']
+    assert exact[0][0]['title'] == 'Love Story'
+    fuzzy = post(server_url + '/search', {'queries': queries, 'fuzzy': True})['results']
+    assert (fuzzy[1][0]['title'], fuzzy[1][0]['artist']) == ('Hallelujah', 'k.d. lang')
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(server_url + '/search', {'queries': queries, 'fuzzy': 'yes'})
+    assert error.value.code == 400
+
+
+def test_number_of_results(server_url):
+    assert len(get(server_url + '/search?q=hallelujah&n=2')['results']) == 2
+    assert get(server_url + '/search?q=hallelujah&n=0')['results'] == []
+    for url in ['/search?q=hallelujah&n=-1', '/search?q=hallelujah&n=two']:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            get(server_url + url)
+        assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(server_url + '/search', {'queries': ['hallelujah'], 'n': -1})
+    assert error.value.code == 400
@@ -0,0 +1,44 @@
+'''
+Tests of the similar songs index.
+'''
+
+import numpy as np
+import pytest
+
+import similar_songs
+
+
+TOPIC_NAMES = ['Love', 'Wealth', 'Other']
+
+
+def build(number_of_songs, number_of_neighbors=20):
+    random = np.random.RandomState(number_of_songs)
+    topic_prob = random.dirichlet([1.0]*len(TOPIC_NAMES), number_of_songs) if number_of_songs else []
+    index = similar_songs.SimilarSongs()
+    index.build(topic_prob, random.random_sample(number_of_songs), random.random_sample(number_of_songs),
+        random.random_sample(number_of_songs), TOPIC_NAMES, number_of_neighbors)
+    return index
+
+
+@pytest.mark.parametrize('number_of_songs', [0, 1])
+def test_too_few_songs(number_of_songs, tmp_path):
+    index = build(number_of_songs)
+    assert index.neighbors.shape == (number_of_songs, 0)
+    for song in range(number_of_songs):
+        assert index.similar(song) == []
+        assert index.similar(song, topic='Love', max_explicit=1.0) == []
+    index.save(str(tmp_path / 'similar_songs.npz'))
+    loaded = similar_songs.SimilarSongs()
+    loaded.load(str(tmp_path / 'similar_songs.npz'))
+    assert loaded.neighbors.shape == (number_of_songs, 0)
+
+
+def test_similar_matches_brute_force():
+    index = build(40, number_of_neighbors=3)
+    for song in [0, 17, 39]:
+        distances = np.sqrt(((index.features - index.features[song])**2).sum(axis=1))
+        distances[song] = np.inf
+        mask = (index.topic_prob[:, 0] > similar_songs.TOPIC_THRESHOLD) & (index.explicit <= 0.5)
+        expected = [i for i in np.argsort(distances, kind='stable') if mask[i] and i != song][:5]
+        # the filter needs more than the 3 precomputed neighbors, so the tree is searched
+        assert [i for (i, d) in index.similar(song, 5, topic='Love', max_explicit=0.5)] == expected
@@ -0,0 +1,48 @@
+'''
+Tests of the song database formats.
+'''
+
+import pytest
+
+import song_database
+
+
+ROWS = [
+    ['Hallelujah', 'k.d. lang', 191.5, '', 0.7, 0.41, 0.0, 'Religion'],
+    ['Crazy in Love', 'Beyoncé', 236.0, 'JAY-Z', 2.25, 0.33, 0.52, 'Love/Other'],
+    ['', 'ザ・ピーナッツ, "quoted"', 0.0, 'a,b\nc', 0.0, 0.0, 1.0, 'n/a'],
+]
+
+
+def test_columnar_round_trip(tmp_path):
+    database_file = str(tmp_path / 'songdash_database.bin')
+    song_database.write_columnar(ROWS, database_file)
+    database = song_database.ColumnarDatabase(database_file)
+    assert len(database) == len(ROWS)
+    assert [database[i] for i in range(len(ROWS))] == ROWS
+    assert list(database) == ROWS
+    assert database[-1] == ROWS[-1]
+    with pytest.raises(IndexError):
+        database[len(ROWS)]
+    assert list(database.column('explicit')) == [row[6] for row in ROWS]
+    assert database.column('artist') == [row[1] for row in ROWS]
+
+
+def test_columnar_without_rows(tmp_path):
+    database_file = str(tmp_path / 'songdash_database.bin')
+    song_database.write_columnar([], database_file)
+    database = song_database.ColumnarDatabase(database_file)
+    assert len(database) == 0
+    assert len(database.column('length')) == 0
+
+
+def test_csv_export_matches_csv(tmp_path):
+    song_database.write_columnar(ROWS, str(tmp_path / 'songdash_database.bin'))
+    song_database.write_csv(ROWS, str(tmp_path / 'written.csv'))
+    database = song_database.open_database(str(tmp_path / 'songdash_database.bin'), str(tmp_path / 'written.csv'))
+    database.export_csv(str(tmp_path / 'exported.csv'))
+    assert (tmp_path / 'exported.csv').read_bytes() == (tmp_path / 'written.csv').read_bytes()
+
+    # without the binary file, the csv one is read, with the same dashboards
+    rows = song_database.open_database(str(tmp_path / 'missing.bin'), str(tmp_path / 'written.csv'))
+    assert [song_database.dashboard(row) for row in rows] == [song_database.dashboard(row) for row in ROWS]
@@ -0,0 +1,52 @@
+'''
+Tests of the tokenized corpus and its on-disk cache.
+'''
+
+import os
+import numpy as np
+
+import tokenized_corpus
+from conftest import LYRICS
+
+
+def test_cache_round_trip(corpus):
+    tokens = corpus.tokenize_songs(LYRICS)
+    for ((ids, counts), lyric) in zip(tokens, LYRICS):
+        assert dict(zip([corpus.terms[i] for i in ids], counts)) == corpus.analyze(lyric)
+    corpus.save()
+    assert not corpus.modified
+
+    loaded = tokenized_corpus.Corpus(cache_dir=os.path.dirname(corpus.cache_file))
+    assert loaded.cache_file == corpus.cache_file
+    assert loaded.terms == corpus.terms
+    loaded_tokens = loaded.tokenize_songs(LYRICS)
+    # the cached songs are not analyzed again
+    assert loaded.analyzer is None and not loaded.modified
+    for ((ids, counts), (loaded_ids, loaded_counts)) in zip(tokens, loaded_tokens):
+        assert np.array_equal(ids, loaded_ids) and np.array_equal(counts, loaded_counts)
+    assert (loaded.term_doc_matrix(LYRICS) != corpus.term_doc_matrix(LYRICS)).nnz == 0
+
+
+def test_new_songs_extend_the_cache(corpus):
+    corpus.tokenize_songs(LYRICS[:4])
+    corpus.save()
+    loaded = tokenized_corpus.Corpus(cache_dir=os.path.dirname(corpus.cache_file))
+    loaded.tokenize_songs(LYRICS)
+    assert loaded.modified
+    assert loaded.terms[:len(corpus.terms)] == corpus.terms
+    loaded.save()
+    reloaded = tokenized_corpus.Corpus(cache_dir=os.path.dirname(corpus.cache_file))
+    assert set(reloaded.songs) == set([tokenized_corpus.lyric_hash(lyric) for lyric in LYRICS])
+
+
+def test_cache_is_keyed_by_config(in_project, tmp_path):
+    config = open('config/config.toml').read()
+    other_config = tmp_path / 'config.toml'
+    other_config.write_text(config.replace('min = 3', 'min = 2'))
+    vocabulary_only = tmp_path / 'vocabulary.toml'
+    vocabulary_only.write_text(config.replace('min-df = 1', 'min-df = 2'))
+    cache_dir = str(tmp_path / 'token_cache')
+    default = tokenized_corpus.Corpus(cache_dir=cache_dir)
+    assert tokenized_corpus.Corpus(str(other_config), cache_dir).cache_file != default.cache_file
+    # the [vocabulary] settings don't change how songs are analyzed
+    assert tokenized_corpus.Corpus(str(vocabulary_only), cache_dir).cache_file == default.cache_file
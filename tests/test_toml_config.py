@@ -0,0 +1,62 @@
+import pytest
+import toml_config
+import vocabulary
+
+
+DOCUMENT = '''
+# a comment
+title = "lyrics"   # a comment after a string
+"quoted key" = 'C:\\path'
+escaped = "tab\\there \\u00e9"
+numbers = [1, -2, 3_000, 1.5, 2e3, inf]  # mixed
+point = { x = 1, y = "two" }
+dotted.key = true
+
+[[analyzers]]
+method = "ngram-word"
+    [[analyzers.filter]]
+    type = "length"
+    min = 3
+    [[analyzers.filter]]
+    type = "porter2-filter"
+
+[vocabulary]
+min-df = 2 # songs
+max-df = 0.5
+'''
+
+EXPECTED = {
+    'title': 'lyrics',
+    'quoted key': 'C:\\path',
+    'escaped': 'tab\there \u00e9',
+    'numbers': [1, -2, 3000, 1.5, 2000.0, float('inf')],
+    'point': {'x': 1, 'y': 'two'},
+    'dotted': {'key': True},
+    'analyzers': [{'method': 'ngram-word', 'filter': [{'type': 'length', 'min': 3}, {'type': 'porter2-filter'}]}],
+    'vocabulary': {'min-df': 2, 'max-df': 0.5},
+}
+
+
+def test_loads():
+    assert toml_config.loads(DOCUMENT) == EXPECTED
+
+
+@pytest.mark.parametrize('text', ['a = ', 'a = "open', 'a = 1 b = 2', '[t]\n[t]', 'a = 1\na = 2'])
+def test_invalid(text):
+    with pytest.raises(ValueError, match='<string>'):
+        toml_config.loads(text)
+
+
+def test_project_config(in_project):
+    config = toml_config.load('config/config.toml')
+    assert [settings['type'] for settings in config['analyzers'][0]['filter']][0] == 'icu-tokenizer'
+
+
+def test_vocabulary_settings(tmp_path):
+    config_file = tmp_path / 'config.toml'
+    config_file.write_text('[vocabulary]\nmin-df = 2  # inline comment\n"max-terms" = 100\n')
+    settings = vocabulary.load_settings(str(config_file))
+    assert settings == dict(vocabulary.DEFAULT_SETTINGS, **{'min-df': 2, 'max-terms': 100})
+    config_file.write_text('[vocabulary]\nmin-df = "two"\n')
+    with pytest.raises(ValueError):
+        vocabulary.load_settings(str(config_file))
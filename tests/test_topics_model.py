@@ -0,0 +1,153 @@
+'''
+Tests of the topic model's EM runs.
+'''
+
+import os
+import subprocess
+import sys
+import types
+import numpy as np
+import pytest
+
+import topics_model
+from conftest import LYRICS
+
+
+def make_model(corpus):
+    model = topics_model.Model(LYRICS, corpus=corpus)
+    model.build_vocabulary()
+    model.build_term_doc_matrix()
+    model.initialize(model.number_of_topics, seed=3)
+    return model
+
+
+def shared_memory_blocks():
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+
+def test_parallel_em_matches_one_process(corpus):
+    model = make_model(corpus)
+    model.likelihoods = []
+    for i in range(10):
+        model.expectation_step()
+        model.maximization_step(model.number_of_topics)
+        model.likelihoods.append(model.calculate_likelihood(model.number_of_topics))
+
+    before = shared_memory_blocks()
+    parallel_model = make_model(corpus)
+    parallel_model.plsa_parallel_em(10, 0.0, 60, processes=2)
+    assert shared_memory_blocks() == before
+    assert np.allclose(parallel_model.likelihoods, model.likelihoods)
+    assert np.allclose(parallel_model.document_topic_prob, model.document_topic_prob)
+    assert np.allclose(parallel_model.topic_word_prob, model.topic_word_prob)
+
+
+def test_without_shared_memory(corpus, monkeypatch):
+    # before Python 3.8 there is no multiprocessing.shared_memory: the module
+    # still imports, and EM runs in this process
+    code = 'import sys; sys.modules["multiprocessing.shared_memory"] = None; import topics_model'
+    subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(topics_model.__file__), check=True)
+
+    model = topics_model.Model(LYRICS, corpus=corpus)
+    model.plsa(5, 0.0, 60, seed=3)
+    monkeypatch.setattr(topics_model, 'sys', types.SimpleNamespace(version_info=(3, 7, 9)))
+    monkeypatch.setattr(topics_model.Model, 'plsa_parallel_em', None)
+    serial_model = topics_model.Model(LYRICS, corpus=corpus)
+    serial_model.plsa(5, 0.0, 60, processes=2, seed=3)
+    assert np.allclose(serial_model.topic_word_prob, model.topic_word_prob)
+
+
+def test_parallel_em_worker_dies(corpus, monkeypatch):
+    def dying_worker(connection, *args):
+        connection.recv()
+        os._exit(3)
+
+    monkeypatch.setattr(topics_model, 'em_worker', dying_worker)
+    model = make_model(corpus)
+    before = shared_memory_blocks()
+    with pytest.raises(RuntimeError, match='exit code 3'):
+        model.plsa_parallel_em(10, 0.0, 60, processes=2)
+    assert shared_memory_blocks() == before
+
+
+def write_lyrics(path, lyrics):
+    import song_records
+    song_records.write_songs(str(path), [(f'Song {i}', 'Artist', 180.0, '', lyric) for (i, lyric) in enumerate(lyrics)])
+    return str(path)
+
+
+def test_plsa_online_bounds_the_vocabulary(corpus, tmp_path):
+    documents_path = write_lyrics(tmp_path / 'songs.txt', LYRICS*3)
+    model = topics_model.Model(corpus=corpus)
+    np.random.seed(1)
+    model.plsa_online(documents_path, batch_size=5, passes=2, max_terms=6, hash_buckets=4)
+    prior_words = set([word for topic in model.topic_priors for word in topic])
+    assert model.vocabulary_size == len(prior_words) + 4 + 6
+    assert model.topic_word_prob.shape == (model.number_of_topics, model.vocabulary_size)
+    assert np.allclose(model.topic_word_prob.sum(axis=1), 1)
+
+    # every song is folded into the final model
+    assert model.document_topic_prob.shape == (len(LYRICS)*3, model.number_of_topics)
+    assert np.allclose(model.document_topic_prob, model.fold_in(LYRICS*3))
+
+
+def test_plsa_online_keeps_the_initial_statistics(corpus, tmp_path, monkeypatch):
+    documents_path = write_lyrics(tmp_path / 'songs.txt', LYRICS)
+    with pytest.raises(ValueError):
+        topics_model.Model(corpus=corpus).plsa_online(documents_path, tau0=0)
+    events = []
+    monkeypatch.setattr(topics_model.instrumentation, 'event', lambda name, **values: events.append(values))
+    topics_model.Model(corpus=corpus).plsa_online(documents_path, batch_size=3)
+    assert len(events) == 3
+    assert all([0 < values['step_size'] < 1 for values in events])
+
+
+def test_save_and_load(corpus, tmp_path):
+    model = topics_model.Model(LYRICS, corpus=corpus)
+    model.plsa(max_iter=5, epsilon=0.0, time_cutoff=60, seed=7)
+    model_file = str(tmp_path / 'topic_models.txt')
+    model.save_model(model_file)
+    assert open(model_file).readline() == '#seed:7\n'
+
+    loaded = topics_model.Model(corpus=corpus)
+    loaded.load_model(model_file)
+    assert loaded.seed == 7
+    assert loaded.vocabulary_size == model.vocabulary_size
+    columns = [loaded.vocabulary_ind[word] for word in model.vocabulary]
+    assert np.allclose(loaded.topic_word_prob[:, columns], model.topic_word_prob)
+    assert np.allclose(loaded.fold_in(LYRICS), model.fold_in(LYRICS))
+
+    # the same seed gives the same model again
+    again = topics_model.Model(LYRICS, corpus=corpus)
+    again.plsa(max_iter=5, epsilon=0.0, time_cutoff=60, seed=loaded.seed)
+    assert np.allclose(again.topic_word_prob, model.topic_word_prob)
+
+
+def test_load_model_without_seed(corpus, tmp_path):
+    # models saved before the seed was kept
+    model = topics_model.Model(LYRICS, corpus=corpus)
+    model.plsa(max_iter=2, epsilon=0.0, time_cutoff=60)
+    assert model.seed is None
+    model_file = str(tmp_path / 'topic_models.txt')
+    model.save_model(model_file)
+    assert not open(model_file).readline().startswith('#seed')
+    loaded = topics_model.Model(corpus=corpus)
+    loaded.load_model(model_file)
+    assert loaded.seed is None
+    assert loaded.number_of_topics == model.number_of_topics
+
+
+def test_restarts_keep_the_best_seed(corpus):
+    model = topics_model.Model(LYRICS, corpus=corpus)
+    with pytest.raises(ValueError):
+        model.plsa(max_iter=0, epsilon=0.0, time_cutoff=60, restarts=3, seed=5)
+
+    # fewer iterations than min_iter, so every restart runs to the end
+    model.plsa(max_iter=4, epsilon=-float('inf'), time_cutoff=60, restarts=3, seed=5)
+    final_likelihoods = {}
+    for seed in [5, 6, 7]:
+        single = topics_model.Model(LYRICS, corpus=corpus)
+        single.plsa(max_iter=4, epsilon=-float('inf'), time_cutoff=60, seed=seed)
+        final_likelihoods[seed] = single.likelihoods[-1]
+    assert model.seed == max(final_likelihoods, key=final_likelihoods.get)
+    assert model.likelihoods[-1] == pytest.approx(final_likelihoods[model.seed])
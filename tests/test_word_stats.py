@@ -0,0 +1,31 @@
+'''
+Tests of the word statistics, against a word by word calculation.
+'''
+
+import numpy as np
+
+import word_stats
+from conftest import LYRICS
+
+
+def test_evaluate_corpus_matches_word_by_word():
+    songs = LYRICS + ['', '  \n ', 'Über QUIZ  jazz\tßtraße İstanbul ΣΟΦΙΑ 😀 zz']
+    lengths = [100.0]*len(LYRICS) + [0.0, 10.0, 0.0]
+    result = word_stats.Stats(songs=songs, lengths=lengths).evaluate_corpus()
+    for (i, song) in enumerate(songs):
+        words = song.split()
+        assert result['words'][i] == len(words)
+        assert result['unique_words'][i] == len(set(words))
+        if not words:
+            assert result['unique_ratio'][i] == 0 and result['average_word_length'][i] == 0
+            continue
+        assert np.isclose(result['unique_ratio'][i], len(set(words))/len(words))
+        assert np.isclose(result['average_word_length'][i], sum([len(word) for word in words])/len(words))
+        points = sum([word_stats.scrabble_points(word) for word in words])
+        assert np.isclose(result['scrabble_per_word'][i], points/len(words))
+        assert np.isclose(result['words_per_second'][i], len(words)/lengths[i] if lengths[i] else 0)
+
+
+def test_evaluate_corpus_without_songs():
+    result = word_stats.Stats(songs=[], lengths=[]).evaluate_corpus()
+    assert all([len(values) == 0 for values in result.values()])
@@ -0,0 +1,187 @@
+'''
+This file is used to tokenize song lyrics once, and share the result
+between all of the lyric models (word stats, explicit model, topics).
+
+Each song is run through the analyzer set up in config/config.toml and
+stored as an array of integer term ids with an array of counts. Term ids
+index into a single shared list of terms. The analyzer is either the
+pure Python one in lyric_analyzer.py (the default) or metapy's.
+
+Results are kept in a cache file on disk. The file is named after a
+hash of the analyzer configuration (the config file and any files it
+references, like the stopwords list) and the analyzer backend, and songs
+are looked up by a hash of their lyrics. So changing the analyzer starts
+a new cache (the backends split some text, like Thai, differently), and
+a lyric is only analyzed again if its text changes.
+'''
+
+import hashlib
+import os
+import pickle
+import re
+import numpy as np
+from scipy import sparse
+import lyric_analyzer
+import parallel
+
+
+def config_hash(config_file):
+    '''
+    Hashes an analyzer config file, along with the files it references.
+    The [vocabulary] table is left out, since it doesn't change how songs
+    are analyzed.
+    '''
+    h = hashlib.sha1()
+    f = open(config_file, 'rb')
+    config = f.read()
+    f.close()
+    config = re.sub(rb'(?ms)^\[vocabulary\].*?(?=^\[|\Z)', b'', config)
+    h.update(config)
+    for referenced_file in re.findall(r'file\s*=\s*"([^"]*)"', config.decode('utf-8')):
+        if os.path.exists(referenced_file):
+            f = open(referenced_file, 'rb')
+            h.update(f.read())
+            f.close()
+    return h.hexdigest()
+
+
+def lyric_hash(lyric):
+    '''
+    Hashes the text of a song's lyrics.
+    '''
+    return hashlib.sha1(lyric.encode('utf-8')).hexdigest()
+
+
+class Corpus:
+    '''
+    Tokenized songs, cached on disk.
+    '''
+    def __init__(self, config_file='config/config.toml', cache_dir='data/token_cache', backend='python'):
+        '''
+        Initialize with the analyzer config, and the directory that holds
+        cache files. A previously saved cache for this config is loaded.
+        backend is the analyzer to use, 'python' or 'metapy' (see
+        lyric_analyzer.load_analyzer).
+        '''
+        self.config_file = config_file
+        self.backend = backend
+        self.cache_file = os.path.join(cache_dir, config_hash(config_file) + '-' + backend + '.pkl')
+        self.terms = []
+        self.term_ind = {}
+        self.songs = {}  # lyric hash -> (term ids, counts)
+        self.analyzer = None
+        self.modified = False
+        if os.path.exists(self.cache_file):
+            f = open(self.cache_file, 'rb')
+            (self.terms, self.songs) = pickle.load(f)
+            f.close()
+            self.term_ind = dict((term, i) for (i, term) in enumerate(self.terms))
+
+    def analyze(self, lyric):
+        '''
+        Runs the analyzer on a lyric, returning a dictionary of term counts.
+        '''
+        if self.analyzer is None:
+            self.analyzer = lyric_analyzer.load_analyzer(self.config_file, self.backend)
+        return self.analyzer.analyze(lyric)
+
+    def tokenize(self, lyric):
+        '''
+        Returns (term ids, counts) for a lyric, analyzing it only if it
+        is not already in the cache.
+        '''
+        key = lyric_hash(lyric)
+        if key not in self.songs:
+            self.store(key, self.analyze(lyric))
+        return self.songs[key]
+
+    def store(self, key, words):
+        '''
+        Adds the analyzed term counts of the lyric with hash key to the cache.
+        '''
+        ids = []
+        for word in words:
+            if word not in self.term_ind:
+                self.term_ind[word] = len(self.terms)
+                self.terms.append(word)
+            ids.append(self.term_ind[word])
+        self.songs[key] = (np.array(ids, dtype=np.int32), np.array([words[w] for w in words], dtype=np.int32))
+        self.modified = True
+
+    def tokenize_songs(self, lyrics):
+        '''
+        Returns a list of (term ids, counts), one per lyric, in the same order.
+        '''
+        return [self.tokenize(lyric) for lyric in lyrics]
+
+    def tokenize_songs_parallel(self, lyrics, pool, number_of_shards):
+        '''
+        Same as tokenize_songs, but the lyrics that are not cached yet are
+        analyzed in shards by a multiprocessing pool. Results are added in
+        song order, so term ids are the same as with tokenize_songs.
+        '''
+        keys = [lyric_hash(lyric) for lyric in lyrics]
+        missing = {}
+        for (key, lyric) in zip(keys, lyrics):
+            if key not in self.songs and key not in missing:
+                missing[key] = lyric
+        shards = parallel.make_shards(list(missing.items()), number_of_shards)
+        analyzed = pool.map(analyze_shard, [(self.config_file, self.backend, shard) for shard in shards])
+        for (key, words) in parallel.concatenate(analyzed):
+            self.store(key, words)
+        return [self.songs[key] for key in keys]
+
+    def term_doc_matrix(self, lyrics):
+        '''
+        Returns a CSR matrix of term counts, where each row is a song and
+        each column is a term id of this corpus.
+        '''
+        tokens = self.tokenize_songs(lyrics)
+        indptr = np.zeros(len(tokens)+1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(ids) for (ids, counts) in tokens])
+        if tokens:
+            indices = np.concatenate([ids for (ids, counts) in tokens])
+            data = np.concatenate([counts for (ids, counts) in tokens]).astype(float)
+        else:
+            indices = np.zeros(0, dtype=np.int32)
+            data = np.zeros(0)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(tokens), len(self.terms)))
+
+    def save(self):
+        '''
+        Writes the cache to disk, if anything new has been tokenized.
+        '''
+        if not self.modified:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        f = open(self.cache_file, 'wb')
+        pickle.dump((self.terms, self.songs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
+        self.modified = False
+
+
+_worker_analyzers = {}
+
+def analyze_shard(args):
+    '''
+    Analyzes a shard of (lyric hash, lyric) pairs in a worker process,
+    returning (lyric hash, term counts) pairs. Each worker loads the
+    analyzer once.
+    '''
+    (config_file, backend, shard) = args
+    if (config_file, backend) not in _worker_analyzers:
+        _worker_analyzers[(config_file, backend)] = lyric_analyzer.load_analyzer(config_file, backend)
+    analyzer = _worker_analyzers[(config_file, backend)]
+    return [(key, analyzer.analyze(lyric)) for (key, lyric) in shard]
+
+
+_default_corpus = None
+
+def default_corpus():
+    '''
+    The corpus shared by all models that are not given one explicitly.
+    '''
+    global _default_corpus
+    if _default_corpus is None:
+        _default_corpus = Corpus()
+    return _default_corpus
@@ -0,0 +1,46 @@
+'''
+This file is used to read the TOML config files (config/config.toml),
+shared by everything that reads settings from them (the vocabulary
+settings, the pure Python analyzer).
+
+On Python 3.11 and later, files are parsed with the standard tomllib.
+Earlier versions (like the python3.7 this project uses) need the tomli
+package (pip3.7 install tomli), which has the same interface, or the
+older toml package.
+
+Errors are raised as ValueError (the parsers' decode errors are ones too).
+'''
+
+try:
+    import tomllib as toml_parser
+except ImportError:  # before Python 3.11
+    try:
+        import tomli as toml_parser
+    except ImportError:
+        try:
+            import toml as toml_parser
+        except ImportError:
+            toml_parser = None
+
+
+def load(config_file):
+    '''
+    Reads a TOML file. Returns its content as a dictionary. Raises
+    ValueError if the file is not valid TOML.
+    '''
+    f = open(config_file, 'rb')
+    text = f.read().decode('utf-8')
+    f.close()
+    return loads(text, config_file)
+
+
+def loads(text, name='<string>'):
+    '''
+    Parses the text of a TOML file, named name in error messages.
+    '''
+    if toml_parser is None:
+        raise ImportError('reading config files needs Python 3.11+, or the tomli package (pip3.7 install tomli)')
+    try:
+        return toml_parser.loads(text)
+    except ValueError as error:
+        raise ValueError(f'{name}: {error}')
@@ -16,12 +16,26 @@ This article was used to help determine topics:
 https://journals.sagepub.com/doi/full/10.1177/0305735617748205
 
 The terms associated with topics were hand-picked.
+
+The term-document matrix is kept in sparse (CSR) form, and the EM
+steps only evaluate P(z | d, w) for the (d, w) pairs that actually
+occur in the lyrics. Memory therefore grows with the number of
+nonzero term counts times the number of topics, rather than with
+documents x topics x vocabulary.
 '''
 
 import numpy as np
+from scipy import sparse
+import itertools
 import math
-import metapy
+import multiprocessing
+import sys
 import time
+import instrumentation
+import parallel
+import song_records
+import tokenized_corpus
+import vocabulary
 
 
 def normalize(input_matrix, sum_to=[]):
@@ -37,6 +51,168 @@ def normalize(input_matrix, sum_to=[]):
     new_matrix = input_matrix / row_sums[:, np.newaxis] * sum_to
     return new_matrix
 
+
+
+def joint_prob(document_topic_prob, topic_word_prob, term_doc_matrix, term_doc_rows):
+    """
+    Returns P(z | d) P(w | z) for each nonzero (d, w) pair of a CSR
+    term-doc matrix (rows, in CSR order) and each topic (columns).
+    term_doc_rows is the document index of every nonzero entry.
+    """
+
+    return document_topic_prob[term_doc_rows] * topic_word_prob[:, term_doc_matrix.indices].T
+
+
+def topic_counts(topic_prob, term_doc_matrix, term_doc_rows, number_of_topics):
+    """
+    Weights P(z | d, w) by the term counts, and sums them over words (giving
+    document x topic counts) and over documents (giving topic x word counts).
+    """
+
+    (number_of_documents, vocabulary_size) = term_doc_matrix.shape
+    mat = topic_prob * term_doc_matrix.data[:, np.newaxis]
+    doc_counts = np.zeros((number_of_documents, number_of_topics))
+    word_counts = np.zeros((number_of_topics, vocabulary_size))
+    for i in range(number_of_topics):
+        doc_counts[:, i] = np.bincount(term_doc_rows, weights=mat[:, i], minlength=number_of_documents)
+        word_counts[i] = np.bincount(term_doc_matrix.indices, weights=mat[:, i], minlength=vocabulary_size)
+    return (doc_counts, word_counts)
+
+
+def document_topic_prob_from_counts(doc_counts, document_topic_prob):
+    """
+    The M-step update of P(z | d). Songs without any words in the
+    vocabulary have no counts, and keep their current P(z | d).
+    """
+
+    known = doc_counts.sum(axis=1) > 0
+    if known.all():
+        return normalize(doc_counts)
+    new_document_topic_prob = np.array(document_topic_prob)
+    new_document_topic_prob[known] = normalize(doc_counts[known])
+    return new_document_topic_prob
+
+
+def log_likelihood(document_topic_prob, topic_word_prob, term_doc_matrix, term_doc_rows):
+    """
+    The log-likelihood of a CSR term-doc matrix. Pairs (d, w) with a zero
+    count do not contribute, so only the nonzero entries are evaluated.
+    """
+
+    a = joint_prob(document_topic_prob, topic_word_prob, term_doc_matrix, term_doc_rows).sum(axis=1)
+    return np.dot(np.log(a), term_doc_matrix.data)
+
+
+def fold_in_prob(topic_word_prob, term_doc_matrix, max_iter):
+    """
+    Estimates P(z | d) for the documents of a CSR term-doc matrix, with
+    P(w | z) held fixed, by running max_iter EM iterations. Documents
+    without any (known) words keep a uniform distribution.
+    """
+
+    (number_of_documents, vocabulary_size) = term_doc_matrix.shape
+    number_of_topics = topic_word_prob.shape[0]
+    rows = np.repeat(np.arange(number_of_documents), np.diff(term_doc_matrix.indptr))
+    counts = term_doc_matrix.data
+    word_prob = topic_word_prob[:, term_doc_matrix.indices].T
+
+    document_topic_prob = np.full((number_of_documents, number_of_topics), 1/number_of_topics)
+    for iteration in range(max_iter):
+        mat = document_topic_prob[rows] * word_prob
+        row_sums = mat.sum(axis=1)
+        np.divide(mat, row_sums[:, np.newaxis], out=mat, where=row_sums[:, np.newaxis] > 0)
+        mat *= counts[:, np.newaxis]
+        doc_sums = np.zeros((number_of_documents, number_of_topics))
+        for i in range(number_of_topics):
+            doc_sums[:, i] = np.bincount(rows, weights=mat[:, i], minlength=number_of_documents)
+        known = doc_sums.sum(axis=1) > 0
+        document_topic_prob[known] = normalize(doc_sums[known])
+    return document_topic_prob
+
+
+def restart_worker(connection, model, seed):
+    """
+    Runs EM for one restart of Model.plsa_restarts in a worker process,
+    from the starting point given by seed. Commands are received over
+    connection.
+    """
+
+    model.initialize(model.number_of_topics, seed)
+    while True:
+        command = connection.recv()
+        if command == 'step':
+            model.expectation_step()
+            model.maximization_step(model.number_of_topics)
+            connection.send(model.calculate_likelihood(model.number_of_topics))
+        elif command == 'result':
+            connection.send((model.document_topic_prob, model.topic_word_prob))
+        elif command == 'stop':
+            break
+
+
+def attach_shared_memory(name):
+    """
+    Attaches a worker process to the shared memory block name, created
+    (and unlinked) by the parent process. Before Python 3.13, attaching
+    registers the block with the resource tracker as if the worker owned it,
+    so the tracker could warn about it, or unlink it, when the worker exits.
+    The registration is skipped here, leaving the block to the parent.
+    """
+
+    from multiprocessing import resource_tracker, shared_memory  # Python 3.8+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def em_worker(connection, term_doc_matrix, document_topic_prob, topic_word_name, counts_name, shape):
+    """
+    Runs EM steps for one shard of songs in a worker process (see
+    Model.plsa_parallel_em). P(w | z) is read from the shared memory block
+    topic_word_name, and expected topic-word counts are written to
+    counts_name. Commands are received over connection.
+    """
+
+    topic_word_memory = attach_shared_memory(topic_word_name)
+    counts_memory = attach_shared_memory(counts_name)
+    topic_word_prob = np.ndarray(shape, buffer=topic_word_memory.buf)
+    word_counts = np.ndarray(shape, buffer=counts_memory.buf)
+    term_doc_rows = np.repeat(np.arange(term_doc_matrix.shape[0]), np.diff(term_doc_matrix.indptr))
+    while True:
+        command = connection.recv()
+        if command == 'em':
+            topic_prob = joint_prob(document_topic_prob, topic_word_prob, term_doc_matrix, term_doc_rows)
+            topic_prob /= topic_prob.sum(axis=1)[:, np.newaxis]
+            (doc_counts, word_counts[:]) = topic_counts(topic_prob, term_doc_matrix, term_doc_rows, shape[0])
+            document_topic_prob = document_topic_prob_from_counts(doc_counts, document_topic_prob)
+            connection.send(True)
+        elif command == 'likelihood':
+            connection.send(log_likelihood(document_topic_prob, topic_word_prob, term_doc_matrix, term_doc_rows))
+        elif command == 'result':
+            connection.send(document_topic_prob)
+        elif command == 'stop':
+            break
+    del topic_word_prob, word_counts
+    topic_word_memory.close()
+    counts_memory.close()
+
+def receive(connection, process):
+    """
+    Receives the reply of the worker process over connection. Raises
+    RuntimeError if the worker died instead of replying.
+    """
+
+    try:
+        return connection.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f'an EM worker process died (exit code {process.exitcode})')
+
        
 class Model(object):
 
@@ -44,15 +220,21 @@ class Model(object):
     Model topics from song lyrics.
     """
 
-    def __init__(self, songs=[]):
+    def __init__(self, songs=[], corpus=None):
         self.documents = songs
         self.vocabulary = []
         self.vocabulary_ind = {}
-        self.likelihoods = []
-        self.term_doc_matrix = None 
+        self.vocabulary_settings = None  # see vocabulary.py, read from the corpus' config if None
+        self.term_columns = None  # vocabulary column of each corpus term id, -1 if dropped
+        self.hash_buckets = 0  # number of shared '#n' columns terms are hashed into
+        self.likelihoods = []  # log-likelihood after each EM iteration of plsa
+        self.stop_reason = None  # why the last EM run stopped early, see report_iteration
+        self.seed = None  # seed of the random starting point, if one was given (or chosen by plsa_restarts)
+        self.term_doc_matrix = None  # CSR, documents x vocabulary
+        self.term_doc_rows = None  # document index of each nonzero entry
         self.document_topic_prob = None  # P(z | d)
         self.topic_word_prob = None  # P(w | z)
-        self.topic_prob = None  # P(z | d, w)
+        self.topic_prob = None  # P(z | d, w), nonzero (d, w) pairs x topics
 
         love_topic = {'love':0.2, 'heart':0.05, 'hate':0.025}
         sex_topic = {'sex':0.1, 'ass':0.05, 'pussi':0.05, 'dick':0.05}
@@ -69,6 +251,7 @@ class Model(object):
         self.number_of_topics = len(self.topic_priors)
         self.number_of_documents = len(self.documents)
         self.vocabulary_size = 0
+        self.corpus = corpus  # tokenized_corpus.Corpus, the shared one if None
 
 
     def set_songs_from_file(self, documents_path):
@@ -76,56 +259,69 @@ class Model(object):
         Gathers lyrics from a file containing song lyrics.
         """
         
-        f = open(documents_path,'r')
-        lines = f.readlines()
-        f.close()
-        self.documents = [lines[x] for x in range(5, len(lines), 7)]
+        self.documents = [song.lyrics for song in song_records.read_songs(documents_path)]
         self.number_of_documents = len(self.documents)
         
 
     def build_vocabulary(self):
         """
-        Builds a vocabulary from all songs available.
+        Builds a vocabulary from all songs available, in the order words are
+        first seen. Terms are kept, dropped or hashed into shared columns
+        according to vocabulary_settings (see vocabulary.py), and the topic
+        prior words are always kept.
         """
         
-        i = 0
-        ana = metapy.analyzers.load('config/config.toml')
-        doc = metapy.index.Document()
-        for document in self.documents:
-            doc.content(document)
-            words = ana.analyze(doc)
-            for word in words:
-                if not word in self.vocabulary_ind:
-                    self.vocabulary_ind[word] = i
-                    self.vocabulary.append(word)
-                    i += 1
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        tokens = corpus.tokenize_songs(self.documents)
+        settings = self.vocabulary_settings or vocabulary.load_settings(corpus.config_file)
+        if tokens:
+            ids = np.concatenate([ids for (ids, counts) in tokens])
+            (unique_ids, first_seen) = np.unique(ids, return_index=True)
+            term_order = ids[np.sort(first_seen)]
+            document_frequencies = np.bincount(ids, minlength=len(corpus.terms))
+        else:
+            term_order = []
+            document_frequencies = np.zeros(len(corpus.terms), dtype=np.int64)
+        prior_words = [word for topic in self.topic_priors for word in topic]
+        (self.vocabulary, self.term_columns) = vocabulary.build_columns(corpus, term_order, document_frequencies,
+            len(tokens), settings, prior_words)
+        self.vocabulary_ind = dict((word, i) for (i, word) in enumerate(self.vocabulary))
         self.vocabulary_size = len(self.vocabulary)
+        self.hash_buckets = settings['hash-buckets']
 
 
     def build_term_doc_matrix(self):
         """
         Construct the term-document matrix where each row represents a song, 
-        and each column represents a vocabulary term.
+        and each column represents a vocabulary term. The matrix is stored in
+        CSR form, since a song only uses a tiny fraction of the vocabulary.
+        Terms that were dropped from the vocabulary are left out, and terms
+        hashed into the same column are added together.
         """
         
         self.number_of_documents = len(self.documents)
 
-        ana = metapy.analyzers.load('config/config.toml')
-        doc = metapy.index.Document()
-        self.term_doc_matrix = np.zeros((self.number_of_documents, self.vocabulary_size))
-        for i in range(self.number_of_documents):
-            doc.content(self.documents[i])
-            words = ana.analyze(doc)
-            for word in words:
-                self.term_doc_matrix[i][self.vocabulary_ind[word]] = words[word]
+        # map the corpus' term ids to this model's vocabulary
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        matrix = corpus.term_doc_matrix(self.documents)
+        columns = self.term_columns[matrix.indices]
+        kept = columns >= 0
+        rows = np.repeat(np.arange(self.number_of_documents), np.diff(matrix.indptr))
+        self.term_doc_matrix = sparse.csr_matrix((matrix.data[kept], (rows[kept], columns[kept])),
+            shape=(self.number_of_documents, self.vocabulary_size))
+        self.term_doc_matrix.sum_duplicates()
+        # document index of every stored (d, w) pair, aligned with .indices
+        self.term_doc_rows = np.repeat(np.arange(self.number_of_documents), np.diff(self.term_doc_matrix.indptr))
         
 
-    def initialize(self, number_of_topics):
+    def initialize(self, number_of_topics, seed=None):
         """
-        Initializes the model. Topics start closer to the priors.
+        Initializes the model. Topics start closer to the priors. With a
+        seed, the random starting point is always the same for that seed.
         """
         
-        self.document_topic_prob = np.random.random((self.number_of_documents, number_of_topics))
+        random = np.random.RandomState(seed) if seed is not None else np.random
+        self.document_topic_prob = random.random_sample((self.number_of_documents, number_of_topics))
         self.document_topic_prob = normalize(self.document_topic_prob)
         
         prior_weights = []
@@ -134,69 +330,80 @@ class Model(object):
                 prior_weights.append(1-sum(topic.values()))
         prior_weights = np.transpose(np.array([prior_weights]))*2
         if self.topic_priors:
-            self.topic_word_prob = np.random.random((number_of_topics, len(self.vocabulary)))
+            self.topic_word_prob = random.random_sample((number_of_topics, len(self.vocabulary)))
             for i in range(len(self.topic_priors)):
                 for word in self.topic_priors[i]:
                     self.topic_word_prob[i][self.vocabulary_ind[word]] += self.topic_priors[i][word]*1000
         else:
-            self.topic_word_prob = np.random.random((number_of_topics, len(self.vocabulary)))
+            self.topic_word_prob = random.random_sample((number_of_topics, len(self.vocabulary)))
 
         self.topic_word_prob = normalize(self.topic_word_prob)
         
 
     def expectation_step(self):
-        """ The E-step updates P(z | w, d)
+        """ The E-step updates P(z | w, d). Only the (d, w) pairs that occur in
+        the term-doc matrix are computed, so topic_prob has one row per nonzero
+        entry of term_doc_matrix (in CSR order) and one column per topic.
         """
         
-        self.topic_prob = np.zeros([self.number_of_documents, self.number_of_topics, self.vocabulary_size], dtype=np.float)
-        for i in range(self.number_of_topics):
-            a = np.transpose(np.array([self.document_topic_prob[:,i]]))
-            b = np.array([self.topic_word_prob[i,:]])
-            self.topic_prob[:,i,:] = np.matmul(a,b)
+        self.topic_prob = joint_prob(self.document_topic_prob, self.topic_word_prob, self.term_doc_matrix, self.term_doc_rows)
         row_sums = self.topic_prob.sum(axis=1)
-        assert (np.count_nonzero(row_sums)==np.shape(row_sums)[0]*np.shape(row_sums)[1])
-        self.topic_prob = self.topic_prob / row_sums[:,np.newaxis,:]
+        assert (np.count_nonzero(row_sums)==np.shape(row_sums)[0])
+        self.topic_prob /= row_sums[:, np.newaxis]
             
 
     def maximization_step(self, number_of_topics):
         """ The M-step updates P(w | z)
         """
         
-        mat = np.zeros([self.number_of_documents, self.number_of_topics, self.vocabulary_size], dtype=np.float)
-        for i in range(self.number_of_topics):
-            mat[:,i,:] = np.multiply(self.topic_prob[:,i,:], self.term_doc_matrix)
+        (doc_counts, word_counts) = topic_counts(self.topic_prob, self.term_doc_matrix, self.term_doc_rows, number_of_topics)
         
         # update P(z | d)
-        self.document_topic_prob = mat.sum(axis=2)
-        self.document_topic_prob = normalize(self.document_topic_prob)
+        self.document_topic_prob = document_topic_prob_from_counts(doc_counts, self.document_topic_prob)
         
         # update P(w | z)
-        self.topic_word_prob = mat.sum(axis=0)
+        self.topic_word_prob = self.topic_word_prob_from_counts(word_counts)
+
+
+    def topic_word_prob_from_counts(self, word_counts):
+        """
+        Turns expected (topic x word) counts into P(w | z). Each topic is
+        normalized to leave room for its prior words, whose prior
+        probabilities are then added.
+        """
+
         prior_weights = []
         if self.topic_priors:
             for topic in self.topic_priors:
                 prior_weights.append(1-sum(topic.values()))
         prior_weights = np.transpose(np.array([prior_weights]))
-        self.topic_word_prob = normalize(self.topic_word_prob, prior_weights)
+        topic_word_prob = normalize(word_counts, prior_weights)
         if self.topic_priors:
             for i in range(len(self.topic_priors)):
                 for word in self.topic_priors[i]:
-                    self.topic_word_prob[i][self.vocabulary_ind[word]] += self.topic_priors[i][word]
+                    topic_word_prob[i][self.vocabulary_ind[word]] += self.topic_priors[i][word]
+        return topic_word_prob
         
 
     def calculate_likelihood(self, number_of_topics):
         """
         Calculates the current log-likelihood of the model using
-        the model's updated probability matrices
+        the model's updated probability matrices. Pairs (d, w) with a zero
+        count do not contribute, so only the nonzero entries are evaluated.
         """
         
-        a = np.matmul(self.document_topic_prob, self.topic_word_prob)
-        return sum(sum(np.multiply(np.log(a),self.term_doc_matrix)))
+        return log_likelihood(self.document_topic_prob, self.topic_word_prob, self.term_doc_matrix, self.term_doc_rows)
 
 
-    def plsa(self, max_iter, epsilon, time_cutoff):
+    def plsa(self, max_iter, epsilon, time_cutoff, processes=1, restarts=1, seed=None):
         """
-        Model topics.
+        Model topics. With processes > 1, the EM iterations are run in
+        parallel over shards of the songs (see plsa_parallel_em). This needs
+        shared memory (Python 3.8+); on older versions EM runs in this
+        process, with the same result. With
+        restarts > 1, EM is run from several random starting points at once
+        and the best result is kept (see plsa_restarts). The starting point
+        is random, unless a seed is given.
         """
 
         # build the vocabulary
@@ -204,40 +411,401 @@ class Model(object):
 
         # build term-doc matrix
         self.build_term_doc_matrix()
-        
-        # Create the counter arrays.
-        
-        # P(z | d, w)
-        self.topic_prob = np.zeros([self.number_of_documents, self.number_of_topics, self.vocabulary_size], dtype=np.float)
 
+        if restarts > 1:
+            self.plsa_restarts(restarts, max_iter, epsilon, time_cutoff, seed)
+            return
+        
         # P(z | d) P(w | z)
-        self.initialize(self.number_of_topics)
+        self.seed = seed
+        self.initialize(self.number_of_topics, seed)
 
-        # Run the EM algorithm
-        current_likelihood = -float('inf')
+        if processes > 1 and sys.version_info >= (3, 8):
+            self.plsa_parallel_em(max_iter, epsilon, time_cutoff, processes)
+            return
 
+        # Run the EM algorithm
+        self.likelihoods = []
         starttime = time.time()
         
         for iteration in range(max_iter):
-            print("Iteration #" + str(iteration + 1) + "...")
+            iteration_starttime = time.time()
             
             self.expectation_step()
             self.maximization_step(self.number_of_topics)
-            old_likelihood = current_likelihood
-            current_likelihood = self.calculate_likelihood(self.number_of_topics)
-            if current_likelihood - old_likelihood < epsilon:
-                break
-            if time.time()-starttime > time_cutoff:
+            likelihood = self.calculate_likelihood(self.number_of_topics)
+            if self.report_iteration(likelihood, iteration_starttime, epsilon, starttime, time_cutoff):
                 break
+        self.report_stop(max_iter)
+
+
+    def plsa_restarts(self, restarts, max_iter, epsilon, time_cutoff, seed=None, min_iter=5, tolerance=0.01):
+        """
+        Runs EM from several random starting points (restarts), each in its
+        own worker process, and keeps the result with the best
+        log-likelihood. Restart i is initialized with seed + i (seed is
+        chosen at random if None), and the seed of the result is kept in
+        self.seed (and saved with the model): plsa with this seed gives the
+        same model again. Raises ValueError if max_iter is below 1, since
+        the restarts could not be compared.
+
+        The restarts run their iterations side by side. After min_iter
+        iterations, a restart whose log-likelihood is behind the best one by
+        more than tolerance (relative) is stopped early, since it is unlikely
+        to catch up. Given a core per restart, this takes about as long as a
+        single run.
+        """
+
+        if max_iter < 1:
+            raise ValueError('restarts are compared by their log-likelihood, so max_iter must be at least 1')
+        if seed is None:
+            seed = int(np.random.randint(2**31 - restarts))
+        seeds = list(range(seed, seed + restarts))
+        context = multiprocessing.get_context('fork')
+        workers = {}
+        for restart_seed in seeds:
+            (connection, worker_connection) = context.Pipe()
+            process = context.Process(target=restart_worker, args=(worker_connection, self, restart_seed))
+            process.start()
+            workers[restart_seed] = (process, connection)
+
+        try:
+            likelihoods = dict([(restart_seed, []) for restart_seed in seeds])
+            stop_reasons = {}
+            running = list(seeds)
+            starttime = time.time()
+            for iteration in range(max_iter):
+                iteration_starttime = time.time()
+                for restart_seed in running:
+                    workers[restart_seed][1].send('step')
+                for restart_seed in running:
+                    likelihoods[restart_seed].append(workers[restart_seed][1].recv())
+                best = max([values[-1] for values in likelihoods.values()])
+                instrumentation.event('restarts_iteration', iteration=iteration+1, running=len(running),
+                    log_likelihood=best, seconds=time.time()-iteration_starttime)
+
+                for restart_seed in list(running):
+                    values = likelihoods[restart_seed]
+                    reason = None
+                    if len(values) > 1 and values[-1] - values[-2] < epsilon:
+                        reason = 'converged'
+                    elif len(values) >= min_iter and values[-1] < best - tolerance*abs(best):
+                        reason = 'behind'
+                    if reason is not None:
+                        stop_reasons[restart_seed] = reason
+                        running.remove(restart_seed)
+                        instrumentation.event('restart_stopped', seed=restart_seed, reason=reason,
+                            iterations=len(values), log_likelihood=values[-1])
+                    if reason == 'behind':
+                        # its result won't be used, so free its core and memory now
+                        workers[restart_seed][1].send('stop')
+                        workers[restart_seed][0].join()
+                if not running:
+                    break
+                if time.time()-starttime > time_cutoff:
+                    for restart_seed in running:
+                        stop_reasons[restart_seed] = 'time_cutoff'
+                    break
+
+            self.seed = max(seeds, key=lambda restart_seed: likelihoods[restart_seed][-1] if likelihoods[restart_seed] else -float('inf'))
+            self.likelihoods = likelihoods[self.seed]
+            self.stop_reason = stop_reasons.get(self.seed)
+            workers[self.seed][1].send('result')
+            (self.document_topic_prob, self.topic_word_prob) = workers[self.seed][1].recv()
+            instrumentation.event('restart_chosen', seed=self.seed)
+            self.report_stop(max_iter)
+        finally:
+            for (process, connection) in workers.values():
+                if process.is_alive():
+                    connection.send('stop')
+                    process.join()
+
+
+    def report_iteration(self, likelihood, iteration_starttime, epsilon, starttime, time_cutoff):
+        """
+        Records an EM iteration's log-likelihood (in self.likelihoods, and
+        as an 'em_iteration' event). Returns whether EM should stop, because
+        the likelihood improved by less than epsilon or the time is up.
+        """
+
+        self.likelihoods.append(likelihood)
+        improvement = likelihood - self.likelihoods[-2] if len(self.likelihoods) > 1 else None
+        instrumentation.event('em_iteration', iteration=len(self.likelihoods), log_likelihood=likelihood,
+            improvement=improvement, seconds=time.time()-iteration_starttime)
+        self.stop_reason = None
+        if improvement is not None and improvement < epsilon:
+            self.stop_reason = 'converged'
+        elif time.time()-starttime > time_cutoff:
+            self.stop_reason = 'time_cutoff'
+        return self.stop_reason is not None
+
+
+    def report_stop(self, max_iter):
+        """
+        Records an 'em_stopped' event, with the number of iterations run and
+        why EM stopped.
+        """
+
+        if not self.likelihoods:
+            return
+        instrumentation.event('em_stopped', iterations=len(self.likelihoods), reason=self.stop_reason or 'max_iter',
+            log_likelihood=self.likelihoods[-1])
     
 
-    def load_model(self):
-        pass
+    def plsa_online(self, documents_path, batch_size=1000, passes=1, fold_in_iter=20, tau0=1.0, kappa=0.7,
+                    max_terms=100000, hash_buckets=1024):
+        """
+        Model topics with online (stochastic) EM, streaming mini-batches of
+        songs from a song lyrics file. Only the topic-word statistics are
+        kept in memory, so this works for archives that don't fit in memory,
+        and a usable model is reached after a single pass.
+
+        For each batch, P(z | d) is estimated with P(w | z) held fixed (as in
+        fold_in), and the batch's expected topic-word counts are blended into
+        the running statistics with step size (tau0 + t)^-kappa, where t is
+        the number of batches seen so far, including this one (so the
+        initial statistics are never entirely replaced). P(w | z) is then
+        recomputed from the statistics with the same prior injection as the
+        batch M-step.
+
+        The vocabulary grows as new words are seen, up to max_terms words
+        besides the topic prior words. Words seen after that are hashed into
+        hash_buckets shared columns (named '#0', '#1', ..., see
+        vocabulary.py), or ignored if hash_buckets is 0, so memory stays
+        bounded however large the archive is.
+
+        After the last pass, the songs are read once more and folded into
+        the final model, to give document_topic_prob.
+        """
+
+        if tau0 <= 0:
+            raise ValueError('tau0 must be above 0')
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        self.vocabulary = []
+        self.vocabulary_ind = {}
+        for topic in self.topic_priors:
+            for word in topic:
+                if not word in self.vocabulary_ind:
+                    self.vocabulary_ind[word] = len(self.vocabulary)
+                    self.vocabulary.append(word)
+        for i in range(hash_buckets):
+            self.vocabulary_ind['#' + str(i)] = len(self.vocabulary)
+            self.vocabulary.append('#' + str(i))
+        self.vocabulary_size = len(self.vocabulary)
+        self.hash_buckets = hash_buckets
+        vocabulary_limit = self.vocabulary_size + max_terms
+
+        # topic-word statistics, like initialize: random, with prior words boosted
+        topic_word_stats = np.random.random((self.number_of_topics, min(max(self.vocabulary_size, 1024), vocabulary_limit)))
+        for i in range(len(self.topic_priors)):
+            for word in self.topic_priors[i]:
+                topic_word_stats[i][self.vocabulary_ind[word]] += self.topic_priors[i][word]*1000
+        self.topic_word_prob = self.topic_word_prob_from_counts(topic_word_stats[:, :self.vocabulary_size])
+
+        batches_seen = 0
+        for current_pass in range(passes):
+            songs = song_records.read_songs(documents_path)
+            while True:
+                batch_starttime = time.time()
+                batch = [song.lyrics for song in itertools.islice(songs, batch_size)]
+                if not batch:
+                    break
+                old_size = self.vocabulary_size
+                term_doc_matrix = self.online_term_doc_matrix(batch, corpus, vocabulary_limit)
+
+                # new words start out like an average word of each topic
+                if self.vocabulary_size > old_size:
+                    if self.vocabulary_size > topic_word_stats.shape[1]:
+                        grown = np.zeros((self.number_of_topics, min(2*self.vocabulary_size, vocabulary_limit)))
+                        grown[:, :topic_word_stats.shape[1]] = topic_word_stats
+                        topic_word_stats = grown
+                    average = topic_word_stats[:, :old_size].sum(axis=1)[:, np.newaxis]/old_size
+                    topic_word_stats[:, old_size:self.vocabulary_size] = np.random.random((self.number_of_topics, self.vocabulary_size-old_size))*average
+                    self.topic_word_prob = self.topic_word_prob_from_counts(topic_word_stats[:, :self.vocabulary_size])
+                term_doc_rows = np.repeat(np.arange(len(batch)), np.diff(term_doc_matrix.indptr))
+
+                # E-step for the batch, with P(z | d) fitted to the current P(w | z)
+                document_topic_prob = fold_in_prob(self.topic_word_prob, term_doc_matrix, fold_in_iter)
+                topic_prob = joint_prob(document_topic_prob, self.topic_word_prob, term_doc_matrix, term_doc_rows)
+                row_sums = topic_prob.sum(axis=1)
+                np.divide(topic_prob, row_sums[:, np.newaxis], out=topic_prob, where=row_sums[:, np.newaxis] > 0)
+                (doc_counts, word_counts) = topic_counts(topic_prob, term_doc_matrix, term_doc_rows, self.number_of_topics)
+
+                # blend the batch's counts into the statistics, and update P(w | z)
+                batches_seen += 1
+                step_size = (tau0 + batches_seen)**(-kappa)
+                topic_word_stats[:, :self.vocabulary_size] *= (1-step_size)
+                topic_word_stats[:, :self.vocabulary_size] += step_size*word_counts
+                self.topic_word_prob = self.topic_word_prob_from_counts(topic_word_stats[:, :self.vocabulary_size])
+                instrumentation.event('online_batch', batch=batches_seen, songs=len(batch), vocabulary_size=self.vocabulary_size,
+                    step_size=step_size, seconds=time.time()-batch_starttime)
+
+        # fold the songs into the final model
+        document_topic_prob = []
+        songs = song_records.read_songs(documents_path)
+        while True:
+            batch = [song.lyrics for song in itertools.islice(songs, batch_size)]
+            if not batch:
+                break
+            term_doc_matrix = self.online_term_doc_matrix(batch, corpus, self.vocabulary_size)
+            document_topic_prob.append(fold_in_prob(self.topic_word_prob, term_doc_matrix, fold_in_iter))
+        self.document_topic_prob = np.concatenate(document_topic_prob) if document_topic_prob else np.zeros((0, self.number_of_topics))
+        self.number_of_documents = len(self.document_topic_prob)
+
+
+    def online_term_doc_matrix(self, batch, corpus, vocabulary_limit):
+        """
+        The term-doc matrix of a batch of songs for plsa_online. The songs
+        are analyzed without caching them in the corpus, to keep memory
+        bounded. New words are added to the vocabulary while it has fewer
+        than vocabulary_limit words, then hashed into the shared columns
+        (or ignored, without them).
+        """
+
+        indptr = [0]
+        indices = []
+        counts = []
+        for lyric in batch:
+            words = corpus.analyze(lyric)
+            for word in words:
+                column = self.vocabulary_ind.get(word)
+                if column is None:
+                    if len(self.vocabulary) < vocabulary_limit:
+                        column = len(self.vocabulary)
+                        self.vocabulary_ind[word] = column
+                        self.vocabulary.append(word)
+                    elif self.hash_buckets:
+                        column = self.vocabulary_ind['#' + str(vocabulary.hash_bucket(word, self.hash_buckets))]
+                    else:
+                        continue
+                indices.append(column)
+                counts.append(words[word])
+            indptr.append(len(indices))
+        self.vocabulary_size = len(self.vocabulary)
+        term_doc_matrix = sparse.csr_matrix((np.array(counts, dtype=float), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(batch), self.vocabulary_size))
+        term_doc_matrix.sum_duplicates()
+        return term_doc_matrix
+
+
+    def plsa_parallel_em(self, max_iter, epsilon, time_cutoff, processes):
+        """
+        Runs the EM algorithm with the songs split into one shard per worker
+        process. P(w | z) is kept in shared memory, which every worker reads.
+        In each iteration the workers run the E-step on their shard, update
+        their own rows of P(z | d) and write their expected topic-word counts
+        to shared memory. These are summed here, before the prior-injected
+        normalization of the M-step. The result is the same as plsa with one
+        process (up to floating point rounding).
+        """
+
+        from multiprocessing import shared_memory  # Python 3.8+, see plsa
+
+        shape = (self.number_of_topics, self.vocabulary_size)
+        size = max(1, 8*shape[0]*shape[1])
+        topic_word_memory = shared_memory.SharedMemory(create=True, size=size)
+        topic_word_prob = np.ndarray(shape, buffer=topic_word_memory.buf)
+        topic_word_prob[:] = self.topic_word_prob
+
+        context = multiprocessing.get_context('fork')
+        workers = []
+        try:
+            for documents in parallel.make_shards(list(range(self.number_of_documents)), processes):
+                (start, end) = (documents[0], documents[-1]+1)
+                counts_memory = shared_memory.SharedMemory(create=True, size=size)
+                (connection, worker_connection) = context.Pipe()
+                process = context.Process(target=em_worker, args=(worker_connection, self.term_doc_matrix[start:end],
+                    self.document_topic_prob[start:end], topic_word_memory.name, counts_memory.name, shape))
+                workers.append((process, connection, counts_memory))
+                process.start()
+                worker_connection.close()
+
+            self.likelihoods = []
+            starttime = time.time()
+            for iteration in range(max_iter):
+                iteration_starttime = time.time()
+
+                # E-step, and the P(z | d) half of the M-step, in the workers
+                for (process, connection, counts_memory) in workers:
+                    connection.send('em')
+                word_counts = np.zeros(shape)
+                for (process, connection, counts_memory) in workers:
+                    receive(connection, process)
+                    word_counts += np.ndarray(shape, buffer=counts_memory.buf)
+
+                # P(w | z) half of the M-step, shared with the workers
+                topic_word_prob[:] = self.topic_word_prob_from_counts(word_counts)
+
+                for (process, connection, counts_memory) in workers:
+                    connection.send('likelihood')
+                likelihood = sum([receive(connection, process) for (process, connection, counts_memory) in workers])
+                if self.report_iteration(likelihood, iteration_starttime, epsilon, starttime, time_cutoff):
+                    break
+            self.report_stop(max_iter)
+
+            self.topic_word_prob = np.array(topic_word_prob)
+            document_topic_prob = []
+            for (process, connection, counts_memory) in workers:
+                connection.send('result')
+                document_topic_prob.append(receive(connection, process))
+            self.document_topic_prob = np.concatenate(document_topic_prob)
+        finally:
+            # stop the workers that are still running, without hiding the
+            # error that got us here (such as a worker that died)
+            for (process, connection, counts_memory) in workers:
+                if process.is_alive():
+                    try:
+                        connection.send('stop')
+                    except OSError:
+                        pass
+            for (process, connection, counts_memory) in workers:
+                if process.pid is not None:
+                    process.join(10)
+                    if process.is_alive():
+                        process.terminate()
+                        process.join()
+                connection.close()
+                counts_memory.close()
+                counts_memory.unlink()
+            del topic_word_prob
+            topic_word_memory.close()
+            topic_word_memory.unlink()
+
+
+    def load_model(self, infile):
+        """
+        Loads topic models previously written with save_model. This restores
+        the vocabulary and P(w | z), which is all that is needed to infer the
+        topics of new songs with topics_from_new_song(s), and the seed the
+        model was trained from, if it was saved.
+        """
+
+        f = open(infile, 'r')
+        topics = f.read().split('\n\n')
+        f.close()
+        if topics[0].startswith('#seed:'):
+            self.seed = int(topics.pop(0)[len('#seed:'):])
+        self.vocabulary = []
+        self.vocabulary_ind = {}
+        for entry in topics[0].split('; '):
+            word = entry.rsplit(':', 1)[0]
+            self.vocabulary_ind[word] = len(self.vocabulary)
+            self.vocabulary.append(word)
+        self.vocabulary_size = len(self.vocabulary)
+        self.hash_buckets = len([word for word in self.vocabulary if word.startswith('#')])
+        self.number_of_topics = len(topics)
+        self.topic_word_prob = np.zeros((self.number_of_topics, self.vocabulary_size))
+        for i in range(self.number_of_topics):
+            for entry in topics[i].split('; '):
+                (word, prob) = entry.rsplit(':', 1)
+                self.topic_word_prob[i][self.vocabulary_ind[word]] = float(prob)
 
 
     def save_model(self,outfile):
         f = open(outfile, 'w')
         top_models = []
+        if self.seed is not None:
+            top_models.append(f'#seed:{self.seed}')
         for topic in self.topic_word_prob:
             model = list(zip(self.vocabulary, topic))
             model = sorted(model, key=lambda x: -x[1])
@@ -246,9 +814,13 @@ class Model(object):
         f.close()
 
 
-    def songs_topics_strlist(self):
+    def topics_strlist(self, document_topic_prob):
+        """
+        Turns rows of P(z | d) into topic label strings, e.g. 'Love/Other'.
+        Topics with probability above 0.2 are listed, otherwise 'n/a'.
+        """
         docs_topics_list = []
-        for doc in self.document_topic_prob:
+        for doc in document_topic_prob:
             doc_topics = []
             for i in range(self.number_of_topics):
                 if doc[i] > 0.2:
@@ -260,5 +832,46 @@ class Model(object):
         return docs_topics_list
 
 
-    def topics_from_new_song(self):
-        pass
\ No newline at end of file
+    def songs_topics_strlist(self):
+        return self.topics_strlist(self.document_topic_prob)
+
+
+    def fold_in(self, songs, max_iter=20):
+        """
+        Estimates P(z | d) for songs that were not used to train the model.
+        P(w | z) is held fixed and a short EM is run over the new songs only,
+        so no retraining is needed. Words outside the model's vocabulary are
+        ignored (or hashed, if the model has hashed columns). Returns a (songs x topics) matrix.
+        """
+
+        corpus = self.corpus or tokenized_corpus.default_corpus()
+        indptr = [0]
+        indices = []
+        counts = []
+        for (song_ids, song_counts) in corpus.tokenize_songs(songs):
+            for (term_id, count) in zip(song_ids, song_counts):
+                word = corpus.terms[term_id]
+                if not word in self.vocabulary_ind and self.hash_buckets:
+                    word = '#' + str(vocabulary.hash_bucket(word, self.hash_buckets))
+                if word in self.vocabulary_ind:
+                    indices.append(self.vocabulary_ind[word])
+                    counts.append(count)
+            indptr.append(len(indices))
+        term_doc_matrix = sparse.csr_matrix((np.array(counts, dtype=float), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(songs), self.vocabulary_size))
+        return fold_in_prob(self.topic_word_prob, term_doc_matrix, max_iter)
+
+
+    def topics_from_new_songs(self, songs, max_iter=20):
+        """
+        Labels new songs with topics (same labels as songs_topics_strlist),
+        using a trained or loaded model.
+        """
+        return self.topics_strlist(self.fold_in(songs, max_iter))
+
+
+    def topics_from_new_song(self, song, max_iter=20):
+        """
+        Labels a single new song with topics, using a trained or loaded model.
+        """
+        return self.topics_from_new_songs([song], max_iter)[0]
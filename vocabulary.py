@@ -0,0 +1,115 @@
+'''
+This file is used to choose which terms the models use. Lyrics have a
+long tail of terms that only appear in a song or two (misspellings,
+ad-libs), and the size of the vocabulary drives the cost of the topic
+model's matrices, so it can be bounded:
+
+- min-df / max-df: terms in fewer / more songs than this are dropped. A
+  float below (or equal to) 1 is a fraction of the songs, an integer is a
+  number of songs.
+- max-terms: only this many terms (those in the most songs) are kept. 0
+  means no limit.
+- hash-buckets: if not 0, the topic model doesn't give every term its own
+  column. Terms are hashed into this many shared columns instead (named
+  '#0', '#1', ...), which bounds the vocabulary however many terms there are.
+
+Words the models depend on (the topic priors, the explicit words) are
+always kept, and always have a column of their own.
+
+The settings are read from the [vocabulary] table of the analyzer config
+(config/config.toml). The default settings keep every term.
+'''
+
+import zlib
+import numpy as np
+import toml_config
+
+
+DEFAULT_SETTINGS = {'min-df': 1, 'max-df': 1.0, 'max-terms': 0, 'hash-buckets': 0}
+
+
+def load_settings(config_file='config/config.toml'):
+    '''
+    Reads the [vocabulary] table of a config file. Returns a dictionary
+    with every setting (missing ones have their default value).
+    '''
+    settings = dict(DEFAULT_SETTINGS)
+    for (key, value) in toml_config.load(config_file).get('vocabulary', {}).items():
+        if key not in DEFAULT_SETTINGS or isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'{config_file}: unknown vocabulary setting "{key} = {value}"')
+        settings[key] = value
+    return settings
+
+
+def document_frequency_cutoff(cutoff, number_of_songs):
+    '''
+    A min-df or max-df setting as a number of songs.
+    '''
+    if isinstance(cutoff, float) and cutoff <= 1:
+        return cutoff*number_of_songs
+    return cutoff
+
+
+def select_terms(document_frequencies, number_of_songs, settings, keep=None):
+    '''
+    Returns a boolean mask of the terms to keep, given their document
+    frequencies (an array). keep is a boolean mask of terms that are kept
+    whatever their frequency.
+    '''
+    document_frequencies = np.asarray(document_frequencies)
+    selected = (document_frequencies > 0)
+    selected &= document_frequencies >= document_frequency_cutoff(settings['min-df'], number_of_songs)
+    selected &= document_frequencies <= document_frequency_cutoff(settings['max-df'], number_of_songs)
+    if settings['max-terms'] > 0 and selected.sum() > settings['max-terms']:
+        # the most frequent terms, earlier terms first on ties
+        candidates = np.flatnonzero(selected)
+        order = np.argsort(-document_frequencies[candidates], kind='stable')
+        selected[:] = False
+        selected[candidates[order[:settings['max-terms']]]] = True
+    if keep is not None:
+        selected |= keep
+    return selected
+
+
+def hash_bucket(word, hash_buckets):
+    '''
+    The shared column (0 to hash_buckets-1) that a term is hashed to. Its
+    name is '#' followed by this number.
+    '''
+    return zlib.crc32(word.encode('utf-8')) % hash_buckets
+
+
+def build_columns(corpus, term_order, document_frequencies, number_of_songs, settings, keep_words=[]):
+    '''
+    Chooses the columns of a model from the terms of a tokenized corpus
+    (tokenized_corpus.Corpus). term_order are the term ids of the songs'
+    terms in the order the columns should be in (only terms in term_order
+    are considered). Returns (column names, column of each corpus term
+    id), where the column is -1 for terms that are dropped. Keep words
+    that are not in the corpus at all get a column at the end.
+    '''
+    terms = corpus.terms
+    keep = np.zeros(len(terms), dtype=bool)
+    for word in keep_words:
+        if word in corpus.term_ind:
+            keep[corpus.term_ind[word]] = True
+    selected = select_terms(document_frequencies, number_of_songs, settings, keep)
+
+    columns = np.full(len(terms), -1, dtype=np.int64)
+    names = []
+    buckets = settings['hash-buckets']
+    for term_id in term_order:
+        if selected[term_id] and (buckets == 0 or keep[term_id]):
+            columns[term_id] = len(names)
+            names.append(terms[term_id])
+    named = set(names)
+    for word in keep_words:
+        if word not in named:
+            named.add(word)
+            names.append(word)
+    if buckets > 0:
+        for term_id in term_order:
+            if selected[term_id] and not keep[term_id]:
+                columns[term_id] = len(names) + hash_bucket(terms[term_id], buckets)
+        names += ['#' + str(i) for i in range(buckets)]
+    return (names, columns)
@@ -9,6 +9,57 @@ but these are statistics that you want to have access to, as they
 tell you a lot about a song.
 '''
 
+import numpy as np
+import song_records
+
+
+# Points for each letter in Scrabble (English). Other characters score 0.
+SCRABBLE_POINTS = dict(
+    [(letter, 1) for letter in 'aeilnorstu'] +
+    [(letter, 2) for letter in 'dg'] +
+    [(letter, 3) for letter in 'bcmp'] +
+    [(letter, 4) for letter in 'fhvwy'] +
+    [('k', 5)] +
+    [(letter, 8) for letter in 'jx'] +
+    [(letter, 10) for letter in 'qz'])
+
+
+def scrabble_points(word):
+    '''
+    The Scrabble score of a word (case-insensitive, no letter bonuses).
+    '''
+    return sum([SCRABBLE_POINTS.get(letter, 0) for letter in word.lower()])
+
+
+# SCRABBLE_POINTS as a lookup table of latin-1 character codes
+SCRABBLE_TABLE = np.zeros(256, dtype=np.int64)
+for (letter, points) in SCRABBLE_POINTS.items():
+    SCRABBLE_TABLE[ord(letter)] = points
+
+
+def scrabble_totals(songs):
+    '''
+    The Scrabble score of all words of each song, as an array. The same as
+    adding up scrabble_points for every word, but computed over the
+    characters of all songs at once: whitespace scores 0 like any other
+    character that isn't a letter, so the words need not be split.
+    '''
+    lowered = [song.lower() for song in songs]
+    # one byte per character, '?' (0 points) for those outside latin-1
+    codes = np.frombuffer(''.join(lowered).encode('latin-1', 'replace'), dtype=np.uint8)
+    cumulative = np.concatenate([[0], np.cumsum(SCRABBLE_TABLE[codes])])
+    sizes = np.fromiter(map(len, lowered), dtype=np.int64, count=len(songs))
+    ends = np.cumsum(sizes)
+    return cumulative[ends] - cumulative[ends-sizes]
+
+
+def safe_divide(numerator, denominator):
+    '''
+    Element-wise division of arrays, giving 0 where the denominator is 0.
+    '''
+    numerator = np.asarray(numerator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=np.asarray(denominator) != 0)
+
 class Stats:
     '''
     Calculate simple statistics on songs.
@@ -24,11 +75,11 @@ class Stats:
         '''
         Use a file to load song lyrics and lengths.
         '''
-        f = open(song_database_file,'r')
-        lines = f.readlines()
-        f.close()
-        self.songs = [lines[x].splitlines()[0] for x in range(5, len(lines), 7)]
-        self.lengths = [float(lines[x].splitlines()[0]) for x in range(3, len(lines), 7)]
+        self.songs = []
+        self.lengths = []
+        for song in song_records.read_songs(song_database_file):
+            self.songs.append(song.lyrics)
+            self.lengths.append(song.length)
 
     
     def evaluate_song(self, song, length):
@@ -45,6 +96,41 @@ class Stats:
         unique_prop = len(song_vocab)/len(words)
         return (rate, unique_prop)
 
+    def evaluate_corpus(self):
+        '''
+        Calculates statistics for all songs available, that have been
+        loaded, in one pass. Each song is split into words once, and the
+        counts are taken over whole songs (not word by word): the number of
+        words, of distinct words and of characters, and the scrabble points
+        of all characters (see scrabble_totals). Returns a dictionary of
+        arrays (one value per song, in the same order):
+
+            words                  number of words
+            unique_words           number of distinct words
+            words_per_second       words/second
+            unique_ratio           unique words/total words
+            average_word_length    average characters per word
+            scrabble_per_word      average scrabble points per word
+
+        Songs without words, or with a length of 0, get 0 for the ratios
+        that would otherwise divide by zero.
+        '''
+        split_songs = [song.split() for song in self.songs]
+        song_sizes = np.fromiter(map(len, split_songs), dtype=np.int64, count=len(self.songs))
+        unique_words = np.fromiter(map(len, map(set, split_songs)), dtype=np.int64, count=len(self.songs))
+        total_length = np.fromiter(map(len, map(''.join, split_songs)), dtype=float, count=len(self.songs))
+        total_points = scrabble_totals(self.songs)
+
+        lengths = np.array(self.lengths, dtype=float)
+        return {
+            'words': song_sizes,
+            'unique_words': unique_words,
+            'words_per_second': safe_divide(song_sizes, lengths),
+            'unique_ratio': safe_divide(unique_words, song_sizes),
+            'average_word_length': safe_divide(total_length, song_sizes),
+            'scrabble_per_word': safe_divide(total_points, song_sizes),
+        }
+
     def evaluate_stored_songs(self):
         '''
         Calculates the words/second and unique words/total words values
@@ -57,3 +143,12 @@ class Stats:
             rates.append(rate)
             unique_props.append(unique_prop)
         return (rates, unique_props)
+
+
+def evaluate_shard(args):
+    '''
+    Calculates the statistics of evaluate_corpus for a shard of
+    (songs, lengths), for use with a multiprocessing pool.
+    '''
+    (songs, lengths) = args
+    return Stats(songs=songs, lengths=lengths).evaluate_corpus()